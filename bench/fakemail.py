@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from email.message import Message
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.client import EmailClient
+from core.parser import parse_headers, split_header
+
+
+class FakeImapConnection:
+    """
+    进程内的 IMAP 连接，实现 EmailClient 和 ImapSource 用到的命令，返回值与 imaplib 一致
+
+    SINCE 按投递时间（IMAP 的 INTERNALDATE）筛选，与邮箱服务器的行为一致
+    """
+
+    def __init__(self, server: "FakeMailServer") -> None:
+        self.server = server
+
+    def login(self, user: str, password: str):
+        return "OK", [b"LOGIN completed"]
+
+    def select(self, mailbox: str = "INBOX", readonly: bool = False):
+        self.server.count("imap.select")
+        return "OK", [str(len(self.server.messages)).encode()]
+
+    def noop(self):
+        self.server.count("imap.noop")
+        return "OK", [b"NOOP completed"]
+
+    def search(self, charset, *criteria: str):
+        self.server.count("imap.search")
+        since: Optional[date] = None
+        for name, value in zip(criteria, criteria[1:]):
+            if str(name).upper() == "SINCE":
+                since = datetime.strptime(value, "%d-%b-%Y").date()
+
+        with self.server.lock:
+            ids = [
+                str(index + 1).encode()
+                for index, (delivered_at, _) in enumerate(self.server.messages)
+                if since is None or date.fromtimestamp(delivered_at) >= since
+            ]
+        return "OK", [b" ".join(ids)]
+
+    def fetch(self, msg_id: bytes, message_parts: str):
+        self.server.count("imap.fetch")
+        if self.server.fetch_latency:
+            time.sleep(self.server.fetch_latency)
+        index = int(msg_id) - 1
+        with self.server.lock:
+            if not 0 <= index < len(self.server.messages):
+                return "NO", [None]
+            raw = self.server.messages[index][1]
+
+        part = message_parts.strip("()").upper()
+        if part == "BODY.PEEK[HEADER]":
+            data = split_header(raw)
+            label = "BODY[HEADER]"
+        elif part == "RFC822":
+            data = raw
+            label = "RFC822"
+        else:
+            raise ValueError(f"不支持的 FETCH 项：{message_parts}")
+
+        self.server.count("imap.bytes", len(data))
+        return "OK", [(f"{int(msg_id)} ({label} {{{len(data)}}}".encode(), data), b")"]
+
+    def close(self):
+        return "OK", [b"CLOSE completed"]
+
+    def logout(self):
+        return "BYE", [b"LOGOUT completed"]
+
+
+class FakeSmtpConnection:
+    """进程内的 SMTP 连接，发送的邮件交给 FakeMailServer 记录"""
+
+    def __init__(self, server: "FakeMailServer") -> None:
+        self.server = server
+
+    def login(self, user: str, password: str):
+        return 235, b"Authentication successful"
+
+    def send_message(self, msg: Message, *args, **kwargs) -> dict:
+        self.server.accept(msg)
+        return {}
+
+    def quit(self):
+        return 221, b"Bye"
+
+
+class FakeMailServer:
+    """
+    进程内的邮件服务器：deliver 投递询价邮件，发送的回复记录在 sent 中
+
+    按回复的 In-Reply-To 对应到原始邮件，统计投递到收到回复的耗时
+    """
+
+    def __init__(
+        self,
+        on_sent: Optional[Callable[[Message], None]] = None,
+        fetch_latency: float = 0.0,
+    ) -> None:
+        """:param fetch_latency: 每次 FETCH 的模拟网络往返耗时（秒）"""
+        self.lock = threading.Lock()
+        # (投递时间, 原始邮件数据)，编号为下标 + 1
+        self.messages: List[Tuple[float, bytes]] = []
+        self.sent: List[Message] = []
+        self.stats: Counter = Counter()
+        # 原始邮件 Message-ID -> 投递时间 / 收到回复的时间
+        self.delivered_at: Dict[str, float] = {}
+        self.replied_at: Dict[str, float] = {}
+        self.on_sent = on_sent
+        self.fetch_latency = fetch_latency
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.stats[name] += amount
+
+    def deliver(self, raw: bytes, at: Optional[float] = None) -> int:
+        """投递一封邮件，返回邮件编号"""
+        at = time.time() if at is None else at
+        message_id = _header_value(raw, "Message-ID")
+        with self.lock:
+            self.messages.append((at, raw))
+            if message_id:
+                self.delivered_at.setdefault(message_id, at)
+            return len(self.messages)
+
+    def accept(self, msg: Message) -> None:
+        now = time.time()
+        with self.lock:
+            self.sent.append(msg)
+            self.stats["smtp.send"] += 1
+            original = (msg["In-Reply-To"] or "").strip()
+            if original:
+                self.replied_at.setdefault(original, now)
+        if self.on_sent is not None:
+            self.on_sent(msg)
+
+    def latencies(self) -> List[float]:
+        """已回复邮件从投递到收到回复的耗时（秒）"""
+        with self.lock:
+            return [
+                replied - self.delivered_at[message_id]
+                for message_id, replied in self.replied_at.items()
+                if message_id in self.delivered_at
+            ]
+
+    def client(self, address: str = "quote@swhysc.com") -> "FakeEmailClient":
+        return FakeEmailClient(self, address)
+
+
+class FakeEmailClient(EmailClient):
+    """连接到 FakeMailServer 的邮件客户端，读取、解析和回复都走 EmailClient 的实现"""
+
+    def __init__(self, server: FakeMailServer, address: str) -> None:
+        super().__init__("localhost", address, "")
+        self.server = server
+
+    def connect(self, protocol: str = "imap"):
+        if protocol.lower() == "imap":
+            self.server.count("imap.connect")
+            return FakeImapConnection(self.server)
+        if protocol.lower() == "smtp":
+            self.server.count("smtp.connect")
+            return FakeSmtpConnection(self.server)
+        raise ValueError(f"不支持的协议类型: {protocol}，请使用 'imap' 或 'smtp'")
+
+
+def _header_value(raw: bytes, name: str) -> Optional[str]:
+    value = parse_headers(raw)[name]
+    return str(value).strip() if value else None
@@ -0,0 +1,114 @@
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime, make_msgid
+from typing import Dict, List
+
+from sqlalchemy import create_engine
+
+from core.parser import parse_html_to_dict
+from core.schemas import EachMail, MailContent
+from db.engine import SessionLocal
+from db.models import Base
+
+# 测试邮箱后缀，已在 processor_map 中注册
+BENCH_FROM_ADDR = "bench@swhysc.com"
+
+
+def use_temp_database() -> str:
+    """将数据库会话切换到临时 SQLite 文件，避免污染 my.db，返回文件路径"""
+    path = os.path.join(tempfile.mkdtemp(prefix="quoter-bench-"), "bench.db")
+    engine = create_engine(f"sqlite+pysqlite:///{path}", echo=False)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+    return path
+
+
+def inquiry_rows(sheet_name: str, index: int) -> Dict[str, str]:
+    """构造一封询价邮件的表格内容，报价字段为空"""
+    start = date.today() + timedelta(days=1 + index % 5)
+    end = start + timedelta(days=30 * (1 + index % 12))
+    underlying = "黄金（AU9999.SGE）" if index % 2 == 0 else "伦敦金（XAU.IDC）"
+
+    rows = {
+        "挂钩标的合约": underlying,
+        "产品启动日": start.strftime("%Y-%m-%d"),
+        "期末观察日": end.strftime("%Y-%m-%d"),
+        "最低收益率（年化）": "1.00%",
+    }
+    if sheet_name == "看涨阶梯":
+        rows.update(
+            {
+                "中间收益率（年化）": f"{2.0 + index % 3 * 0.1:.2f}%",
+                "最高收益率（年化）": f"{3.0 + index % 4 * 0.1:.2f}%",
+                "行权价格2（高）": f"*{105 + index % 5}%",
+                "期权费（年化）": f"{0.5 + index % 7 * 0.05:.2f}%",
+                "行权价格1（低）": "",
+            }
+        )
+    else:
+        rows.update(
+            {
+                "最高收益率（年化）": f"{2.5 + index % 4 * 0.1:.2f}%",
+                "期权费 （年化）": f"{0.4 + index % 7 * 0.05:.2f}%",
+                "行权价格": "",
+            }
+        )
+    return rows
+
+
+def inquiry_html(rows: Dict[str, str]) -> str:
+    """按银行询价邮件的格式生成 HTML 表格"""
+    trs = "".join(
+        f"<tr><td>{label}</td><td><p>{value}</p></td></tr>"
+        for label, value in rows.items()
+    )
+    return f"<html><body><table>{trs}</table></body></html>"
+
+
+def inquiry_message(
+    subject: str, html: str, sent_time: datetime, from_addr: str = BENCH_FROM_ADDR
+) -> MIMEMultipart:
+    """构造询价邮件的 MIME 对象"""
+    msg = MIMEMultipart("alternative")
+    msg["Message-ID"] = make_msgid()
+    msg["Subject"] = subject
+    msg["From"] = f"bench <{from_addr}>"
+    msg["To"] = "quote@swhysc.com"
+    msg["Date"] = format_datetime(sent_time)
+    msg.attach(MIMEText(html, "html", "utf-8"))
+    return msg
+
+
+def make_each_mail(sheet_name: str, index: int) -> EachMail:
+    """构造一封可报价的 EachMail"""
+    rows = inquiry_rows(sheet_name, index)
+    html = inquiry_html(rows)
+    df_dict = parse_html_to_dict(html)
+    underlying = rows["挂钩标的合约"]
+    underlying = underlying[underlying.index("（") + 1 : -1].replace(".", "").upper()
+    subject = f"衍生品交易-{sheet_name}-询价{index:05d}"
+    sent_time = datetime.now().replace(microsecond=0) - timedelta(seconds=index)
+
+    return EachMail(
+        msg_id=str(index),
+        subject=subject,
+        from_name="bench",
+        from_addr=BENCH_FROM_ADDR,
+        content=MailContent(plain="", html=html),
+        sent_time=sent_time,
+        df_dict=df_dict,  # type: ignore
+        sheet_name=sheet_name,  # type: ignore
+        underlying=underlying,
+        raw=inquiry_message(subject, html, sent_time).as_bytes(),
+    )
+
+
+def make_result_dict(count: int) -> Dict[str, List[EachMail]]:
+    """构造 count 封询价邮件，两种产品各占一半"""
+    sheet_names = ["看涨阶梯", "二元看涨"]
+    return {
+        BENCH_FROM_ADDR: [make_each_mail(sheet_names[i % 2], i) for i in range(count)]
+    }
@@ -0,0 +1,77 @@
+import time
+from typing import Optional
+
+from core.backend import WorkbookBackend, open_workbook
+from core.client import EmailClient
+from core.excel import ExcelHandler
+from core.handler import MailHandler
+from bench.fixtures import make_result_dict, use_temp_database
+from main import reply_emails
+from processor.registry import subject_sheet_map
+
+
+class NullSender:
+    """只构建回复邮件、不实际发送的客户端"""
+
+    def __init__(self) -> None:
+        self.client = EmailClient("localhost", "bench@swhysc.com", "")
+        self.sent = []
+
+    def reply_mail(self, mail) -> None:
+        self.sent.append(self.client._build_reply_mime(mail))
+
+
+def confirm_all(wb: WorkbookBackend, sheet_name: str) -> int:
+    """模拟业务人员确认所有已报价的列，返回确认数量"""
+    handler = ExcelHandler()
+    row, columns = handler._read_confirm_rows(wb, sheet_name)
+    if not row:
+        return 0
+
+    count = 0
+    for page_sheet, col, _, mail_hash in columns:
+        if mail_hash:
+            wb.set_value(page_sheet, f"{col}{row}", "是")
+            count += 1
+    return count
+
+
+def run_flow(
+    mails: int = 24,
+    backend: str = "memory",
+    filename: Optional[str] = None,
+    engine: str = "excel",
+):
+    """
+    在不依赖 Excel 的后端上运行 MailHandler.handle -> reply_emails 的完整流程并计时
+
+    :param mails: 询价邮件数量
+    :param backend: 工作簿后端，memory 或 headless
+    :param filename: headless 后端使用的工作簿文件
+    :param engine: 报价引擎，excel 或 native
+    :return: 各阶段耗时和后端调用统计
+    """
+    use_temp_database()
+    wb = open_workbook(filename, backend)
+    result_dict = make_result_dict(mails)
+    sender = NullSender()
+
+    started = time.perf_counter()
+    MailHandler(pricing_engine=engine).handle(wb, result_dict)
+    handled = time.perf_counter()
+
+    for sheet_name in subject_sheet_map:
+        confirm_all(wb, sheet_name)
+        reply_emails(sheet_name, wb=wb, sender=sender)
+    replied = time.perf_counter()
+
+    return {
+        "backend": wb.name,
+        "engine": engine,
+        "mails": mails,
+        "replied": len(sender.sent),
+        "handle_seconds": handled - started,
+        "reply_seconds": replied - handled,
+        "total_seconds": replied - started,
+        "calls": dict(getattr(wb, "calls", {})),
+    }
@@ -0,0 +1,72 @@
+from typing import List, Tuple
+
+from core.backend.memory import (
+    MemoryWorkbook,
+    delete_formula_columns,
+    translate_formula,
+)
+
+# (说明, 实际结果, 期望结果)
+Case = Tuple[str, str, str]
+
+
+def _cases() -> List[Case]:
+    wb = MemoryWorkbook()
+    wb.add_sheet("看涨阶梯")
+    wb.add_sheet("标的 价格")
+    wb.set_formula("看涨阶梯", "F1", "=SUM(B1:E1)+'标的 价格'!E2")
+    wb.set_formula("标的 价格", "A1", "=看涨阶梯!E1+'看涨阶梯'!$B$1:$F$1+E1")
+    wb.delete_columns("看涨阶梯", "C:D")
+
+    return [
+        (
+            "删除列不调整其他 Sheet 的区域",
+            delete_formula_columns("=VLOOKUP(E3,标的价格!$A$2:$I$4,2,0)+E7", 3, 4),
+            "=VLOOKUP(C3,标的价格!$A$2:$I$4,2,0)+C7",
+        ),
+        (
+            "删除列不调整带引号的 Sheet 名称后的引用",
+            delete_formula_columns("='标的 价格'!E2+E2", 3, 4),
+            "='标的 价格'!E2+C2",
+        ),
+        (
+            "删除列时区域整体收缩",
+            delete_formula_columns("=SUM(B1:E1)+SUM(D1:F1)", 3, 4),
+            "=SUM(B1:C1)+SUM(C1:D1)",
+        ),
+        (
+            "区域全部被删除时变为 #REF!",
+            delete_formula_columns("=SUM(C1:D1)", 3, 4),
+            "=SUM(#REF!)",
+        ),
+        (
+            "字符串和函数名不作为引用",
+            delete_formula_columns('=IF(A1="E5",LOG10(E5),$E$5)', 3, 4),
+            '=IF(A1="E5",LOG10(C5),$C$5)',
+        ),
+        (
+            "复制公式时区域的两个端点都平移",
+            translate_formula("=SUM(标的价格!E2:I2)*B7", 0, 1),
+            "=SUM(标的价格!F2:J2)*C7",
+        ),
+        (
+            "复制公式时 $ 锁定的行列不变",
+            translate_formula("=$A1+B$2+'标的 价格'!C3", 1, 1),
+            "=$A2+C$2+'标的 价格'!D4",
+        ),
+        (
+            "memory 后端删除列",
+            wb.get_formula("看涨阶梯", "D1"),
+            "=SUM(B1:C1)+'标的 价格'!E2",
+        ),
+        (
+            "memory 后端删除列时调整其他 Sheet 中的引用",
+            wb.get_formula("标的 价格", "A1"),
+            "=看涨阶梯!C1+'看涨阶梯'!$B$1:$D$1+E1",
+        ),
+    ]
+
+
+def check_formulas() -> List[Case]:
+    """检查复制和删除列时公式引用的调整规则，返回与期望不一致的用例"""
+    return [case for case in _cases() if case[1] != case[2]]
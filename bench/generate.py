@@ -0,0 +1,176 @@
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from email.header import Header
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime, make_msgid
+from typing import List, Optional, Tuple
+
+from bench.fixtures import BENCH_FROM_ADDR, inquiry_html, inquiry_rows
+from processor.mapping import CBG_SHEET_HANDLER
+
+# 无法报价的邮件：标的不支持、报价字段已填写、没有表格、产品未配置、没有发送时间
+INVALID_KINDS = ("underlying", "filled", "no_table", "product", "no_date")
+
+ATTACHMENT_NAMES = ("产品说明书.pdf", "询价单.xlsx", "风险揭示书.docx")
+
+
+class InquiryGenerator:
+    """
+    生成广发银行格式的询价邮件（原始 MIME 数据），用于回放和压力测试
+
+    - 表格标签与 CBGBullLadderHandler / CBGBinarryCallHandler 一致，报价字段为空
+    - 标的在 AU9999.SGE 与 XAU.IDC 之间交替，两种产品各占一半
+    - 标题和正文按比例使用 GB2312 或 UTF-8 编码，部分邮件带附件
+    - 按比例混入重复投递（同一原始邮件再投递一次）、hold 和无法报价的邮件
+
+    带附件的邮件为 multipart/mixed，正文与附件同级，与解析器读取顶层 HTML 的方式一致
+    """
+
+    def __init__(
+        self,
+        dup_ratio: float = 0.0,
+        hold_ratio: float = 0.0,
+        invalid_ratio: float = 0.0,
+        attachment_ratio: float = 0.0,
+        gb2312_ratio: float = 0.5,
+        span: float = 8 * 3600,
+        start: Optional[datetime] = None,
+        attachment_size: int = 20 * 1024,
+        from_addr: str = BENCH_FROM_ADDR,
+        seed: int = 0,
+    ) -> None:
+        """
+        :param span: 邮件在多少秒内到达，到达时间随机分布
+        :param start: 第一封邮件的最早发送时间，默认为今天 9 点
+        :param attachment_size: 附件大小（字节）
+        """
+        if dup_ratio + hold_ratio + invalid_ratio > 1:
+            raise ValueError("重复、hold 和无法报价的比例之和不能超过 1")
+
+        self.ratios = {
+            "duplicate": dup_ratio,
+            "hold": hold_ratio,
+            "invalid": invalid_ratio,
+        }
+        self.attachment_ratio = attachment_ratio
+        self.gb2312_ratio = gb2312_ratio
+        self.span = span
+        self.start = start or datetime.now().replace(
+            hour=9, minute=0, second=0, microsecond=0
+        )
+        self.attachment_size = attachment_size
+        self.from_addr = from_addr
+        self.random = random.Random(seed)
+        # 已生成的各类邮件数，无法报价的邮件按 invalid:类型 统计
+        self.kinds: Counter = Counter()
+
+    def generate(self, count: int) -> List[Tuple[float, bytes]]:
+        """
+        :return: [(到达偏移（秒）, 原始邮件数据)]，按到达时间排序，可直接交给 run_replay
+        """
+        offsets = sorted(self.random.uniform(0, self.span) for _ in range(count))
+        sheet_names = list(CBG_SHEET_HANDLER)
+        mails: List[Tuple[float, bytes]] = []
+        originals: List[bytes] = []
+
+        for index, offset in enumerate(offsets):
+            kind = self._choose_kind()
+            if kind == "duplicate" and not originals:
+                kind = "valid"
+            self.kinds[kind] += 1
+
+            if kind == "duplicate":
+                mails.append((offset, self.random.choice(originals)))
+                continue
+
+            sent_time = self.start + timedelta(seconds=int(offset))
+            raw = self.build(
+                sheet_names[index % len(sheet_names)], index, sent_time, kind
+            )
+            if kind == "valid":
+                originals.append(raw)
+            mails.append((offset, raw))
+        return mails
+
+    def _choose_kind(self) -> str:
+        value = self.random.random()
+        for kind, ratio in self.ratios.items():
+            if value < ratio:
+                return kind
+            value -= ratio
+        return "valid"
+
+    def build(
+        self, sheet_name: str, index: int, sent_time: datetime, kind: str = "valid"
+    ) -> bytes:
+        """构造一封询价邮件，kind 为 valid、hold 或 invalid"""
+        rows = inquiry_rows(sheet_name, index)
+        subject = f"衍生品交易-{sheet_name}-询价{index:06d}"
+        invalid = None
+        if kind == "hold":
+            subject += " hold"
+        elif kind == "invalid":
+            invalid = self.random.choice(INVALID_KINDS)
+            self.kinds[f"invalid:{invalid}"] += 1
+
+        if invalid == "underlying":
+            rows["挂钩标的合约"] = "白银（AG9999.SGE）"
+        elif invalid == "filled":
+            quote_name = CBG_SHEET_HANDLER[sheet_name].quote_name
+            rows[quote_name] = "100.00%"
+        elif invalid == "product":
+            subject = f"衍生品交易-鲨鱼鳍-询价{index:06d}"
+
+        html = (
+            "<html><body><p>您好，请报价。</p></body></html>"
+            if invalid == "no_table"
+            else inquiry_html(rows)
+        )
+        charset = "gb2312" if self.random.random() < self.gb2312_ratio else "utf-8"
+        with_attachment = self.random.random() < self.attachment_ratio
+
+        msg = MIMEMultipart("mixed" if with_attachment else "alternative")
+        msg["Message-ID"] = make_msgid(domain="bench.swhysc.com")
+        msg["Subject"] = Header(subject, charset).encode()
+        msg["From"] = f"{Header('广发银行', charset).encode()} <{self.from_addr}>"
+        msg["To"] = "quote@swhysc.com"
+        if invalid != "no_date":
+            msg["Date"] = format_datetime(sent_time.astimezone())
+        msg.attach(MIMEText("请见表格。", "plain", charset))
+        msg.attach(MIMEText(html, "html", charset))
+
+        if with_attachment:
+            filename = self.random.choice(ATTACHMENT_NAMES)
+            size = self.attachment_size
+            part = MIMEApplication(
+                self.random.getrandbits(size * 8).to_bytes(size, "little")
+            )
+            part.add_header(
+                "Content-Disposition", "attachment", filename=("utf-8", "", filename)
+            )
+            msg.attach(part)
+            self.kinds["attachment"] += 1
+        self.kinds[charset] += 1
+        return msg.as_bytes()
+
+    def report(self) -> str:
+        return " ".join(f"{kind}={count}" for kind, count in sorted(self.kinds.items()))
+
+
+def write_mailbox(mails: List[Tuple[float, bytes]], path: str, fmt: str = "mbox"):
+    """把生成的邮件写入 mbox 或 maildir，供 bench replay 读取"""
+    from bench.replay import open_mailbox
+
+    box = open_mailbox(path, create=True, fmt=fmt)
+    box.lock()
+    try:
+        for _, raw in mails:
+            box.add(raw)
+        box.flush()
+    finally:
+        box.unlock()
+        box.close()
+    return len(mails)
@@ -0,0 +1,109 @@
+import email
+import gc
+import pickle
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from email.message import Message
+from typing import Callable, List, Optional
+
+from bench.generate import InquiryGenerator
+from core.parser import ParsedMail, parse_mail_bytes
+from core.schemas import EachMail, MailContent
+
+
+@dataclass
+class LegacyEachMail:
+    """之前的 EachMail：同时保存原始邮件对象、HTML 文本和 BeautifulSoup"""
+
+    msg_id: str
+    subject: str
+    from_name: str
+    from_addr: str
+    content: MailContent
+    message: Message
+    sent_time: datetime
+    df_dict: dict
+    soup: Optional[object] = None
+    sheet_name: str = "二元看涨"
+    underlying: str = "标的合约"
+
+
+def _legacy(parsed: ParsedMail, raw: bytes) -> LegacyEachMail:
+    from bs4 import BeautifulSoup
+
+    subject, sender, sender_email, sent_time, sheet_name = parsed.header_info
+    return LegacyEachMail(
+        msg_id=parsed.msg_id,
+        subject=subject,
+        from_name=sender,
+        from_addr=sender_email,
+        content=parsed.content,
+        message=email.message_from_bytes(raw),
+        sent_time=sent_time,
+        df_dict=parsed.df_dict,
+        soup=BeautifulSoup(parsed.content.html, "html.parser"),
+        sheet_name=sheet_name,
+        underlying=parsed.underlying,
+    )
+
+
+def _compact(parsed: ParsedMail, raw: bytes) -> EachMail:
+    subject, sender, sender_email, sent_time, sheet_name = parsed.header_info
+    return EachMail(
+        msg_id=parsed.msg_id,
+        subject=subject,
+        from_name=sender,
+        from_addr=sender_email,
+        content=parsed.content,
+        sent_time=sent_time,
+        df_dict=parsed.df_dict,
+        sheet_name=sheet_name,
+        underlying=parsed.underlying,
+        # 复制一份，使原始数据计入邮件对象的内存，之前的对象不保留原始数据
+        raw=bytes(memoryview(raw)),
+    )
+
+
+def _measure(build: Callable, parsed: List[ParsedMail], raws: List[bytes]) -> dict:
+    """tracemalloc 统计 build 生成的对象保留的内存，两者共用的解析结果在统计前已存在，不计入"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    mails = [build(item, raw) for item, raw in zip(parsed, raws)]
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pickled = sum(len(pickle.dumps(mail)) for mail in mails)
+    return {
+        "mails": len(mails),
+        "build_seconds": elapsed,
+        "retained_mb": retained / 1024 / 1024,
+        "peak_mb": peak / 1024 / 1024,
+        "pickled_mb": pickled / 1024 / 1024,
+    }
+
+
+def run_memory(count: int = 10_000, attachment_ratio: float = 0.1) -> dict:
+    """
+    比较 count 封询价邮件分别以之前的 EachMail（LegacyEachMail）和紧凑的 EachMail 保存时的内存占用
+
+    两者使用相同的解析结果（df_dict、MailContent），只比较邮件对象本身新增的内存：
+    之前的对象保存邮件对象和 soup，紧凑的对象只保存原始数据，邮件对象和 soup 按需生成
+    :return: {"legacy": {...}, "compact": {...}}，包括构造耗时、保留内存、内存峰值和序列化大小
+    """
+    generator = InquiryGenerator(attachment_ratio=attachment_ratio, span=0)
+    raws = [raw for _, raw in generator.generate(count)]
+    parsed = []
+    for index, raw in enumerate(raws):
+        header = email.message_from_bytes(raw)
+        header_info = (header["Subject"], "bench", header["From"], datetime.now(), "")
+        parsed.append(parse_mail_bytes(str(index), header_info, raw))
+
+    return {
+        "legacy": _measure(_legacy, parsed, raws),
+        "compact": _measure(_compact, parsed, raws),
+    }
@@ -0,0 +1,290 @@
+import contextlib
+import email
+import hashlib
+import io
+import json
+import os
+import platform
+import tempfile
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bench.fixtures import BENCH_FROM_ADDR, inquiry_html, inquiry_rows, make_each_mail
+from bench.generate import InquiryGenerator
+
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baselines.json"
+)
+
+# 默认允许比基线慢 25%，超过即判定为性能回退
+DEFAULT_THRESHOLD = 0.25
+
+DEFAULT_DB_ROWS = 1_000_000
+
+# 每个测试用例：名称 -> (每轮调用次数, 准备函数)，准备函数返回被测函数
+Case = Tuple[int, Callable[[], Callable[[], object]]]
+
+
+def _inquiry_message(charset: str = "gb2312") -> bytes:
+    generator = InquiryGenerator(gb2312_ratio=1.0 if charset == "gb2312" else 0.0)
+    return generator.build("看涨阶梯", 1, datetime.now())
+
+
+def _parse_html_to_dict():
+    from core.parser import parse_html_to_dict
+
+    html = inquiry_html(inquiry_rows("看涨阶梯", 1))
+    return lambda: parse_html_to_dict(html)
+
+
+def _extract_mail_content():
+    from core.parser import extract_mail_content
+
+    msg = email.message_from_bytes(_inquiry_message())
+    return lambda: extract_mail_content(msg)
+
+
+def _parse_subject():
+    from core.parser import parse_subject
+
+    msg = email.message_from_bytes(_inquiry_message())
+    return lambda: parse_subject(msg)
+
+
+def _get_mail_hash():
+    from core.parser import get_mail_hash
+
+    mail = make_each_mail("看涨阶梯", 1)
+    return lambda: get_mail_hash(mail)
+
+
+def _cannot_quote():
+    from processor.registry import get_processor
+
+    processor = get_processor(BENCH_FROM_ADDR)
+    mail = make_each_mail("看涨阶梯", 1)
+    return lambda: processor.cannot_quote(mail)
+
+
+def _process_mail_html():
+    from processor.registry import get_processor
+
+    processor = get_processor(BENCH_FROM_ADDR)
+    mail = make_each_mail("看涨阶梯", 1)
+    return lambda: processor.process_mail_html(mail, 1.2345)
+
+
+def _build_reply_mime():
+    from core.client import EmailClient
+
+    client = EmailClient("localhost", BENCH_FROM_ADDR, "")
+    mail = make_each_mail("看涨阶梯", 1)
+    return lambda: client._build_reply_mime(mail).as_bytes()
+
+
+CASES: Dict[str, Case] = {
+    "parse_html_to_dict": (200, _parse_html_to_dict),
+    "extract_mail_content": (200, _extract_mail_content),
+    "parse_subject": (2000, _parse_subject),
+    "get_mail_hash": (5000, _get_mail_hash),
+    "cannot_quote": (5000, _cannot_quote),
+    "process_mail_html": (200, _process_mail_html),
+    "build_reply_mime": (200, _build_reply_mime),
+}
+
+# 在 rows 行的数据库上运行的用例
+DB_CASES = ("create_record", "get_unprocessed_mails")
+
+
+def prepare_database(rows: int, path: Optional[str] = None) -> str:
+    """
+    准备有 rows 行邮件记录的 SQLite 数据库并切换会话，文件保留在临时目录中供下次复用
+
+    mail_raw 只写入很短的数据，否则百万行的数据库有数十 GB
+    """
+    from sqlalchemy import create_engine, func, insert, select
+
+    from db.engine import SessionLocal
+    from db.enums import MailStateEnum
+    from db.models import Base, MailState
+
+    path = path or os.path.join(tempfile.gettempdir(), f"quoter-bench-{rows}.db")
+    engine = create_engine(f"sqlite+pysqlite:///{path}", echo=False)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+
+    with engine.begin() as conn:
+        existing = conn.execute(select(func.count()).select_from(MailState)).scalar()
+        sent = datetime.now(timezone(timedelta(hours=8))) - timedelta(days=30)
+        states = list(MailStateEnum)
+        for start in range(existing, rows, 50_000):
+            conn.execute(
+                insert(MailState),
+                [
+                    {
+                        "mail_hash": hashlib.sha256(str(i).encode()).hexdigest(),
+                        "subject": f"衍生品交易-看涨阶梯-询价{i:07d}",
+                        "underlying": "AU9999SGE",
+                        "from_addr": BENCH_FROM_ADDR,
+                        "state": states[i % len(states)],
+                        "sheet_name": ("看涨阶梯", "二元看涨")[i % 2],
+                        "rev_time": sent + timedelta(seconds=i),
+                        "created_time": sent + timedelta(seconds=i),
+                        "mail_raw": b"",
+                        "df_dict": "{}",
+                        "soup": "",
+                    }
+                    for i in range(start, min(start + 50_000, rows))
+                ],
+            )
+    return path
+
+
+def _db_cases(rows: int, repeat: int) -> Dict[str, Case]:
+    from db.models import MailState
+
+    # create_record 每次写入一封新邮件，预热一次加上 repeat 轮
+    number = 200
+    mails = [make_each_mail("看涨阶梯", i) for i in range(number * repeat + 1)]
+    for index, mail in enumerate(mails):
+        mail.subject = f"bench-micro-{os.getpid()}-{index}"
+    pending = iter(mails)
+    state = MailState()
+
+    # 一半为已存在的记录（状态各异），一半不存在
+    hashes = [
+        hashlib.sha256(str(i).encode()).hexdigest()
+        for i in range(0, rows, rows // 25 or 1)
+    ]
+    hashes += [hashlib.sha256(f"missing-{i}".encode()).hexdigest() for i in range(25)]
+
+    return {
+        "create_record": (number, lambda: lambda: state.create_record(next(pending))),
+        "get_unprocessed_mails": (
+            number,
+            lambda: lambda: state.get_unprocessed_mails("看涨阶梯", hashes),
+        ),
+    }
+
+
+def _cleanup_database() -> None:
+    from db.models import MailState
+    from db.session import session_scope
+
+    with session_scope() as session:
+        session.query(MailState).filter(
+            MailState.subject.like(f"bench-micro-{os.getpid()}-%")
+        ).delete(synchronize_session=False)
+
+
+def run_micro(
+    only: Optional[List[str]] = None, db_rows: int = DEFAULT_DB_ROWS, repeat: int = 3
+) -> Dict[str, float]:
+    """
+    运行热点路径的基准测试
+
+    :param only: 只运行这些用例，默认全部运行
+    :param db_rows: 数据库用例的记录数，0 为不运行数据库用例
+    :param repeat: 每个用例重复的轮数，取最快的一轮
+    :return: {用例名称: 每次调用耗时（微秒）}
+    """
+    cases = dict(CASES)
+    wanted_db = [name for name in DB_CASES if not only or name in only]
+    if db_rows and wanted_db:
+        prepare_database(db_rows)
+        cases.update(_db_cases(db_rows, repeat))
+
+    results = {}
+    try:
+        for name, (number, setup) in cases.items():
+            if only and name not in only:
+                continue
+            func = setup()
+            # process_mail_html 等函数会打印日志，计时时不输出到终端
+            with contextlib.redirect_stdout(io.StringIO()):
+                func()
+                best = min(timeit.Timer(func).repeat(repeat, number))
+            results[name] = best / number * 1e6
+    finally:
+        if db_rows and wanted_db:
+            _cleanup_database()
+    return results
+
+
+def machine_key() -> str:
+    """
+    当前机器的标识：系统、架构、CPU 型号、核数和 Python 版本
+
+    耗时只在同一标识的基线之间比较，不同机器的绝对耗时没有可比性
+    """
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return (
+        f"{platform.system()} {platform.machine()} {cpu or 'unknown'} "
+        f"x{os.cpu_count()} py{platform.python_version()}"
+    )
+
+
+def load_baselines(path: str = BASELINE_FILE, machine: Optional[str] = None) -> dict:
+    """读取 machine（默认为当前机器）的基线，没有时返回空字典"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        machines = json.load(f).get("machines", {})
+    return machines.get(machine or machine_key(), {})
+
+
+def save_baselines(
+    results: Dict[str, float], db_rows: int, path: str = BASELINE_FILE
+) -> None:
+    """保存当前机器的基线，本次未运行的用例保留原值，其他机器的基线不变"""
+    machines = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            machines = json.load(f).get("machines", {})
+
+    key = machine_key()
+    cases = machines.get(key, {}).get("cases", {})
+    cases.update({name: round(us, 3) for name, us in results.items()})
+    machines[key] = {"db_rows": db_rows, "cases": dict(sorted(cases.items()))}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"machines": dict(sorted(machines.items()))},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+        f.write("\n")
+
+
+def compare(
+    results: Dict[str, float],
+    baselines: dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    db_rows: int = DEFAULT_DB_ROWS,
+) -> List[Tuple[str, float, Optional[float], Optional[float], bool]]:
+    """
+    与当前机器的基线比较
+
+    :param baselines: load_baselines 读取的当前机器的基线，为空时所有用例都不比较
+    :return: [(用例, 本次耗时, 基线耗时, 变化比例, 是否回退)]，数据库行数与基线不同时数据库用例不比较
+    """
+    cases = baselines.get("cases", {})
+    same_rows = baselines.get("db_rows") == db_rows
+    rows = []
+    for name, us in results.items():
+        baseline = cases.get(name)
+        if baseline is None or (name in DB_CASES and not same_rows):
+            rows.append((name, us, None, None, False))
+            continue
+        change = us / baseline - 1
+        rows.append((name, us, baseline, change, change > threshold))
+    return rows
@@ -0,0 +1,46 @@
+import time
+from typing import Dict, Sequence
+
+from bench.fakemail import FakeMailServer
+from bench.generate import InquiryGenerator
+from core.parse_pool import get_parse_pool
+
+
+def run_parse(
+    count: int = 500,
+    workers: Sequence[int] = (1, 2, 4),
+    fetch_latency: float = 0.002,
+    attachment_ratio: float = 0.1,
+) -> Dict[int, dict]:
+    """
+    从进程内的 IMAP 读取并解析 count 封询价邮件，比较不同解析进程数的吞吐
+
+    :param workers: 解析进程数，1 为在读取邮件的线程中解析
+    :param fetch_latency: 每次 FETCH 的模拟网络往返耗时（秒），进程池解析与之重叠
+    :return: {进程数: {"parsed": 解析得到的邮件数, "seconds": 耗时, "mails_per_second": 吞吐}}
+    """
+    server = FakeMailServer(fetch_latency=fetch_latency)
+    generator = InquiryGenerator(attachment_ratio=attachment_ratio, span=0)
+    mails = generator.generate(count)
+    for _, raw in mails:
+        server.deliver(raw)
+    client = server.client()
+
+    results = {}
+    for worker_count in workers:
+        pool = get_parse_pool(worker_count)
+        if pool is not None:
+            # 预先启动子进程，不计入解析耗时
+            pool.submit(None, (), mails[0][1]).result()
+
+        started = time.perf_counter()
+        result_dict = client.read_mail(parse_workers=worker_count)
+        elapsed = time.perf_counter() - started
+
+        parsed = sum(len(mails) for mails in result_dict.values())
+        results[worker_count] = {
+            "parsed": parsed,
+            "seconds": elapsed,
+            "mails_per_second": parsed / elapsed if elapsed else 0.0,
+        }
+    return results
@@ -0,0 +1,172 @@
+import mailbox
+import os
+import threading
+import time
+from datetime import date
+from typing import List, Optional, Tuple
+
+from bench.fakemail import FakeMailServer
+from bench.fixtures import use_temp_database
+from bench.flow import confirm_all
+from core.backend import open_workbook
+from core.handler import MailHandler
+from core.parser import parse_headers, parse_mail_sent_time
+from core.timings import percentile
+from main import reply_emails
+from processor.registry import subject_sheet_map
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # Windows 没有 resource 模块，不统计内存峰值
+
+
+def open_mailbox(path: str, create: bool = False, fmt: Optional[str] = None):
+    """目录为 maildir，文件为 mbox"""
+    if fmt is None:
+        fmt = "maildir" if os.path.isdir(path) else "mbox"
+    if fmt == "maildir":
+        return mailbox.Maildir(path, factory=None, create=create)
+    return mailbox.mbox(path, create=create)
+
+
+def record_folder(
+    client,
+    path: str,
+    folder: str = "银行询价",
+    since_date: Optional[date] = None,
+    fmt: str = "mbox",
+) -> int:
+    """
+    把邮箱文件夹中指定日期之后的邮件原样保存为 mbox 或 maildir
+
+    :param client: 邮件客户端，通常为 get_mail_client()
+    :return: 保存的邮件数
+    """
+    from imapclient.imap_utf7 import encode as encode_folder_name
+
+    since_date = since_date or date.today()
+    imap = client.connect("imap")
+    box = open_mailbox(path, create=True, fmt=fmt)
+    count = 0
+    try:
+        imap.select(encode_folder_name(folder))
+        message_ids = client.search_mail_ids(imap, since_date) or []
+        box.lock()
+        for msg_id in message_ids:
+            status, msg_data = imap.fetch(msg_id, "(RFC822)")
+            if status != "OK" or not msg_data or not msg_data[0]:
+                continue
+            box.add(msg_data[0][1])
+            count += 1
+        box.flush()
+    finally:
+        box.unlock()
+        box.close()
+        imap.logout()
+    return count
+
+
+def load_recording(path: str) -> List[Tuple[float, bytes]]:
+    """
+    读取录制的邮件，按发送时间排序
+
+    :return: [(相对第一封邮件的发送时间偏移（秒）, 原始邮件数据)]，无法解析发送时间的偏移为 0
+    """
+    box = open_mailbox(path)
+    try:
+        raws = [box.get_bytes(key) for key in box.keys()]
+    finally:
+        box.close()
+
+    timed = []
+    for raw in raws:
+        sent_time = parse_mail_sent_time(parse_headers(raw))
+        timed.append((sent_time.timestamp() if sent_time else None, raw))
+
+    starts = [at for at, _ in timed if at is not None]
+    first = min(starts) if starts else 0.0
+    recording = [(0.0 if at is None else at - first, raw) for at, raw in timed]
+    recording.sort(key=lambda item: item[0])
+    return recording
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # Linux 上 ru_maxrss 的单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_replay(
+    recording: List[Tuple[float, bytes]],
+    speed: float = 0.0,
+    poll_interval: float = 5.0,
+    engine: str = "excel",
+):
+    """
+    按录制时的到达间隔把邮件投递到进程内的 IMAP，
+    循环运行 read_mail → MailHandler → 确认 → reply_emails，回复发到进程内的 SMTP
+
+    :param recording: load_recording 或邮件生成器得到的 [(到达偏移（秒）, 原始邮件数据)]
+    :param speed: 回放倍速，1 为按原速，10 为 10 倍速，0 为不等待、全部立即投递
+    :param poll_interval: 两次读取邮箱之间的间隔（秒），speed 为 0 时不等待
+    :param engine: 报价引擎
+    :return: 吞吐、投递到回复的耗时分位数和资源占用
+    """
+    use_temp_database()
+    server = FakeMailServer()
+    client = server.client()
+    wb = open_workbook(None, "memory")
+    handler = MailHandler(pricing_engine=engine)
+
+    def feed():
+        started = time.monotonic()
+        for offset, raw in recording:
+            if speed > 0:
+                delay = started + offset / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            server.deliver(raw)
+
+    feeder = threading.Thread(target=feed, name="replay-feed", daemon=True)
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    feeder.start()
+
+    polls = 0
+    poll_seconds: List[float] = []
+    while True:
+        # 投递结束后再读取一次，保证最后到达的邮件也被处理
+        finished = not feeder.is_alive()
+        poll_started = time.perf_counter()
+        handler.handle(wb, client.read_mail())
+        for sheet_name in subject_sheet_map:
+            confirm_all(wb, sheet_name)
+            reply_emails(sheet_name, wb=wb, sender=client)
+        poll_seconds.append(time.perf_counter() - poll_started)
+        polls += 1
+        if finished:
+            break
+        if speed > 0:
+            time.sleep(poll_interval)
+
+    elapsed = time.perf_counter() - started
+    latencies = sorted(server.latencies())
+    return {
+        "delivered": len(server.messages),
+        "replied": len(server.sent),
+        "polls": polls,
+        "seconds": elapsed,
+        "mails_per_second": len(server.sent) / elapsed if elapsed else 0.0,
+        "latency": {
+            f"p{p}": percentile(latencies, p) if latencies else None
+            for p in (50, 95, 99)
+        },
+        "latency_max": latencies[-1] if latencies else None,
+        "poll_max_seconds": max(poll_seconds),
+        "cpu_seconds": time.process_time() - cpu_started,
+        "peak_rss_mb": _peak_rss_mb(),
+        "server": dict(server.stats),
+        "workbook_calls": sum(getattr(wb, "calls", {}).values()),
+    }
@@ -0,0 +1,81 @@
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+from email.mime.message import MIMEMessage
+from typing import Callable
+
+from bench.fixtures import BENCH_FROM_ADDR
+from bench.generate import InquiryGenerator
+from core.schemas import EachMail, MailContent
+
+
+def _original(size: int) -> bytes:
+    generator = InquiryGenerator(attachment_ratio=1.0, attachment_size=size)
+    return generator.build("看涨阶梯", 1, datetime.now())
+
+
+def _mail(raw: bytes) -> EachMail:
+    return EachMail(
+        msg_id="1",
+        subject="衍生品交易-看涨阶梯-询价000001",
+        from_name="bench",
+        from_addr=BENCH_FROM_ADDR,
+        content=MailContent(plain="", html="<p>报价见表格</p>"),
+        sent_time=datetime.now(),
+        df_dict={},
+        raw=raw,
+    )
+
+
+def _legacy(client, mail: EachMail) -> bytes:
+    """之前的做法：解析整封原始邮件，以 MIMEMessage 附加，发送时重新序列化"""
+    reply = client._build_reply_mime(mail)
+    related = reply.get_payload(0)
+    related.get_payload()[-1] = MIMEMessage(mail.message)
+    return reply.as_bytes()
+
+
+def _direct(client, mail: EachMail) -> bytes:
+    return client._build_reply_mime(mail).as_bytes()
+
+
+def _measure(build: Callable, client, raw: bytes, rounds: int) -> dict:
+    """每轮使用新的 EachMail，解析结果不跨轮复用；内存峰值取第一轮"""
+    elapsed = []
+    peak = 0
+    for index in range(rounds):
+        mail = _mail(raw)
+        gc.collect()
+        if index == 0:
+            tracemalloc.start()
+        started = time.perf_counter()
+        data = build(client, mail)
+        elapsed.append(time.perf_counter() - started)
+        if index == 0:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return {
+        "build_ms": min(elapsed) * 1000,
+        "peak_mb": peak / 1024 / 1024,
+        "reply_mb": len(data) / 1024 / 1024,
+        "verbatim": raw in data,
+    }
+
+
+def run_reply(size: int = 5 * 1024 * 1024, rounds: int = 5) -> dict:
+    """
+    比较回复带 size 字节附件的询价邮件时，两种附加原始邮件方式的构建耗时和内存峰值
+
+    耗时包括构建回复和序列化为发送的数据（as_bytes），取 rounds 轮中最快的一轮
+    :return: {"original_mb": 原始邮件大小, "legacy": {...}, "direct": {...}}
+    """
+    from core.client import EmailClient
+
+    client = EmailClient("localhost", BENCH_FROM_ADDR, "")
+    raw = _original(size)
+    return {
+        "original_mb": len(raw) / 1024 / 1024,
+        "legacy": _measure(_legacy, client, raw, rounds),
+        "direct": _measure(_direct, client, raw, rounds),
+    }
@@ -0,0 +1,135 @@
+import email
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+from bench.fixtures import (
+    inquiry_html,
+    inquiry_message,
+    inquiry_rows,
+    use_temp_database,
+)
+from bench.flow import NullSender, confirm_all
+from core.backend import open_workbook
+from core.client import EmailClient
+from core.parse_pool import get_parse_pool
+from core.pipeline import Pipeline, RawMail
+from processor.registry import subject_sheet_map
+
+
+class ListSource:
+    """按固定间隔逐批产出预先构造的原始邮件，模拟邮箱中陆续到达的询价"""
+
+    def __init__(
+        self, client: EmailClient, raw_mails: List[bytes], per_poll: int
+    ) -> None:
+        self.client = client
+        self.raw_mails = raw_mails
+        self.per_poll = per_poll
+        self.closed = False
+
+    def poll(self) -> Iterator[RawMail]:
+        batch, self.raw_mails = (
+            self.raw_mails[: self.per_poll],
+            self.raw_mails[self.per_poll :],
+        )
+        for index, raw in enumerate(batch):
+            header_info = self.client._is_valid_header_msg(
+                email.message_from_bytes(raw)
+            )
+            if header_info:
+                yield str(index).encode(), header_info, raw
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def make_raw_mails(count: int) -> List[bytes]:
+    """构造 count 封原始询价邮件，两种产品各占一半"""
+    sheet_names = ["看涨阶梯", "二元看涨"]
+    raw_mails = []
+    for index in range(count):
+        sheet_name = sheet_names[index % 2]
+        subject = f"衍生品交易-{sheet_name}-询价{index:05d}"
+        sent_time = datetime.now().replace(microsecond=0) - timedelta(seconds=index)
+        html = inquiry_html(inquiry_rows(sheet_name, index))
+        raw_mails.append(inquiry_message(subject, html, sent_time).as_bytes())
+    return raw_mails
+
+
+def run_serve(
+    mails: int = 200,
+    per_poll: int = 50,
+    queue_size: int = 20,
+    batch_size: int = 50,
+    parse_workers: int = 1,
+):
+    """
+    在 memory 后端上运行常驻流水线：邮件分批到达，全部入库后模拟业务人员确认，
+    回复完成后停止，统计吞吐和各阶段队列深度的峰值
+
+    :param per_poll: 每次读取到达的邮件数
+    :param queue_size: 各阶段队列容量
+    :param parse_workers: 解析邮件的进程数，大于 1 时使用解析进程池
+    """
+    use_temp_database()
+    client = EmailClient("localhost", "bench@swhysc.com", "")
+    source = ListSource(client, make_raw_mails(mails), per_poll)
+    sender = NullSender()
+    pipeline = Pipeline(
+        source,
+        client,
+        lambda: open_workbook(None, "memory"),
+        sender=sender,
+        queue_size=queue_size,
+        batch_size=batch_size,
+        batch_window=0.05,
+        fetch_interval=0.05,
+        watch_interval=0.05,
+        debounce=0.0,
+        parse_pool=get_parse_pool(parse_workers),
+    )
+
+    peaks = {name: 0 for name in pipeline.queues}
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.is_set():
+            for name, depth in pipeline.status()["queues"].items():
+                peaks[name] = max(peaks[name], depth)
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    started = time.perf_counter()
+    sampler.start()
+    pipeline.start()
+
+    while len(pipeline.persisted) < mails:
+        time.sleep(0.01)
+    persisted = time.perf_counter()
+
+    def confirm(wb):
+        for sheet_name in subject_sheet_map:
+            confirm_all(wb, sheet_name)
+
+    pipeline.submit(confirm)
+    while len(sender.sent) < mails:
+        time.sleep(0.01)
+    replied = time.perf_counter()
+
+    pipeline.stop()
+    pipeline.join()
+    sampling.set()
+    sampler.join()
+
+    return {
+        "mails": mails,
+        "sent": len(sender.sent),
+        "persist_seconds": persisted - started,
+        "reply_seconds": replied - persisted,
+        "total_seconds": time.perf_counter() - started,
+        "peaks": peaks,
+        "status": pipeline.format_status(),
+        "source_closed": source.closed,
+    }
@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+import time
+from typing import List
+
+from bench.fixtures import make_result_dict, use_temp_database
+from core.backend import open_workbook
+from core.handler import MailHandler
+
+
+def run_shards(mails: int, workers: List[int], filename: str, engine: str = "excel"):
+    """
+    在 headless 后端上按不同进程数运行 MailHandler.handle，统计每秒处理的邮件数
+
+    每次运行都使用工作簿文件的新副本和新的临时数据库
+    :param filename: 报价工作簿模板文件
+    :return: [{"workers": .., "seconds": .., "mails_per_second": ..}]
+    """
+    results = []
+    for count in workers:
+        use_temp_database()
+        path = os.path.join(tempfile.mkdtemp(prefix="quoter-bench-"), "bench.xlsx")
+        shutil.copyfile(filename, path)
+        wb = open_workbook(path, "headless")
+        result_dict = make_result_dict(mails)
+
+        started = time.perf_counter()
+        MailHandler(pricing_engine=engine, workers=count).handle(wb, result_dict)
+        seconds = time.perf_counter() - started
+
+        results.append(
+            {
+                "workers": count,
+                "seconds": seconds,
+                "mails_per_second": mails / seconds if seconds else 0.0,
+            }
+        )
+    return results
@@ -0,0 +1,93 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Sequence
+
+CLI = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cli.py"
+)
+
+# 默认测量的命令：查看帮助和数据库命令只应加载 click
+DEFAULT_COMMANDS = ["--help", "db --help", "mail --help", "market --help"]
+
+# 启动时不应加载的重量级依赖，只在执行具体命令时导入
+HEAVY_MODULES = (
+    "sqlalchemy",
+    "bs4",
+    "imapclient",
+    "numpy",
+    "pandas",
+    "openpyxl",
+    "xlwings",
+    "pycel",
+    "prometheus_client",
+)
+
+# 在子进程中运行命令后输出已加载的重量级依赖
+_IMPORT_PROBE = """
+import runpy, sys
+sys.argv = [sys.argv[1], *sys.argv[2:]]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit:
+    pass
+finally:
+    loaded = " ".join(m for m in {modules!r} if m in sys.modules)
+    sys.stderr.write("\\nheavy:" + loaded + "\\n")
+"""
+
+
+def measure_startup(args: Sequence[str], runs: int = 5) -> List[float]:
+    """在子进程中运行 python cli.py <args> runs 次，返回每次的耗时（秒）"""
+    seconds = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, CLI, *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+def heavy_imports(args: Sequence[str]) -> List[str]:
+    """运行 python cli.py <args>，返回启动过程中加载的重量级依赖，与机器性能无关"""
+    probe = _IMPORT_PROBE.format(modules=HEAVY_MODULES)
+    completed = subprocess.run(
+        [sys.executable, "-c", probe, CLI, *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    # 命令出错时 traceback 在标记行之后输出，只取标记行
+    _, marker, heavy = completed.stderr.rpartition("\nheavy:")
+    return heavy.split("\n", 1)[0].split() if marker else []
+
+
+def run_startup(commands: Sequence[str] = DEFAULT_COMMANDS, runs: int = 5):
+    """
+    测量命令行的启动耗时
+
+    :param commands: 要测量的命令参数，如 "db --help"
+    :param runs: 每个命令运行的次数
+    :return: [{命令, 中位数, 最小值, 最大值, 加载的重量级依赖}]，单位毫秒
+    """
+    # 先运行一次，排除首次编译字节码和读取磁盘的影响
+    measure_startup(["--help"], runs=1)
+
+    results: List[Dict] = []
+    for command in commands:
+        seconds = measure_startup(command.split(), runs)
+        results.append(
+            {
+                "command": command,
+                "median_ms": statistics.median(seconds) * 1000,
+                "min_ms": min(seconds) * 1000,
+                "max_ms": max(seconds) * 1000,
+                "heavy": heavy_imports(command.split()),
+            }
+        )
+    return results
@@ -0,0 +1,64 @@
+import time
+
+from bench.fixtures import make_result_dict, use_temp_database
+from bench.flow import NullSender, confirm_all
+from core.backend import open_workbook
+from core.excel import ExcelHandler
+from core.handler import MailHandler
+from core.watcher import ConfirmationWatcher
+from processor.registry import subject_sheet_map
+
+
+def run_watch(mails: int = 24, rounds: int = 4, debounce: float = 0.0):
+    """
+    在 memory 后端上报价后分批确认，由 ConfirmationWatcher 轮询发送，统计确认到发送的耗时
+
+    :param mails: 询价邮件数量
+    :param rounds: 分几批确认，每批之间轮询一次
+    :param debounce: 防抖时间（秒）
+    :return: 发送数量、确认到发送的耗时和空轮询的耗时
+    """
+    use_temp_database()
+    wb = open_workbook(None, "memory")
+    MailHandler().handle(wb, make_result_dict(mails))
+
+    sender = NullSender()
+    sheet_names = list(subject_sheet_map)
+    watcher = ConfirmationWatcher(
+        lambda: wb, sheet_names, interval=0.0, debounce=debounce, sender=sender
+    )
+
+    # 空轮询：没有新确认时每次轮询的开销
+    watcher.poll()
+    started = time.perf_counter()
+    watcher.poll()
+    idle_seconds = time.perf_counter() - started
+
+    # 每批确认一部分列，下一次轮询（防抖期后）应立即发出
+    confirm_rows = {
+        sheet_name: ExcelHandler._read_confirm_rows(wb, sheet_name)
+        for sheet_name in sheet_names
+    }
+    for batch in range(rounds):
+        for sheet_name in sheet_names:
+            row, columns = confirm_rows[sheet_name]
+            for page_sheet, col, _, mail_hash in columns[batch::rounds]:
+                if mail_hash:
+                    wb.set_value(page_sheet, f"{col}{row}", "是")
+        watcher.poll()
+        if debounce:
+            time.sleep(debounce)
+            watcher.poll()
+
+    # 再确认一次全部，已发送的不应重复发送
+    for sheet_name in sheet_names:
+        confirm_all(wb, sheet_name)
+    watcher.poll()
+
+    return {
+        "mails": mails,
+        "sent": len(sender.sent),
+        "latencies": watcher.latencies,
+        "idle_seconds": idle_seconds,
+        "report": watcher.report(),
+    }
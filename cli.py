@@ -1,17 +1,112 @@
+import importlib
+
 import click
 
-from commands.db import cli_db
-from commands.mail import cli_mail
+# 子命令按需加载：(模块:对象, 简要说明)，列出帮助时不导入子命令模块
+LAZY_COMMANDS = {
+    "bench": ("commands.bench:cli_bench", "性能基准测试"),
+    "db": ("commands.db:cli_db", "执行数据库操作"),
+    "mail": ("commands.mail:cli_mail", "邮件处理"),
+    "market": ("commands.market:cli_market", "行情数据快照"),
+    "serve": ("commands.serve:cli_serve", "常驻运行报价流水线"),
+    "stats": ("commands.stats:cli_stats", "报价统计"),
+}
+
+
+class LazyGroup(click.Group):
+    """只在执行子命令时导入对应模块，避免启动时加载邮件、Excel 和数据库依赖"""
+
+    def list_commands(self, ctx):
+        return sorted({*super().list_commands(ctx), *LAZY_COMMANDS})
+
+    def get_command(self, ctx, cmd_name):
+        command = super().get_command(ctx, cmd_name)
+        if command is not None or cmd_name not in LAZY_COMMANDS:
+            return command
 
+        module_name, attr = LAZY_COMMANDS[cmd_name][0].split(":")
+        command = getattr(importlib.import_module(module_name), attr)
+        self.add_command(command, cmd_name)
+        return command
 
-@click.group()
-def cli():
+    def format_commands(self, ctx, formatter):
+        rows = [(name, help_text) for name, (_, help_text) in LAZY_COMMANDS.items()]
+        with formatter.section("Commands"):
+            formatter.write_dl(sorted(rows))
+
+
+@click.group(cls=LazyGroup)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="用 cProfile 分析本次命令，并输出各阶段耗时表",
+)
+@click.option(
+    "--profile-output",
+    default=None,
+    help="保存 cProfile 结果的文件（pstats 格式）",
+)
+@click.option(
+    "--metrics-file",
+    default=None,
+    envvar="METRICS_TEXTFILE",
+    help="命令结束时把 Prometheus 指标写入该文件，默认读取环境变量 METRICS_TEXTFILE",
+)
+@click.option(
+    "--count-calls",
+    is_flag=True,
+    envvar="EXCEL_COUNT_CALLS",
+    help="统计各阶段和每封邮件的工作簿调用次数，命令结束时输出",
+)
+@click.option(
+    "--call-budget",
+    type=float,
+    default=None,
+    envvar="EXCEL_CALL_BUDGET",
+    help="每封邮件的工作簿调用预算，超出时命令以失败退出（隐含 --count-calls）",
+)
+@click.pass_context
+def cli(ctx, profile, profile_output, metrics_file, count_calls, call_budget):
     """申万宏源报价处理命令行工具"""
-    pass
+    if metrics_file:
+        ctx.call_on_close(lambda: _write_metrics(metrics_file))
+
+    if count_calls or call_budget is not None:
+        from core.workbook_calls import workbook_calls
+
+        workbook_calls.enabled = True
+        ctx.call_on_close(lambda: _report_calls(call_budget))
+
+    if not (profile or profile_output):
+        return
+
+    from core.profiling import Profiler
+
+    profiler = Profiler(profile_output)
+    profiler.start()
+    ctx.call_on_close(lambda: click.echo(profiler.stop()))
+
+
+def _report_calls(budget) -> None:
+    from core.workbook_calls import workbook_calls
+
+    click.echo(workbook_calls.report())
+    if budget is None:
+        return
+
+    over = workbook_calls.check_budget(budget)
+    if over:
+        worst = ", ".join(f"{h[:12]}={calls:.1f}" for h, calls in over[:5])
+        raise click.ClickException(
+            f"{len(over)} 封邮件的工作簿调用超出预算 {budget:g}：{worst}"
+        )
+    click.echo(f"所有邮件的工作簿调用均在预算 {budget:g} 以内")
+
 
+def _write_metrics(path: str) -> None:
+    from core.metrics import write_metrics_textfile
 
-cli.add_command(cli_db)
-cli.add_command(cli_mail)
+    write_metrics_textfile(path)
 
 
 if __name__ == "__main__":
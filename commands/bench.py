@@ -0,0 +1,442 @@
+import click
+
+
+@click.group(name="bench")
+def cli_bench():
+    """性能基准测试"""
+    pass
+
+
+@cli_bench.command("flow")
+@click.option("-n", "--mails", default=24, show_default=True, help="询价邮件数量")
+@click.option(
+    "--backend",
+    default="memory",
+    show_default=True,
+    type=click.Choice(["memory", "headless"]),
+    help="工作簿后端",
+)
+@click.option("--filename", default=None, help="headless 后端使用的工作簿文件")
+@click.option(
+    "--engine",
+    default="excel",
+    show_default=True,
+    type=click.Choice(["excel", "native"]),
+    help="报价引擎",
+)
+def flow(mails, backend, filename, engine):
+    """不依赖 Excel 运行完整的报价与回复流程并计时"""
+    from bench.flow import run_flow
+
+    result = run_flow(mails, backend, filename, engine)
+    click.secho(
+        f"{result['backend']} 后端 {result['engine']} 引擎 {result['mails']} 封邮件，回复 {result['replied']} 封",
+        fg="green",
+    )
+    click.echo(f"报价处理耗时：{result['handle_seconds']:.3f}s")
+    click.echo(f"邮件回复耗时：{result['reply_seconds']:.3f}s")
+    click.echo(f"总耗时：    {result['total_seconds']:.3f}s")
+    for name, count in sorted(result["calls"].items()):
+        click.echo(f"  {name:<16}{count}")
+
+
+@cli_bench.command("shard")
+@click.option("-n", "--mails", default=200, show_default=True, help="询价邮件数量")
+@click.option(
+    "-w",
+    "--workers",
+    default="1,2,4,8",
+    show_default=True,
+    help="逗号分隔的进程数",
+)
+@click.option("--filename", required=True, help="报价工作簿模板文件")
+@click.option(
+    "--engine",
+    default="native",
+    show_default=True,
+    type=click.Choice(["excel", "native"]),
+    help="报价引擎，excel 引擎只能使用 1 个进程",
+)
+def shard(mails, workers, filename, engine):
+    """在 headless 后端上比较不同进程数的报价吞吐"""
+    import os
+
+    from bench.shard import run_shards
+    from core.shard import check_workers
+
+    counts = [int(w) for w in workers.split(",") if w.strip()]
+    try:
+        for count in counts:
+            check_workers(engine, count)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    results = run_shards(mails, counts, filename, engine)
+
+    click.secho(f"{mails} 封邮件，CPU 核数 {os.cpu_count()}", fg="green")
+    for item in results:
+        click.echo(
+            f"  {item['workers']:>2} 进程  {item['seconds']:>8.3f}s  "
+            f"{item['mails_per_second']:>8.1f} 封/秒"
+        )
+
+
+@cli_bench.command("watch")
+@click.option("-n", "--mails", default=24, show_default=True, help="询价邮件数量")
+@click.option("--rounds", default=4, show_default=True, help="分几批确认")
+@click.option("--debounce", default=0.0, show_default=True, help="防抖时间（秒）")
+def watch(mails, rounds, debounce):
+    """在 memory 后端上测量确认到发送的耗时"""
+    from bench.watch import run_watch
+
+    result = run_watch(mails, rounds, debounce)
+    click.secho(f"{result['mails']} 封邮件，发送 {result['sent']} 封", fg="green")
+    click.echo(f"空轮询耗时：{result['idle_seconds'] * 1000:.2f}ms")
+    click.echo(result["report"])
+
+
+@cli_bench.command("serve")
+@click.option("-n", "--mails", default=200, show_default=True, help="询价邮件数量")
+@click.option("--per-poll", default=50, show_default=True, help="每次读取到达的邮件数")
+@click.option("--queue-size", default=20, show_default=True, help="各阶段队列容量")
+@click.option(
+    "--batch-size", default=50, show_default=True, help="每批报价的最大邮件数"
+)
+@click.option(
+    "--parse-workers",
+    default=1,
+    show_default=True,
+    help="解析邮件的进程数，大于 1 时使用解析进程池",
+)
+def serve(mails, per_poll, queue_size, batch_size, parse_workers):
+    """在 memory 后端上运行常驻流水线，统计吞吐和队列深度"""
+    from bench.serve import run_serve
+
+    result = run_serve(mails, per_poll, queue_size, batch_size, parse_workers)
+    click.secho(f"{result['mails']} 封邮件，发送 {result['sent']} 封", fg="green")
+    click.echo(f"读取到入库耗时：{result['persist_seconds']:.3f}s")
+    click.echo(f"确认到回复耗时：{result['reply_seconds']:.3f}s")
+    click.echo(f"总耗时：        {result['total_seconds']:.3f}s")
+    click.echo(
+        "队列深度峰值：" + " ".join(f"{k}={v}" for k, v in result["peaks"].items())
+    )
+    click.echo(result["status"])
+
+
+@cli_bench.command("startup")
+@click.option(
+    "-c",
+    "--command",
+    "commands",
+    multiple=True,
+    help="要测量的命令参数，可多次指定，默认测量查看帮助和数据库命令",
+)
+@click.option("--runs", default=5, show_default=True, help="每个命令运行的次数")
+@click.option(
+    "--max-ms",
+    default=None,
+    type=float,
+    help="启动耗时上限（毫秒），任一命令的中位数超过时以非零状态退出",
+)
+def startup(commands, runs, max_ms):
+    """
+    测量命令行的启动耗时，并检查启动时是否加载了重量级依赖
+
+    加载了重量级依赖或中位数超过 --max-ms 时以非零状态退出，耗时与机器有关，依赖检查与机器无关
+    """
+    from bench.startup import DEFAULT_COMMANDS, run_startup
+
+    results = run_startup(commands or DEFAULT_COMMANDS, runs)
+    slow, heavy = [], []
+    for item in results:
+        over = max_ms is not None and item["median_ms"] > max_ms
+        if over:
+            slow.append(item["command"])
+        if item["heavy"]:
+            heavy.append(f"{item['command']}（{' '.join(item['heavy'])}）")
+        click.secho(
+            f"  quoter {item['command']:<20}中位数 {item['median_ms']:>7.1f}ms  "
+            f"最小 {item['min_ms']:>7.1f}ms  最大 {item['max_ms']:>7.1f}ms"
+            + (f"  加载了 {' '.join(item['heavy'])}" if item["heavy"] else ""),
+            fg="red" if over or item["heavy"] else None,
+        )
+    if heavy:
+        raise click.ClickException(f"启动时加载了重量级依赖：{'; '.join(heavy)}")
+    if slow:
+        raise click.ClickException(f"启动耗时超过 {max_ms:.0f}ms：{', '.join(slow)}")
+
+
+@cli_bench.command("formulas")
+def formulas():
+    """检查 memory 和 headless 后端复制、删除列时公式引用的调整，与 Excel 的规则不一致时以非零状态退出"""
+    from bench.formulas import check_formulas
+
+    failed = check_formulas()
+    for name, got, want in failed:
+        click.secho(f"  {name}：得到 {got}，期望 {want}", fg="red")
+    if failed:
+        raise click.ClickException(f"{len(failed)} 个公式引用用例不一致")
+    click.echo("公式引用用例全部通过")
+
+
+@cli_bench.command("record")
+@click.argument("path", required=True)
+@click.option("--folder", default="银行询价", show_default=True, help="邮箱文件夹")
+@click.option(
+    "--since",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    default=None,
+    help="录制该日期之后的邮件，默认为今天",
+)
+@click.option(
+    "--format",
+    "fmt",
+    default="mbox",
+    show_default=True,
+    type=click.Choice(["mbox", "maildir"]),
+    help="保存格式",
+)
+def record(path, folder, since, fmt):
+    """把邮箱文件夹的询价邮件录制为 mbox/maildir，供 bench replay 回放"""
+    from bench.replay import record_folder
+    from core.client import get_mail_client
+
+    count = record_folder(
+        get_mail_client(), path, folder, since.date() if since else None, fmt
+    )
+    click.secho(f"已录制 {count} 封邮件到 {path}", fg="green")
+
+
+@cli_bench.command("replay")
+@click.argument("path", required=True)
+@click.option(
+    "--speed",
+    default=0.0,
+    show_default=True,
+    help="回放倍速：1 为原速，10 为 10 倍速，0 为不等待、全部立即投递",
+)
+@click.option(
+    "--poll-interval", default=5.0, show_default=True, help="读取邮箱的间隔（秒）"
+)
+@click.option(
+    "--engine",
+    default="excel",
+    show_default=True,
+    type=click.Choice(["excel", "native"]),
+    help="报价引擎",
+)
+def replay(path, speed, poll_interval, engine):
+    """在进程内的 IMAP/SMTP 和 memory 后端上回放录制的邮件，统计吞吐、耗时和资源占用"""
+    from bench.replay import load_recording, run_replay
+
+    result = run_replay(load_recording(path), speed, poll_interval, engine)
+    _echo_replay(result)
+
+
+def _echo_replay(result) -> None:
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f}ms"
+
+    click.secho(
+        f"投递 {result['delivered']} 封，回复 {result['replied']} 封，"
+        f"读取邮箱 {result['polls']} 次",
+        fg="green",
+    )
+    click.echo(f"总耗时：    {result['seconds']:.3f}s")
+    click.echo(f"吞吐：      {result['mails_per_second']:.1f} 封/秒")
+    click.echo(
+        "投递到回复："
+        + " ".join(f"{k} {ms(v)}" for k, v in result["latency"].items())
+        + f" 最大 {ms(result['latency_max'])}"
+    )
+    click.echo(f"单次处理最长：{result['poll_max_seconds']:.3f}s")
+    click.echo(f"CPU 时间：  {result['cpu_seconds']:.3f}s")
+    if result["peak_rss_mb"] is not None:
+        click.echo(f"内存峰值：  {result['peak_rss_mb']:.1f}MB")
+    click.echo(f"工作簿调用：{result['workbook_calls']}")
+    click.echo(
+        "邮件服务器："
+        + " ".join(f"{k}={v}" for k, v in sorted(result["server"].items()))
+    )
+
+
+@cli_bench.command("generate")
+@click.argument("count", type=int)
+@click.argument("path", required=True)
+@click.option(
+    "--format",
+    "fmt",
+    default="mbox",
+    show_default=True,
+    type=click.Choice(["mbox", "maildir"]),
+    help="保存格式",
+)
+@click.option("--dup", default=0.0, show_default=True, help="重复投递的比例")
+@click.option("--hold", default=0.0, show_default=True, help="hold 邮件的比例")
+@click.option("--invalid", default=0.0, show_default=True, help="无法报价邮件的比例")
+@click.option("--attachments", default=0.0, show_default=True, help="带附件的比例")
+@click.option("--gb2312", default=0.5, show_default=True, help="使用 GB2312 编码的比例")
+@click.option(
+    "--span", default=8 * 3600.0, show_default=True, help="邮件在多少秒内到达"
+)
+@click.option("--seed", default=0, show_default=True, help="随机数种子")
+def generate(count, path, fmt, dup, hold, invalid, attachments, gb2312, span, seed):
+    """生成广发银行格式的询价邮件，保存为 mbox/maildir，供 bench replay 回放"""
+    from bench.generate import InquiryGenerator, write_mailbox
+
+    try:
+        generator = InquiryGenerator(
+            dup_ratio=dup,
+            hold_ratio=hold,
+            invalid_ratio=invalid,
+            attachment_ratio=attachments,
+            gb2312_ratio=gb2312,
+            span=span,
+            seed=seed,
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    write_mailbox(generator.generate(count), path, fmt)
+    click.secho(f"已生成 {count} 封询价邮件到 {path}", fg="green")
+    click.echo(generator.report())
+
+
+@cli_bench.command("micro")
+@click.option("-k", "only", multiple=True, help="只运行指定的用例，可多次指定")
+@click.option(
+    "--db-rows",
+    default=1_000_000,
+    show_default=True,
+    help="数据库用例的记录数，0 为不运行数据库用例",
+)
+@click.option("--repeat", default=3, show_default=True, help="每个用例重复的轮数")
+@click.option(
+    "--check", is_flag=True, help="与当前机器的基线比较，有用例回退时以非零状态退出"
+)
+@click.option(
+    "--threshold",
+    default=0.25,
+    show_default=True,
+    help="比基线慢超过该比例视为回退",
+)
+@click.option("--save", is_flag=True, help="把本次结果保存为当前机器的基线")
+@click.option("--baseline", default=None, help="基线文件，默认为 bench/baselines.json")
+def micro(only, db_rows, repeat, check, threshold, save, baseline):
+    """
+    解析、数据库和回复等热点路径的基准测试，可与基线比较
+
+    基线按机器（系统、架构、CPU 型号、核数和 Python 版本）分别保存，只与当前机器的基线比较
+    """
+    from bench.micro import (
+        BASELINE_FILE,
+        compare,
+        load_baselines,
+        machine_key,
+        run_micro,
+        save_baselines,
+    )
+
+    baseline = baseline or BASELINE_FILE
+    results = run_micro(list(only), db_rows, repeat)
+    baselines = load_baselines(baseline)
+    if not baselines:
+        click.secho(
+            f"没有当前机器（{machine_key()}）的基线，不做比较，可用 --save 保存",
+            fg="yellow",
+        )
+    rows = compare(results, baselines, threshold, db_rows)
+
+    regressed = []
+    for name, us, base, change, slow in rows:
+        if slow:
+            regressed.append(name)
+        compared = "-" if base is None else f"{base:>10.1f}µs {change:>+7.1%}"
+        click.secho(
+            f"  {name:<24}{us:>10.1f}µs  基线 {compared}",
+            fg="red" if slow else None,
+        )
+
+    if save:
+        save_baselines(results, db_rows, baseline)
+        click.secho(f"已保存基线到 {baseline}", fg="green")
+    if check and regressed:
+        raise click.ClickException(
+            f"以下用例比基线慢超过 {threshold:.0%}：{', '.join(regressed)}"
+        )
+
+
+@cli_bench.command("parse")
+@click.option("-n", "--mails", default=500, show_default=True, help="询价邮件数量")
+@click.option(
+    "-w",
+    "--workers",
+    multiple=True,
+    type=int,
+    help="解析进程数，可重复指定，默认比较 1、2、4",
+)
+@click.option(
+    "--fetch-latency",
+    default=0.002,
+    show_default=True,
+    help="每次 FETCH 的模拟网络往返耗时（秒）",
+)
+@click.option("--attachments", default=0.1, show_default=True, help="带附件的邮件比例")
+def parse(mails, workers, fetch_latency, attachments):
+    """比较在读取线程中解析与使用解析进程池时，读取并解析邮件的吞吐"""
+    from bench.parse import run_parse
+
+    results = run_parse(mails, workers or (1, 2, 4), fetch_latency, attachments)
+    serial = results.get(1)
+    for worker_count, result in results.items():
+        speedup = (
+            f"  {serial['seconds'] / result['seconds']:.2f}x"
+            if serial and result["seconds"]
+            else ""
+        )
+        click.echo(
+            f"{worker_count:>2} 进程：解析 {result['parsed']} 封，"
+            f"{result['seconds']:.3f}s，{result['mails_per_second']:.1f} 封/s{speedup}"
+        )
+
+
+@cli_bench.command("memory")
+@click.option("-n", "--mails", default=10_000, show_default=True, help="询价邮件数量")
+@click.option("--attachments", default=0.1, show_default=True, help="带附件的邮件比例")
+def memory(mails, attachments):
+    """比较之前的 EachMail 与紧凑的 EachMail 保存大量邮件时的内存占用"""
+    from bench.memory import run_memory
+
+    results = run_memory(mails, attachments)
+    for name, result in results.items():
+        click.echo(
+            f"{name:<8} {result['mails']} 封：构造 {result['build_seconds']:.2f}s，"
+            f"保留 {result['retained_mb']:.1f}MB，峰值 {result['peak_mb']:.1f}MB，"
+            f"序列化 {result['pickled_mb']:.1f}MB"
+        )
+    legacy, compact = results["legacy"], results["compact"]
+    if compact["retained_mb"]:
+        click.echo(
+            f"保留内存减少到 {compact['retained_mb'] / legacy['retained_mb']:.1%}"
+        )
+
+
+@cli_bench.command("reply")
+@click.option(
+    "--size",
+    default=5 * 1024 * 1024,
+    show_default=True,
+    help="原始邮件附件大小（字节）",
+)
+@click.option("--rounds", default=5, show_default=True, help="重复轮数，取最快的一轮")
+def reply(size, rounds):
+    """比较回复大邮件时解析后附加与直接附加原始数据的耗时和内存峰值"""
+    from bench.reply import run_reply
+
+    results = run_reply(size, rounds)
+    click.secho(f"原始邮件 {results['original_mb']:.1f}MB", fg="green")
+    for name in ("legacy", "direct"):
+        result = results[name]
+        click.echo(
+            f"{name:<8} 构建 {result['build_ms']:.1f}ms，峰值 {result['peak_mb']:.1f}MB，"
+            f"回复 {result['reply_mb']:.1f}MB，原样附加：{'是' if result['verbatim'] else '否'}"
+        )
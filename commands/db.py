@@ -1,6 +1,6 @@
 import click
 
-from db.setup import clear_table, delete_row, drop_db, init_db, reset_row, show_db
+# 数据库命令只在执行时导入 SQLAlchemy，查看帮助不需要加载
 
 
 @click.group(name="db")
@@ -12,12 +12,16 @@ def cli_db():
 @cli_db.command("init")
 def init():
     """初始化数据库表"""
+    from db.setup import init_db
+
     init_db()
 
 
 @cli_db.command("show")
 def show():
     """展示数据库信息"""
+    from db.setup import show_db
+
     doc = show_db()
     click.secho(doc)
 
@@ -25,6 +29,8 @@ def show():
 @cli_db.command("drop")
 def drop():
     """删除数据库表结构"""
+    from db.setup import drop_db
+
     confirm = click.confirm("确定要删除所有数据库表？此操作不可恢复！")
     if not confirm:
         click.secho("操作取消", fg="yellow")
@@ -36,6 +42,8 @@ def drop():
 @cli_db.command("clear")
 def clear():
     """清空数据表所有数据"""
+    from db.setup import clear_table
+
     confirm = click.confirm("确定要删除所有数据表记录？此操作不可恢复！")
     if not confirm:
         click.secho("操作取消", fg="yellow")
@@ -48,6 +56,8 @@ def clear():
 @click.argument("days", type=click.IntRange(1, None))
 def delete(days):
     """删除指定天数前的数据库表记录"""
+    from db.setup import delete_row
+
     confirm = click.confirm(f"确定要删除{days}天前的所有数据表记录？此操作不可恢复！")
     if not confirm:
         click.secho("操作取消", fg="yellow")
@@ -60,6 +70,8 @@ def delete(days):
 @click.argument("_id", type=click.IntRange(1, None))
 def reset(_id):
     """重置指定ID的数据库状态"""
+    from db.setup import reset_row
+
     confirm = click.confirm(f"确定要重置ID为 {_id} 的数据")
     if not confirm:
         click.secho("操作取消", fg="yellow")
@@ -4,12 +4,9 @@ from types import SimpleNamespace
 
 import click
 
-from core.excel import ExcelHandler
-from core.handler import MailHandler
-from core.utils import print_banner
-from db.models import MailState
-from main import open_excel_with_filename, reply_emails
-from processor.registry import get_processor, subject_sheet_map
+from processor.base import PRICING_ENGINES, get_pricing_engine
+
+# 邮件、Excel 和数据库相关的模块较重，在各命令中按需导入
 
 
 @click.group(name="mail")
@@ -21,6 +18,8 @@ def cli_mail():
 @cli_mail.command("pull")
 def pull():
     """拉取邮件并写入数据库"""
+    from core.handler import MailHandler
+
     MailHandler().pull_quote_mails_to_db()
 
 
@@ -32,55 +31,147 @@ def cli_reply_emails(sheet_name):
     """回复指定邮件
 
     sheet_name: 待回复邮件类型"""
+    from main import reply_emails
+
     reply_emails(sheet_name)
 
 
+@cli_mail.command("watch")
+@click.argument("sheet_names", nargs=-1, type=click.Choice(["二元看涨", "看涨阶梯"]))
+@click.option(
+    "--interval", default=2.0, show_default=True, help="轮询确认行的间隔（秒）"
+)
+@click.option(
+    "--debounce",
+    default=1.0,
+    show_default=True,
+    help="确认后报价保持不变多少秒才发送（秒）",
+)
+@click.option(
+    "--duration", default=None, type=float, help="运行多少秒后停止，默认一直运行"
+)
+def cli_watch(sheet_names, interval, debounce, duration):
+    """监听确认行，业务人员填写“是”后自动回复
+
+    sheet_names: 监听的产品 Sheet，默认全部"""
+    from core.watcher import ConfirmationWatcher
+    from main import open_excel_with_filename
+
+    watcher = ConfirmationWatcher(
+        open_excel_with_filename,
+        sheet_names or ["二元看涨", "看涨阶梯"],
+        interval=interval,
+        debounce=debounce,
+    )
+    click.secho("开始监听确认报价，按 Ctrl+C 停止", fg="green")
+    watcher.run(duration=duration)
+    click.echo(watcher.report())
+
+
 @cli_mail.command("proc")
-def cli_proc_mail():
+@click.option(
+    "--engine",
+    type=click.Choice(PRICING_ENGINES),
+    default=None,
+    help="报价引擎，默认读取环境变量 QUOTE_ENGINE",
+)
+@click.option(
+    "--incremental/--full",
+    default=None,
+    help="增量刷新：保留待处理邮件的列，只为新邮件追加列；默认读取 QUOTE_INCREMENTAL",
+)
+def cli_proc_mail(engine, incremental):
     """从数据库拉取邮件信息并写入 Excel 中"""
-    wb, app, run_in_background = open_excel_with_filename()
+    from core.handler import MailHandler
+    from core.market import load_market_snapshot
+    from core.timings import timing_recorder
+    from core.trading_calendar import load_trading_calendar, require_trading_calendar
+    from core.transaction import workbook_transaction
+    from db.models import MailState
+    from main import open_excel_with_filename
+
+    engine = engine or get_pricing_engine()
+    wb = open_excel_with_filename()
+
+    try:
+        mails = MailState().get_today_unprocessed_mails()
+        if not mails:
+            return
+
+        result_dict = defaultdict(list)
+        for mail in mails:
+            mail.df_dict = json.loads(mail.df_dict)
+            mail.content = SimpleNamespace(html="")
+            mail.sent_time = mail.rev_time
+            result_dict[mail.from_addr].append(mail)
+
+        load_market_snapshot(wb)
+        load_trading_calendar(wb)
+        require_trading_calendar(engine, wb)
+
+        # 事务内合并所有保存操作，结束时统一保存一次
+        with workbook_transaction(wb):
+            # 处理未报价邮件，邮件已在数据库中，不再写入
+            quoted = MailHandler(
+                pricing_engine=engine, incremental=incremental
+            ).quote_mails(wb, result_dict, create_record=False)
+
+            print("所有邮件处理完成，保存并关闭 Excel 文件...")
+
+        timing_recorder.mark_many(quoted, "written")
+        timing_recorder.flush()
+    finally:
+        wb.close()
 
-    mails = MailState().get_today_unprocessed_mails()
-    if not mails:
-        return
 
-    result_dict = defaultdict(list)
-    for mail in mails:
-        mail.df_dict = json.loads(mail.df_dict)
-        mail.content = SimpleNamespace(html="")
-        mail.sent_time = mail.rev_time
-        result_dict[mail.from_addr].append(mail)
+@cli_mail.command("reconcile")
+@click.argument(
+    "sheet_name", required=True, type=click.Choice(["二元看涨", "看涨阶梯"])
+)
+@click.option("--tolerance", default=1e-3, show_default=True, help="允许的绝对误差")
+def cli_reconcile(sheet_name, tolerance):
+    """对比工作簿报价与原生定价引擎的结果
+
+    sheet_name: 待对账的产品 Sheet"""
+    from core.pricing import reconcile_sheet
+    from main import open_excel_with_filename
+
+    wb = open_excel_with_filename()
+    try:
+        report = reconcile_sheet(wb, sheet_name, tolerance)
+    finally:
+        wb.close()
 
-    # 处理未报价邮件并回复
-    excel_handler = ExcelHandler()
+    if not report:
+        print(f"{sheet_name} 没有可对账的报价")
+        return
 
-    # 清空Sheet
-    sheet_names = subject_sheet_map.keys()
-    for _sheet_name in sheet_names:
-        excel_handler.clear_sheet_columns(wb, _sheet_name)
+    for item in report:
+        flag = "一致" if item["matched"] else "不一致"
+        print(
+            f"{item['sheet']}!{item['column']} {flag} Excel: {item['excel']} "
+            f"原生: {item['native']} 差异: {item['diff']} {item['subject']}"
+        )
 
-    for email_addr, result_list in result_dict.items():
-        print_banner("开始处理可报价邮件......")
-        processor = get_processor(email_addr)  # 获取每个客户对应的邮件处理策略
+    mismatched = sum(not item["matched"] for item in report)
+    print(f"共 {len(report)} 列，不一致 {mismatched} 列")
 
-        sheet_name_count_dict = {_sheet_name: 0 for _sheet_name in sheet_names}
-        for mail in result_list:
-            print(f"处理邮件: {mail.subject} 来自: 【{email_addr}】")
 
-            # 处理 Excel 对应 Sheet
-            excel_handler.copy_sheet_columns(
-                wb, mail.sheet_name, sheet_name_count_dict[mail.sheet_name]
-            )
+@cli_mail.command("cache")
+@click.option("--clear", is_flag=True, help="清空报价缓存")
+def cli_quote_cache(clear):
+    """查看或清空报价缓存（需配置 QUOTE_CACHE_TTL，只用于 native 引擎）"""
+    from core.quote_cache import get_quote_cache
 
-            # 获取报价值，并写入待发送邮件内容中
-            processor.process_excel(mail, wb, sheet_name_count_dict[mail.sheet_name])
+    cache = get_quote_cache()
+    if cache is None:
+        click.secho("未启用报价缓存，请配置 QUOTE_CACHE_TTL", fg="yellow")
+        return
 
-            sheet_name_count_dict[mail.sheet_name] += 1
+    if clear:
+        cache.clear()
+        cache.save()
+        click.secho(f"已清空报价缓存 {cache.path}", fg="green")
+        return
 
-    print("所有邮件处理完成，保存并关闭 Excel 文件...")
-    if not run_in_background:
-        wb.save()
-    else:
-        wb.save()
-        wb.close()
-        app.quit()
+    click.echo(f"缓存文件：{cache.path}，有效条目 {len(cache)}，TTL {cache.ttl:g} 秒")
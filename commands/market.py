@@ -0,0 +1,78 @@
+from typing import TYPE_CHECKING
+
+import click
+
+if TYPE_CHECKING:
+    from core.market import MarketSnapshot
+
+
+@click.group(name="market")
+def cli_market():
+    """行情数据快照"""
+    pass
+
+
+def _load_snapshot(filename) -> "MarketSnapshot":
+    from core.market import MarketSnapshot, load_market_snapshot
+
+    if filename:
+        return MarketSnapshot.from_file(filename)
+
+    from main import open_excel_with_filename
+
+    wb = open_excel_with_filename()
+    try:
+        return load_market_snapshot(wb)
+    finally:
+        wb.close()
+
+
+@cli_market.command("show")
+@click.option("--filename", default=None, help="从 JSON/CSV 文件加载，默认读取工作簿")
+def show(filename):
+    """显示当前行情快照"""
+    from core.market import UNDERLYING_CLASSES
+
+    snapshot = _load_snapshot(filename)
+    click.secho(f"来源：{snapshot.source}  版本：{snapshot.version}", fg="green")
+    click.echo("期限  " + "".join(f"{t:>10}" for t in snapshot.thresholds))
+    for name in UNDERLYING_CLASSES:
+        click.echo(f"{name:<6}" + "".join(f"{v!s:>10}" for v in snapshot.rates[name]))
+
+
+@cli_market.command("export")
+@click.argument("path", required=True)
+def export(path):
+    """从工作簿导出行情快照到 JSON/CSV 文件，供 MARKET_DATA_FILE 使用"""
+    snapshot = _load_snapshot(None)
+    snapshot.dump(path)
+    click.secho(f"已导出行情快照 {snapshot.version} 到 {path}", fg="green")
+
+
+@cli_market.command("calendar")
+@click.option(
+    "--export",
+    "path",
+    default=None,
+    help="导出为 CSV 文件，供 TRADING_CALENDAR_FILE 使用",
+)
+def calendar(path):
+    """显示工作簿交易日历 Sheet 中各市场的节假日数"""
+    from core.trading_calendar import MARKET_COLUMNS, TradingCalendar
+    from main import open_excel_with_filename
+
+    wb = open_excel_with_filename()
+    try:
+        trading_calendar = TradingCalendar.from_workbook(wb)
+    finally:
+        wb.close()
+
+    click.secho(f"来源：{trading_calendar.source}", fg="green")
+    for market in MARKET_COLUMNS:
+        holidays = trading_calendar.holidays(market)
+        span = f"{holidays[0]} ~ {holidays[-1]}" if holidays else "-"
+        click.echo(f"{market:<6}{len(holidays):>6} 个节假日  {span}")
+
+    if path:
+        trading_calendar.dump(path)
+        click.secho(f"已导出交易日历到 {path}", fg="green")
@@ -0,0 +1,117 @@
+import signal
+import time
+
+import click
+
+from processor.base import PRICING_ENGINES
+
+
+@click.command(name="serve")
+@click.option(
+    "--fetch-interval", default=10.0, show_default=True, help="读取新邮件的间隔（秒）"
+)
+@click.option(
+    "--watch-interval", default=2.0, show_default=True, help="轮询确认行的间隔（秒）"
+)
+@click.option(
+    "--debounce",
+    default=1.0,
+    show_default=True,
+    help="确认后报价保持不变多少秒才发送（秒）",
+)
+@click.option("--queue-size", default=100, show_default=True, help="各阶段队列容量")
+@click.option(
+    "--batch-size", default=50, show_default=True, help="每批报价的最大邮件数"
+)
+@click.option(
+    "--status-interval",
+    default=30.0,
+    show_default=True,
+    help="输出队列深度的间隔（秒）",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(PRICING_ENGINES),
+    default=None,
+    help="报价引擎，默认读取环境变量 QUOTE_ENGINE",
+)
+@click.option(
+    "--parse-workers",
+    type=int,
+    default=None,
+    envvar="PARSE_WORKERS",
+    help="解析邮件的进程数，大于 1 时使用进程池，默认读取环境变量 PARSE_WORKERS",
+)
+@click.option(
+    "--metrics-port",
+    default=0,
+    envvar="METRICS_PORT",
+    show_default=True,
+    help="在该端口提供 Prometheus 指标（/metrics），0 为不提供，默认读取环境变量 METRICS_PORT",
+)
+@click.option(
+    "--metrics-host", default="127.0.0.1", show_default=True, help="指标服务监听的地址"
+)
+def cli_serve(
+    fetch_interval,
+    watch_interval,
+    debounce,
+    queue_size,
+    batch_size,
+    status_interval,
+    engine,
+    parse_workers,
+    metrics_port,
+    metrics_host,
+):
+    """常驻运行：读取、解析、过滤、报价、入库、等待确认和回复并行处理"""
+    from core.client import KeepAliveSender, get_mail_client, get_send_mail_client
+    from core.metrics import start_metrics_server
+    from core.parse_pool import get_parse_pool
+    from core.pipeline import ImapSource, Pipeline
+    from main import open_excel_with_filename
+
+    mail_client = get_mail_client()
+    sender = KeepAliveSender(get_send_mail_client())
+    pipeline = Pipeline(
+        ImapSource(mail_client),
+        mail_client,
+        open_excel_with_filename,
+        sender=sender,
+        queue_size=queue_size,
+        batch_size=batch_size,
+        fetch_interval=fetch_interval,
+        watch_interval=watch_interval,
+        debounce=debounce,
+        pricing_engine=engine,
+        parse_pool=get_parse_pool(parse_workers),
+    )
+
+    # SIGTERM 与 Ctrl+C 一样，处理完已读取的邮件后退出
+    signal.signal(signal.SIGTERM, lambda *_: pipeline.stop())
+
+    metrics_server = None
+    if metrics_port:
+        metrics_server = start_metrics_server(metrics_port, metrics_host)
+        click.echo(f"Prometheus 指标：http://{metrics_host}:{metrics_port}/metrics")
+
+    pipeline.start()
+    click.secho("报价服务已启动，按 Ctrl+C 停止", fg="green")
+    try:
+        while pipeline.is_alive():
+            time.sleep(status_interval)
+            click.echo(pipeline.format_status())
+    except KeyboardInterrupt:
+        click.secho("正在停止，处理完已读取的邮件后退出......", fg="yellow")
+        pipeline.stop()
+        pipeline.join()
+    finally:
+        sender.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    click.echo(pipeline.format_status())
+    if pipeline.watcher is not None:
+        click.echo(pipeline.watcher.report())
+    if pipeline.error is not None:
+        raise click.ClickException(f"报价服务异常退出：{pipeline.error}")
@@ -0,0 +1,56 @@
+from datetime import date, datetime, timedelta
+
+import click
+
+
+@click.group(name="stats")
+def cli_stats():
+    """报价统计"""
+    pass
+
+
+@cli_stats.command("latency")
+@click.option(
+    "--start",
+    type=click.DateTime(["%Y-%m-%d"]),
+    default=None,
+    help="起始日期，默认今天",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(["%Y-%m-%d"]),
+    default=None,
+    help="结束日期（含），默认与起始日期相同",
+)
+@click.option(
+    "--by",
+    type=click.Choice(["stage", "customer", "product"]),
+    default="stage",
+    show_default=True,
+    help="按阶段汇总，或再按客户、产品分组",
+)
+def latency(start, end, by):
+    """各阶段报价耗时的 p50/p95/p99"""
+    from core.timings import PERCENTILES, latency_report
+    from db.models import MailTiming
+
+    start = start or datetime.combine(date.today(), datetime.min.time())
+    end = (end or start) + timedelta(days=1)
+
+    records = MailTiming().get_records(start, end)
+    field = {"stage": None, "customer": "from_addr", "product": "sheet_name"}[by]
+    report = latency_report(records, field)
+
+    click.secho(
+        f"{start:%Y-%m-%d} ~ {end - timedelta(days=1):%Y-%m-%d}，共 {len(records)} 封邮件",
+        fg="green",
+    )
+    header = "".join(f"{f'p{p}':>10}" for p in PERCENTILES)
+    for key, rows in report.items():
+        click.secho(f"\n{key}", bold=True)
+        click.echo(f"  {'阶段':<20}{'样本':>6}{header}")
+        for stage, count, values in rows:
+            click.echo(
+                f"  {stage:<22}{count:>6}"
+                + "".join(f"{value:>9.2f}s" for value in values)
+            )
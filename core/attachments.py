@@ -0,0 +1,127 @@
+import binascii
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from email.message import Message
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from core.schemas import MailContent
+
+# 流式解码时每次处理的 base64 字符数
+CHUNK_CHARS = 64 * 1024
+
+
+@dataclass
+class AttachmentRef:
+    """
+    邮件附件的引用：只记录位置、大小和类型，数据在显式读取时才从原始邮件中解码
+
+    part_path 为附件在 multipart 结构中的下标路径，如 (2,) 为顶层的第 3 个部分；
+    spill_path 不为空时附件已解码写入该文件，读取时不再需要原始邮件；
+    文件随解析得到的 EachMail 释放时删除，之后读取需要原始邮件
+    """
+
+    filename: str
+    content_type: str
+    size: int  # 解码后的字节数
+    part_path: Tuple[int, ...]
+    spill_path: Optional[str] = None
+
+    def part(self, msg: Message) -> Message:
+        for index in self.part_path:
+            msg = msg.get_payload(index)  # type: ignore
+        return msg
+
+    def spilled(self) -> bool:
+        return bool(self.spill_path) and os.path.exists(self.spill_path)  # type: ignore
+
+    def iter_chunks(self, msg: Optional[Message] = None) -> Iterator[bytes]:
+        """按块读取附件数据，已写入文件时从文件读取，否则从原始邮件 msg 中解码"""
+        if self.spilled():
+            with open(self.spill_path, "rb") as f:
+                yield from iter(lambda: f.read(CHUNK_CHARS), b"")
+            return
+        if msg is None:
+            raise ValueError(f"附件 {self.filename} 未写入文件，读取时需要原始邮件")
+        yield from iter_decoded(self.part(msg))
+
+    def read(self, msg: Optional[Message] = None) -> bytes:
+        return b"".join(self.iter_chunks(msg))
+
+    def open(self, msg: Optional[Message] = None) -> BinaryIO:
+        if self.spilled():
+            return open(self.spill_path, "rb")  # type: ignore
+        return io.BytesIO(self.read(msg))
+
+    def spill(self, msg: Message, directory: Optional[str] = None) -> str:
+        """把附件按块解码写入 directory 下的临时文件，返回文件路径，文件由调用方清理"""
+        self.spill_path = spill_part(self.part(msg), self.filename, directory)
+        return self.spill_path
+
+
+def _is_base64(part: Message) -> bool:
+    encoding = str(part.get("Content-Transfer-Encoding", "")).strip().lower()
+    return encoding == "base64" and isinstance(part.get_payload(), str)
+
+
+def iter_decoded(part: Message) -> Iterator[bytes]:
+    """按块解码邮件部分，base64 每次只解码 CHUNK_CHARS 个字符，不生成完整的解码数据"""
+    if not _is_base64(part):
+        yield part.get_payload(decode=True) or b""  # type: ignore
+        return
+
+    payload: str = part.get_payload()  # type: ignore
+    pending = ""
+    for start in range(0, len(payload), CHUNK_CHARS):
+        data = pending + "".join(payload[start : start + CHUNK_CHARS].split())
+        cut = len(data) - len(data) % 4
+        if cut:
+            yield binascii.a2b_base64(data[:cut])
+        pending = data[cut:]
+    if pending:
+        # 长度不是 4 的倍数的残缺数据，与 get_payload(decode=True) 一样尽量解码
+        try:
+            yield binascii.a2b_base64(pending + "=" * (-len(pending) % 4))
+        except binascii.Error:
+            pass
+
+
+def spill_part(part: Message, filename: str, directory: Optional[str] = None) -> str:
+    """把邮件部分按块解码写入临时文件，返回文件路径"""
+    _, ext = os.path.splitext(filename)
+    fd, path = tempfile.mkstemp(prefix="attachment-", suffix=ext, dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        for chunk in iter_decoded(part):
+            f.write(chunk)
+    return path
+
+
+def spilled_paths(content: "MailContent") -> List[str]:
+    """邮件正文（含嵌套的原始邮件）中已写入临时文件的附件路径"""
+    paths = [ref.spill_path for ref in content.attachments or () if ref.spill_path]
+    for nested in content.nested or ():
+        paths.extend(spilled_paths(nested))
+    return paths
+
+
+def remove_spilled(paths: Iterable[str]) -> None:
+    """删除附件临时文件，已删除的忽略"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def decoded_size(part: Message) -> int:
+    """解码后的字节数，base64 按字符数计算，不解码数据"""
+    if not _is_base64(part):
+        return len(part.get_payload(decode=True) or b"")
+
+    payload: str = part.get_payload()  # type: ignore
+    chars = len(payload) - sum(payload.count(c) for c in " \t\r\n")
+    tail = payload[-8:].rstrip()
+    padding = len(tail) - len(tail.rstrip("="))
+    return chars * 3 // 4 - padding
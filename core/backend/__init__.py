@@ -0,0 +1,55 @@
+import os
+from typing import Optional
+
+from core.backend.base import WorkbookBackend
+
+BACKENDS = ("xlwings", "headless", "memory")
+
+
+def open_workbook(
+    filename: Optional[str] = None, backend: Optional[str] = None
+) -> WorkbookBackend:
+    """
+    按 EXCEL_BACKEND 环境变量打开报价工作簿，默认使用 Excel 桌面端（xlwings）
+
+    - xlwings: 通过 COM 操作 Excel，仅支持 Windows
+    - headless: 通过 openpyxl 读写文件，公式由 pycel 求值
+    - memory: 纯内存工作簿，使用内置报价模板，不读写文件
+
+    开启调用统计（workbook_calls.enabled）时返回记录每次调用的代理
+    """
+    from core.backend.counting import CountingWorkbook
+    from core.workbook_calls import workbook_calls
+
+    wb = _open_backend(filename, backend)
+    if workbook_calls.enabled:
+        return CountingWorkbook(wb, workbook_calls)
+    return wb
+
+
+def _open_backend(
+    filename: Optional[str] = None, backend: Optional[str] = None
+) -> WorkbookBackend:
+    filename = filename or os.getenv("EXCEL_FILENAME")
+    backend = backend or os.getenv("EXCEL_BACKEND") or "xlwings"
+
+    # 各后端的依赖只在使用时导入
+    if backend == "xlwings":
+        from core.backend.com import XlwingsWorkbook
+
+        return XlwingsWorkbook.open(filename)
+
+    if backend == "headless":
+        from core.backend.headless import OpenpyxlWorkbook
+
+        return OpenpyxlWorkbook(filename)
+
+    if backend == "memory":
+        from core.backend.memory import MemoryWorkbook
+
+        return MemoryWorkbook.pricing_template()
+
+    raise ValueError(f"不支持的工作簿后端: {backend}，可选 {', '.join(BACKENDS)}")
+
+
+__all__ = ["BACKENDS", "WorkbookBackend", "open_workbook"]
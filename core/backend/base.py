@@ -0,0 +1,174 @@
+import re
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+
+from core.utils import col_index_to_letter, col_letter_to_index
+
+_ADDRESS_PATTERN = re.compile(r"^\$?([A-Za-z]*)\$?(\d*)$")
+
+# 整列地址（如 "C:Z"）使用的最大行号
+MAX_ROW = 1048576
+
+
+def parse_address(address: str) -> Tuple[int, int, int, int]:
+    """
+    解析 A1 格式地址，返回 (起始行, 起始列, 结束行, 结束列)，行列号从 1 开始
+
+    支持单元格 "C5"、区域 "B1:B100" 和整列 "C:Z"
+    """
+    parts = address.split(":")
+    if len(parts) == 1:
+        parts = parts * 2
+
+    bounds = []
+    for part in parts:
+        match = _ADDRESS_PATTERN.match(part.strip())
+        if not match:
+            raise ValueError(f"无法解析的单元格地址: {address}")
+        letters, digits = match.groups()
+        bounds.append(
+            (
+                int(digits) if digits else None,
+                col_letter_to_index(letters) if letters else None,
+            )
+        )
+
+    (row1, col1), (row2, col2) = bounds
+    if col1 is None or col2 is None:
+        raise ValueError(f"暂不支持整行地址: {address}")
+
+    # 整列地址
+    if row1 is None or row2 is None:
+        row1, row2 = 1, MAX_ROW
+
+    return min(row1, row2), min(col1, col2), max(row1, row2), max(col1, col2)
+
+
+def format_address(row1: int, col1: int, row2: int, col2: int) -> str:
+    """将行列号转换为 A1 格式地址"""
+    start = f"{col_index_to_letter(col1)}{row1}"
+    if (row1, col1) == (row2, col2):
+        return start
+    return f"{start}:{col_index_to_letter(col2)}{row2}"
+
+
+def shape_values(rows: List[List[Any]]) -> Any:
+    """
+    按 xlwings 的约定整理读取结果：单元格返回标量，单行或单列返回一维列表，其余返回二维列表
+    """
+    if len(rows) == 1 and len(rows[0]) == 1:
+        return rows[0][0]
+    if len(rows) == 1:
+        return rows[0]
+    if all(len(row) == 1 for row in rows):
+        return [row[0] for row in rows]
+    return rows
+
+
+def normalize_values(value: Any) -> List[List[Any]]:
+    """
+    按 xlwings 的约定整理写入值：标量写入单元格，一维列表横向写入，二维列表按块写入
+    """
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(row, (list, tuple)) for row in value):
+            return [list(row) for row in value]
+        return [list(value)]
+    return [[value]]
+
+
+class WorkbookBackend(ABC):
+    """
+    工作簿后端抽象基类
+
+    业务代码只通过该接口按 Sheet 名称和 A1 地址读写工作簿，
+    具体由 xlwings（Excel COM）、openpyxl（无界面文件）或内存实现
+    """
+
+    name = ""
+
+    @abstractmethod
+    def sheet_names(self) -> List[str]:
+        """返回所有 Sheet 名称"""
+
+    @abstractmethod
+    def add_sheet(self, sheet: str, before: Optional[str] = None) -> None:
+        """新增 Sheet，before 不存在时追加到末尾"""
+
+    @abstractmethod
+    def copy_sheet(
+        self, sheet: str, new_sheet: str, after: Optional[str] = None
+    ) -> None:
+        """复制整个 Sheet（值、公式和格式），默认放在源 Sheet 之后"""
+
+    @abstractmethod
+    def delete_sheet(self, sheet: str) -> None:
+        """删除 Sheet"""
+
+    @abstractmethod
+    def get_value(self, sheet: str, address: str) -> Any:
+        """读取单元格或区域的值"""
+
+    @abstractmethod
+    def set_value(self, sheet: str, address: str, value: Any) -> None:
+        """从 address 左上角开始写入值"""
+
+    @abstractmethod
+    def get_formula(self, sheet: str, address: str) -> str:
+        """读取单元格公式，非公式单元格返回其文本"""
+
+    @abstractmethod
+    def set_formula(self, sheet: str, address: str, formula: str) -> None:
+        """写入单元格公式"""
+
+    @abstractmethod
+    def copy_range(self, sheet: str, source: str, destination: str) -> None:
+        """
+        复制区域（值、公式和格式），目标区域大于源区域时按源区域平铺，
+        公式中的相对引用按偏移调整，与 Excel 的复制粘贴一致
+        """
+
+    @abstractmethod
+    def delete_columns(self, sheet: str, columns: str) -> None:
+        """删除整列（如 "C:Z"），右侧的列左移"""
+
+    @abstractmethod
+    def clear_range(self, sheet: str, address: str) -> None:
+        """清空区域的值和格式"""
+
+    @abstractmethod
+    def used_bounds(self, sheet: str) -> Tuple[int, int]:
+        """返回已使用区域的 (最后一行, 最后一列)"""
+
+    @abstractmethod
+    def calculate(self) -> None:
+        """重新计算工作簿"""
+
+    @abstractmethod
+    def save(self) -> None:
+        """保存工作簿"""
+
+    def close(self) -> None:
+        """关闭工作簿，默认无操作"""
+
+    def autofit_columns(self, sheet: str, columns: str) -> None:
+        """列宽自适应，默认无操作"""
+
+    def format_header(self, sheet: str, address: str, tab_color: int) -> None:
+        """设置表头样式和 Sheet 标签颜色，默认无操作"""
+
+    @contextmanager
+    def batch_mode(self) -> Iterator[None]:
+        """批处理模式，期间的写入不触发重算，默认无操作"""
+        yield
+
+    def find_in_column(
+        self, sheet: str, keyword: Any, column: str = "A", max_row: int = 100
+    ) -> Optional[int]:
+        """在指定列的前 max_row 行中查找 keyword，返回行号，一次读取整列"""
+        values = self.get_value(sheet, f"{column}1:{column}{max_row}")
+        target = str(keyword).strip()
+        for row_index, value in enumerate(values, start=1):
+            if value is not None and str(value).strip() == target:
+                return row_index
+        return None
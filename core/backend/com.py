@@ -0,0 +1,185 @@
+import os
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+
+import xlwings as xw
+
+from core.backend.base import WorkbookBackend
+
+
+def selected_excel_if_open(filename):
+    """如果待处理Excel已经打开，直接使用"""
+    selected = False
+    selected_book = ""
+    selected_app = ""
+
+    for app in xw.apps:
+        for book in list(app.books):
+            book_name = os.path.basename(book.fullname) if book.fullname else book.name
+            if book_name.lower() == filename.lower():
+                selected_book = book
+                selected_app = app
+
+                selected = True
+                break
+        if selected:
+            break
+
+    return selected_book, selected_app
+
+
+class XlwingsWorkbook(WorkbookBackend):
+    """基于 xlwings 的 Excel 桌面端（COM）实现"""
+
+    name = "xlwings"
+
+    def __init__(self, book: xw.Book, run_in_background: bool = False) -> None:
+        self.book = book
+        self.app = book.app
+        self.run_in_background = run_in_background  # 是否由本程序启动的 Excel
+        self._batch_depth = 0
+
+    @classmethod
+    def open(cls, filename: str) -> "XlwingsWorkbook":
+        """
+        启动 Excel 应用并打开指定文件，失败时自动关闭 Excel
+        """
+        wb, app = selected_excel_if_open(filename)
+
+        if wb and app:
+            return cls(wb)
+
+        app = xw.App(visible=False, add_book=False)
+        try:
+            wb = app.books.open(filename)
+            return cls(wb, run_in_background=True)
+        except Exception as e:
+            print(f"无法打开当前 Excel {filename}")
+            app.quit()
+            raise e
+
+    def sheet_names(self) -> List[str]:
+        return [s.name for s in self.book.sheets]  # type: ignore
+
+    def add_sheet(self, sheet: str, before: Optional[str] = None) -> None:
+        if before not in self.sheet_names():
+            before = None
+        self.book.sheets.add(name=sheet, before=before)  # type: ignore
+
+    def copy_sheet(
+        self, sheet: str, new_sheet: str, after: Optional[str] = None
+    ) -> None:
+        source = self.book.sheets[sheet]
+        source.copy(after=self.book.sheets[after or sheet], name=new_sheet)
+
+    def delete_sheet(self, sheet: str) -> None:
+        self.book.sheets[sheet].delete()
+
+    def get_value(self, sheet: str, address: str) -> Any:
+        return self.book.sheets[sheet].range(address).value
+
+    def set_value(self, sheet: str, address: str, value: Any) -> None:
+        self.book.sheets[sheet].range(address).value = value
+
+    def get_formula(self, sheet: str, address: str) -> str:
+        return self.book.sheets[sheet].range(address).formula
+
+    def set_formula(self, sheet: str, address: str, formula: str) -> None:
+        self.book.sheets[sheet].range(address).formula = formula
+
+    def copy_range(self, sheet: str, source: str, destination: str) -> None:
+        xw_sheet = self.book.sheets[sheet]
+
+        enable_events = self.app.enable_events
+        display_alerts = self.app.display_alerts
+
+        self.app.enable_events = False  # 禁用VBA事件
+        self.app.display_alerts = False  # 禁用Excel自身的警告弹窗
+        try:
+            xw_sheet.range(source).api.Copy(Destination=xw_sheet.range(destination).api)
+            xw_sheet.api.Application.CutCopyMode = False  # 清除 复制模式 的虚线框
+
+        finally:
+            # 无论代码是否出错，都确保这些设置被恢复，否则会影响后续的Excel操作
+            self.app.enable_events = enable_events
+            self.app.display_alerts = display_alerts
+            xw_sheet.api.Application.CutCopyMode = True
+
+    def delete_columns(self, sheet: str, columns: str) -> None:
+        self.book.sheets[sheet].range(columns).delete()  # 清除值、格式、批注等
+
+    def clear_range(self, sheet: str, address: str) -> None:
+        self.book.sheets[sheet].range(address).clear()
+
+    def used_bounds(self, sheet: str) -> Tuple[int, int]:
+        used_range = self.book.sheets[sheet].used_range
+        return used_range.last_cell.row, used_range.last_cell.column
+
+    def calculate(self) -> None:
+        self.app.calculate()
+
+    def save(self) -> None:
+        self.book.save()
+
+    def close(self) -> None:
+        """仅关闭由本程序在后台启动的 Excel，用户已打开的工作簿保持打开"""
+        if self.run_in_background:
+            self.book.close()
+            self.app.quit()
+
+    def autofit_columns(self, sheet: str, columns: str) -> None:
+        self.book.sheets[sheet].range(columns).autofit()
+
+    def format_header(self, sheet: str, address: str, tab_color: int) -> None:
+        xw_sheet = self.book.sheets[sheet]
+        xw_sheet.api.Tab.Color = tab_color
+
+        # 定位表头范围
+        header_range = xw_sheet.range(address)
+        # 设置样式
+        header_range.api.Font.Bold = True  # 加粗
+        header_range.api.HorizontalAlignment = -4108  # 水平居中
+        header_range.api.VerticalAlignment = -4108  # 垂直居中
+        header_range.color = (192, 192, 192)  # 设置背景色
+        header_range.columns.autofit()
+        header_range.column_width = 80  # 表头宽度
+        header_range.row_height = 30  # 表头高度
+
+    @contextmanager
+    def batch_mode(self) -> Iterator[None]:
+        """
+        Excel 批处理模式：手动计算、关闭屏幕刷新、VBA 事件和警告弹窗
+
+        期间的写入不会触发重算，需要结果时调用 calculate() 统一计算一次；
+        退出时（包括出错）恢复进入前的设置，嵌套使用时由最外层负责恢复
+        """
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+            return
+
+        app = self.app
+        saved_settings = {
+            "calculation": app.calculation,
+            "screen_updating": app.screen_updating,
+            "enable_events": app.enable_events,
+            "display_alerts": app.display_alerts,
+        }
+
+        self._batch_depth = 1
+        try:
+            app.calculation = "manual"
+            app.screen_updating = False
+            app.enable_events = False
+            app.display_alerts = False
+            yield
+        finally:
+            self._batch_depth = 0
+            # 先恢复其他设置，最后恢复计算模式（恢复为自动时 Excel 会重算一次）
+            app.screen_updating = saved_settings["screen_updating"]
+            app.enable_events = saved_settings["enable_events"]
+            app.display_alerts = saved_settings["display_alerts"]
+            app.calculation = saved_settings["calculation"]
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+
+from core.backend.base import WorkbookBackend
+from core.workbook_calls import WorkbookCallRecorder
+
+
+class CountingWorkbook(WorkbookBackend):
+    """记录每次调用的工作簿后端代理，其余属性（如 filename、calls）转发给被代理的后端"""
+
+    def __init__(self, inner: WorkbookBackend, recorder: WorkbookCallRecorder) -> None:
+        self.inner = inner
+        self.recorder = recorder
+        self.name = inner.name
+
+    def __getattr__(self, name: str) -> Any:
+        # 复制或反序列化时 inner 尚未设置，避免无限递归
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _call(self, method: str, *args, **kwargs):
+        self.recorder.record(method)
+        return getattr(self.inner, method)(*args, **kwargs)
+
+    def sheet_names(self) -> List[str]:
+        return self._call("sheet_names")
+
+    def add_sheet(self, sheet: str, before: Optional[str] = None) -> None:
+        self._call("add_sheet", sheet, before)
+
+    def copy_sheet(
+        self, sheet: str, new_sheet: str, after: Optional[str] = None
+    ) -> None:
+        self._call("copy_sheet", sheet, new_sheet, after)
+
+    def delete_sheet(self, sheet: str) -> None:
+        self._call("delete_sheet", sheet)
+
+    def get_value(self, sheet: str, address: str) -> Any:
+        return self._call("get_value", sheet, address)
+
+    def set_value(self, sheet: str, address: str, value: Any) -> None:
+        self._call("set_value", sheet, address, value)
+
+    def get_formula(self, sheet: str, address: str) -> str:
+        return self._call("get_formula", sheet, address)
+
+    def set_formula(self, sheet: str, address: str, formula: str) -> None:
+        self._call("set_formula", sheet, address, formula)
+
+    def copy_range(self, sheet: str, source: str, destination: str) -> None:
+        self._call("copy_range", sheet, source, destination)
+
+    def delete_columns(self, sheet: str, columns: str) -> None:
+        self._call("delete_columns", sheet, columns)
+
+    def clear_range(self, sheet: str, address: str) -> None:
+        self._call("clear_range", sheet, address)
+
+    def used_bounds(self, sheet: str) -> Tuple[int, int]:
+        return self._call("used_bounds", sheet)
+
+    def calculate(self) -> None:
+        self._call("calculate")
+
+    def save(self) -> None:
+        self._call("save")
+
+    def close(self) -> None:
+        self._call("close")
+
+    def autofit_columns(self, sheet: str, columns: str) -> None:
+        self._call("autofit_columns", sheet, columns)
+
+    def format_header(self, sheet: str, address: str, tab_color: int) -> None:
+        self._call("format_header", sheet, address, tab_color)
+
+    @contextmanager
+    def batch_mode(self) -> Iterator[None]:
+        self.recorder.record("batch_mode")
+        with self.inner.batch_mode():
+            yield
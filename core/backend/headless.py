@@ -0,0 +1,214 @@
+from copy import copy
+from typing import Any, List, Optional, Tuple
+
+from openpyxl import load_workbook
+from openpyxl.formula.translate import Translator
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from core.backend.base import (
+    WorkbookBackend,
+    format_address,
+    normalize_values,
+    parse_address,
+    shape_values,
+)
+from core.backend.memory import delete_formula_columns
+
+try:
+    from pycel import ExcelCompiler
+except ImportError:  # pragma: no cover
+    ExcelCompiler = None
+
+
+def bgr_to_hex(color: int) -> str:
+    """将 Excel COM 使用的 BGR 整数颜色转换为 RRGGBB"""
+    red, green, blue = color & 0xFF, (color >> 8) & 0xFF, (color >> 16) & 0xFF
+    return f"{red:02X}{green:02X}{blue:02X}"
+
+
+class OpenpyxlWorkbook(WorkbookBackend):
+    """
+    基于 openpyxl 的无界面文件实现，不依赖 Excel，可在 Linux 上运行
+
+    公式由 pycel 求值，写入后在下次读取公式单元格时重新编译；
+    未安装 pycel 时公式单元格返回文件中缓存的计算结果
+    """
+
+    name = "headless"
+
+    def __init__(self, filename: str, use_evaluator: bool = True) -> None:
+        self.filename = filename
+        self.book = load_workbook(filename)
+        self.use_evaluator = use_evaluator and ExcelCompiler is not None
+        self._cached_book = (
+            None if self.use_evaluator else load_workbook(filename, data_only=True)
+        )
+        self._compiler = None
+
+    def sheet_names(self) -> List[str]:
+        return list(self.book.sheetnames)
+
+    def add_sheet(self, sheet: str, before: Optional[str] = None) -> None:
+        index = None
+        if before in self.book.sheetnames:
+            index = self.book.sheetnames.index(before)
+        self.book.create_sheet(sheet, index)
+        self._invalidate()
+
+    def copy_sheet(
+        self, sheet: str, new_sheet: str, after: Optional[str] = None
+    ) -> None:
+        ws = self.book.copy_worksheet(self.book[sheet])
+        ws.title = new_sheet
+        # copy_worksheet 追加到末尾，移动到 after 之后
+        target = self.book.sheetnames.index(after or sheet) + 1
+        self.book.move_sheet(ws, offset=target - self.book.sheetnames.index(new_sheet))
+        self._invalidate()
+
+    def delete_sheet(self, sheet: str) -> None:
+        del self.book[sheet]
+        self._invalidate()
+
+    def get_value(self, sheet: str, address: str) -> Any:
+        ws = self.book[sheet]
+        row1, col1, row2, col2 = parse_address(address)
+        row2 = min(row2, max(ws.max_row, row1))
+        return shape_values(
+            [
+                [self._cell_value(sheet, row, col) for col in range(col1, col2 + 1)]
+                for row in range(row1, row2 + 1)
+            ]
+        )
+
+    def set_value(self, sheet: str, address: str, value: Any) -> None:
+        ws = self.book[sheet]
+        row1, col1, _, _ = parse_address(address)
+        for i, row_values in enumerate(normalize_values(value)):
+            for j, cell_value in enumerate(row_values):
+                ws.cell(row=row1 + i, column=col1 + j).value = cell_value
+        self._invalidate()
+
+    def get_formula(self, sheet: str, address: str) -> str:
+        row, col, _, _ = parse_address(address)
+        value = self.book[sheet].cell(row=row, column=col).value
+        return "" if value is None else str(value)
+
+    def set_formula(self, sheet: str, address: str, formula: str) -> None:
+        row, col, _, _ = parse_address(address)
+        self.book[sheet].cell(row=row, column=col).value = formula
+        self._invalidate()
+
+    def copy_range(self, sheet: str, source: str, destination: str) -> None:
+        ws = self.book[sheet]
+        src_row1, src_col1, src_row2, src_col2 = parse_address(source)
+        dst_row1, dst_col1, dst_row2, dst_col2 = parse_address(destination)
+
+        height = src_row2 - src_row1 + 1
+        width = src_col2 - src_col1 + 1
+        if (dst_row1, dst_col1) == (dst_row2, dst_col2):
+            dst_row2, dst_col2 = dst_row1 + height - 1, dst_col1 + width - 1
+
+        for row in range(dst_row1, dst_row2 + 1):
+            for col in range(dst_col1, dst_col2 + 1):
+                src = ws.cell(
+                    row=src_row1 + (row - dst_row1) % height,
+                    column=src_col1 + (col - dst_col1) % width,
+                )
+                dst = ws.cell(row=row, column=col)
+                value = src.value
+                if isinstance(value, str) and value.startswith("="):
+                    value = Translator(value, origin=src.coordinate).translate_formula(
+                        dst.coordinate
+                    )
+                dst.value = value
+                if src.has_style:
+                    dst._style = copy(src._style)
+
+        self._invalidate()
+
+    def delete_columns(self, sheet: str, columns: str) -> None:
+        _, col1, _, col2 = parse_address(columns)
+        ws = self.book[sheet]
+        ws.delete_cols(col1, col2 - col1 + 1)
+        # openpyxl 只移动单元格，不调整公式中的引用，按 Excel 的规则调整，包括其他 Sheet 中的引用
+        for other in self.book.worksheets:
+            local = other.title == sheet
+            for row in other.iter_rows():
+                for cell in row:
+                    value = cell.value
+                    if isinstance(value, str) and value.startswith("="):
+                        cell.value = delete_formula_columns(
+                            value, col1, col2, sheet, local
+                        )
+        self._invalidate()
+
+    def clear_range(self, sheet: str, address: str) -> None:
+        ws = self.book[sheet]
+        row1, col1, row2, col2 = parse_address(address)
+        for row in ws.iter_rows(
+            min_row=row1,
+            max_row=min(row2, ws.max_row),
+            min_col=col1,
+            max_col=min(col2, ws.max_column),
+        ):
+            for cell in row:
+                cell.value = None
+                cell.style = "Normal"
+        self._invalidate()
+
+    def used_bounds(self, sheet: str) -> Tuple[int, int]:
+        ws = self.book[sheet]
+        return ws.max_row, ws.max_column
+
+    def calculate(self) -> None:
+        """公式在读取时求值，这里只丢弃旧的编译结果"""
+        self._invalidate()
+
+    def save(self) -> None:
+        self.book.save(self.filename)
+
+    def autofit_columns(self, sheet: str, columns: str) -> None:
+        """按单元格文本长度估算列宽"""
+        ws = self.book[sheet]
+        _, col1, _, col2 = parse_address(columns)
+        for col in range(col1, col2 + 1):
+            letter = get_column_letter(col)
+            lengths = [
+                len(str(cell.value))
+                for cell in ws[letter]
+                if cell.value is not None and not str(cell.value).startswith("=")
+            ]
+            if lengths:
+                ws.column_dimensions[letter].width = max(lengths) + 2
+
+    def format_header(self, sheet: str, address: str, tab_color: int) -> None:
+        ws = self.book[sheet]
+        ws.sheet_properties.tabColor = bgr_to_hex(tab_color)
+
+        row1, col1, row2, col2 = parse_address(address)
+        for row in ws.iter_rows(min_row=row1, max_row=row2, min_col=col1, max_col=col2):
+            for cell in row:
+                cell.font = Font(bold=True)
+                cell.alignment = Alignment(horizontal="center", vertical="center")
+                cell.fill = PatternFill("solid", fgColor="C0C0C0")
+        for col in range(col1, col2 + 1):
+            ws.column_dimensions[get_column_letter(col)].width = 80
+        ws.row_dimensions[row1].height = 30
+
+    def _cell_value(self, sheet: str, row: int, col: int) -> Any:
+        value = self.book[sheet].cell(row=row, column=col).value
+        if not (isinstance(value, str) and value.startswith("=")):
+            return value
+
+        if not self.use_evaluator:
+            return self._cached_book[sheet].cell(row=row, column=col).value
+
+        if self._compiler is None:
+            self._compiler = ExcelCompiler(excel=self.book)
+        return self._compiler.evaluate(
+            f"'{sheet}'!{format_address(row, col, row, col)}"
+        )
+
+    def _invalidate(self) -> None:
+        self._compiler = None
@@ -0,0 +1,523 @@
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.backend.base import (
+    WorkbookBackend,
+    normalize_values,
+    parse_address,
+    shape_values,
+)
+from core.utils import col_index_to_letter, col_letter_to_index, parse_date
+
+# 公式求值函数：(工作簿, Sheet 名称, 行号, 列号, 公式) -> 值
+FormulaEvaluator = Callable[["MemoryWorkbook", str, int, int, str], Any]
+
+# 公式中的字符串和单元格引用：字符串原样保留；引用可带 Sheet 前缀（含引号的名称），
+# 区域的两个端点作为一个整体匹配，排除函数名（后面紧跟括号）和名称中的字母数字
+_CELL = r"\$?[A-Z]{1,3}\$?\d+"
+_FORMULA_TOKEN_PATTERN = re.compile(
+    r'("(?:[^"]|"")*")'
+    r"|(?<![\w.$])(?:('(?:[^']|'')+'|[^\W\d][\w.]*)!)?"
+    rf"({_CELL})(?::({_CELL}))?(?![\w(])"
+)
+_CELL_PATTERN = re.compile(r"(\$?)([A-Z]{1,3})(\$?)(\d+)")
+
+# 单元格引用：(列锁定, 列号, 行锁定, 行号)
+CellRef = Tuple[str, int, str, int]
+
+
+def _parse_ref(ref: str) -> CellRef:
+    col_lock, letters, row_lock, digits = _CELL_PATTERN.fullmatch(ref).groups()  # type: ignore
+    return col_lock, col_letter_to_index(letters), row_lock, int(digits)
+
+
+def _format_ref(ref: CellRef) -> str:
+    col_lock, col, row_lock, row = ref
+    return f"{col_lock}{col_index_to_letter(col)}{row_lock}{row}"
+
+
+def _sheet_name(prefix: str) -> str:
+    if prefix.startswith("'"):
+        return prefix[1:-1].replace("''", "'")
+    return prefix
+
+
+def _map_refs(
+    formula: str,
+    func: Callable[[Optional[str], CellRef, Optional[CellRef]], Optional[str]],
+) -> str:
+    """
+    对公式中的每个单元格引用或区域调用 func(Sheet 名称, 起点, 终点)，用返回值替换引用（不含 Sheet 前缀），
+    返回 None 时保持不变；没有 Sheet 前缀时 Sheet 名称为 None，单个单元格的终点为 None
+    """
+
+    def _replace(match: re.Match) -> str:
+        text, prefix, first, last = match.groups()
+        if text is not None:
+            return text
+        result = func(
+            _sheet_name(prefix) if prefix else None,
+            _parse_ref(first),
+            _parse_ref(last) if last else None,
+        )
+        if result is None:
+            return match.group(0)
+        return f"{prefix}!{result}" if prefix else result
+
+    return _FORMULA_TOKEN_PATTERN.sub(_replace, formula)
+
+
+def translate_formula(formula: str, row_offset: int, col_offset: int) -> str:
+    """按偏移量调整公式中的相对引用（含其他 Sheet 的引用），$ 锁定的行列保持不变"""
+
+    def _shift(ref: CellRef) -> str:
+        col_lock, col, row_lock, row = ref
+        if not col_lock:
+            col += col_offset
+        if not row_lock:
+            row += row_offset
+        return _format_ref((col_lock, col, row_lock, row))
+
+    def _translate(_, first: CellRef, last: Optional[CellRef]) -> str:
+        if last is None:
+            return _shift(first)
+        return f"{_shift(first)}:{_shift(last)}"
+
+    return _map_refs(formula, _translate)
+
+
+def delete_formula_columns(
+    formula: str, col1: int, col2: int, sheet: Optional[str] = None, local: bool = True
+) -> str:
+    """
+    按 Excel 删除列的规则调整公式中对 sheet 的引用：被删除列右侧的引用左移（$ 锁定的也左移），
+    引用被删除列的变为 #REF!，左侧的不变；区域按两个端点整体收缩，全部被删除时变为 #REF!
+
+    :param sheet: 删除列的 Sheet，带其他 Sheet 前缀的引用不变
+    :param local: 公式是否在 sheet 中，是时没有 Sheet 前缀的引用也调整
+    """
+    width = col2 - col1 + 1
+
+    def _delete(
+        ref_sheet: Optional[str], first: CellRef, last: Optional[CellRef]
+    ) -> Optional[str]:
+        if ref_sheet is None and not local:
+            return None
+        if ref_sheet is not None and ref_sheet != sheet:
+            return None
+
+        start, end = first[1], (last or first)[1]
+        if col1 <= start and end <= col2:
+            return "#REF!"
+        if start > col2:
+            start -= width
+        elif start >= col1:
+            start = col1
+        if end > col2:
+            end -= width
+        elif end >= col1:
+            end = col1 - 1
+
+        first = (first[0], start, first[2], first[3])
+        if last is None:
+            return _format_ref(first)
+        last = (last[0], end, last[2], last[3])
+        return f"{_format_ref(first)}:{_format_ref(last)}"
+
+    return _map_refs(formula, _delete)
+
+
+class MemoryWorkbook(WorkbookBackend):
+    """
+    纯内存工作簿，用于无 Excel 环境下运行和压测完整流程
+
+    公式以字符串保存，读取时交给 evaluator 求值，未配置 evaluator 时公式单元格的值为 None；
+    calls 记录每类操作的调用次数，可用来估算对应的 COM 调用量
+    """
+
+    name = "memory"
+
+    def __init__(self, evaluator: Optional[FormulaEvaluator] = None) -> None:
+        self.evaluator = evaluator
+        self.calls: Counter = Counter()
+        self._sheets: Dict[str, Dict[Tuple[int, int], Any]] = {}
+
+    def sheet_names(self) -> List[str]:
+        return list(self._sheets)
+
+    def add_sheet(self, sheet: str, before: Optional[str] = None) -> None:
+        self.calls["add_sheet"] += 1
+        if sheet in self._sheets:
+            raise ValueError(f"Sheet 已存在: {sheet}")
+
+        if before not in self._sheets:
+            self._sheets[sheet] = {}
+            return
+
+        # 保持 Sheet 顺序，插入到 before 之前
+        sheets = {}
+        for name, cells in self._sheets.items():
+            if name == before:
+                sheets[sheet] = {}
+            sheets[name] = cells
+        self._sheets = sheets
+
+    def copy_sheet(
+        self, sheet: str, new_sheet: str, after: Optional[str] = None
+    ) -> None:
+        self.calls["copy_sheet"] += 1
+        if new_sheet in self._sheets:
+            raise ValueError(f"Sheet 已存在: {new_sheet}")
+
+        copied = dict(self._cells(sheet))
+        after = after or sheet
+        sheets = {}
+        for name, cells in self._sheets.items():
+            sheets[name] = cells
+            if name == after:
+                sheets[new_sheet] = copied
+        self._sheets = sheets
+
+    def delete_sheet(self, sheet: str) -> None:
+        self.calls["delete_sheet"] += 1
+        self._cells(sheet)
+        del self._sheets[sheet]
+
+    def get_value(self, sheet: str, address: str) -> Any:
+        self.calls["get_value"] += 1
+        cells = self._cells(sheet)
+        row1, col1, row2, col2 = self._bounded(sheet, address)
+        return shape_values(
+            [
+                [
+                    self._evaluate(sheet, row, col, cells.get((row, col)))
+                    for col in range(col1, col2 + 1)
+                ]
+                for row in range(row1, row2 + 1)
+            ]
+        )
+
+    def set_value(self, sheet: str, address: str, value: Any) -> None:
+        self.calls["set_value"] += 1
+        cells = self._cells(sheet)
+        row1, col1, _, _ = parse_address(address)
+        for i, row_values in enumerate(normalize_values(value)):
+            for j, cell_value in enumerate(row_values):
+                self._store(cells, row1 + i, col1 + j, cell_value)
+
+    def get_formula(self, sheet: str, address: str) -> str:
+        self.calls["get_formula"] += 1
+        row, col, _, _ = parse_address(address)
+        value = self._cells(sheet).get((row, col))
+        return "" if value is None else str(value)
+
+    def set_formula(self, sheet: str, address: str, formula: str) -> None:
+        self.calls["set_formula"] += 1
+        row, col, _, _ = parse_address(address)
+        self._store(self._cells(sheet), row, col, formula)
+
+    def copy_range(self, sheet: str, source: str, destination: str) -> None:
+        self.calls["copy_range"] += 1
+        cells = self._cells(sheet)
+        src_row1, src_col1, src_row2, src_col2 = parse_address(source)
+        dst_row1, dst_col1, dst_row2, dst_col2 = parse_address(destination)
+
+        height = src_row2 - src_row1 + 1
+        width = src_col2 - src_col1 + 1
+        # 目标为单元格时粘贴与源区域同样大小
+        if (dst_row1, dst_col1) == (dst_row2, dst_col2):
+            dst_row2, dst_col2 = dst_row1 + height - 1, dst_col1 + width - 1
+
+        source_cells = {
+            (row - src_row1, col - src_col1): value
+            for (row, col), value in cells.items()
+            if src_row1 <= row <= src_row2 and src_col1 <= col <= src_col2
+        }
+        for row in range(dst_row1, dst_row2 + 1):
+            for col in range(dst_col1, dst_col2 + 1):
+                offset = ((row - dst_row1) % height, (col - dst_col1) % width)
+                value = source_cells.get(offset)
+                if isinstance(value, str) and value.startswith("="):
+                    value = translate_formula(
+                        value,
+                        row - src_row1 - offset[0],
+                        col - src_col1 - offset[1],
+                    )
+                self._store(cells, row, col, value)
+
+    def delete_columns(self, sheet: str, columns: str) -> None:
+        self.calls["delete_columns"] += 1
+        _, col1, _, col2 = parse_address(columns)
+        width = col2 - col1 + 1
+        cells = self._cells(sheet)
+        shifted = {}
+        for (row, col), value in cells.items():
+            if col1 <= col <= col2:
+                continue
+            if isinstance(value, str) and value.startswith("="):
+                value = delete_formula_columns(value, col1, col2, sheet)
+            shifted[(row, col - width if col > col2 else col)] = value
+        cells.clear()
+        cells.update(shifted)
+
+        # 其他 Sheet 中引用该 Sheet 的公式同样调整
+        for name, other in self._sheets.items():
+            if name == sheet:
+                continue
+            for key, value in other.items():
+                if isinstance(value, str) and value.startswith("="):
+                    other[key] = delete_formula_columns(
+                        value, col1, col2, sheet, local=False
+                    )
+
+    def clear_range(self, sheet: str, address: str) -> None:
+        self.calls["clear_range"] += 1
+        row1, col1, row2, col2 = parse_address(address)
+        cells = self._cells(sheet)
+        for key in [
+            (row, col)
+            for row, col in cells
+            if row1 <= row <= row2 and col1 <= col <= col2
+        ]:
+            del cells[key]
+
+    def used_bounds(self, sheet: str) -> Tuple[int, int]:
+        self.calls["used_bounds"] += 1
+        cells = self._cells(sheet)
+        if not cells:
+            return 1, 1
+        return max(row for row, _ in cells), max(col for _, col in cells)
+
+    def calculate(self) -> None:
+        self.calls["calculate"] += 1
+
+    def save(self) -> None:
+        self.calls["save"] += 1
+
+    def _cells(self, sheet: str) -> Dict[Tuple[int, int], Any]:
+        if sheet not in self._sheets:
+            raise KeyError(f"Sheet 不存在: {sheet}")
+        return self._sheets[sheet]
+
+    def _bounded(self, sheet: str, address: str) -> Tuple[int, int, int, int]:
+        """整列地址只读取到已使用的最后一行"""
+        row1, col1, row2, col2 = parse_address(address)
+        cells = self._sheets[sheet]
+        if ":" in address and not any(c.isdigit() for c in address):
+            row2 = max([row for row, _ in cells] or [1])
+        return row1, col1, row2, col2
+
+    @staticmethod
+    def _store(cells: Dict[Tuple[int, int], Any], row: int, col: int, value: Any):
+        if value is None or value == "":
+            cells.pop((row, col), None)
+        else:
+            cells[(row, col)] = value
+
+    def _evaluate(self, sheet: str, row: int, col: int, value: Any) -> Any:
+        if not (isinstance(value, str) and value.startswith("=")):
+            return value
+        if self.evaluator is None:
+            return None
+        return self.evaluator(self, sheet, row, col, value)
+
+    # ---------------------------------------------------------------------------------
+    # 报价模板
+    # ---------------------------------------------------------------------------------
+
+    @classmethod
+    def pricing_template(cls) -> "MemoryWorkbook":
+        """
+        构建与报价工作簿结构一致的最小模板：看涨阶梯、二元看涨和标的价格 Sheet
+
+        B 列为模板列，交易日按交易日历 Sheet 计算，T 为交易日 / 365，
+        报价单元格由询价要素、T、VOL 和无风险利率按 core.pricing 的定价公式计算
+        """
+        from processor.mapping import CBG_SHEET_HANDLER
+
+        wb = cls(evaluator=_template_evaluator)
+        wb.add_sheet("交易日历")
+        for column, holidays in TEMPLATE_HOLIDAYS.items():
+            wb.set_value("交易日历", f"{column}1", [[day] for day in holidays])
+
+        wb.add_sheet("标的价格")
+        wb.set_value("标的价格", "E1", [0.25, 0.5, 1.0, 2.0, 3.0])
+        wb.set_value(
+            "标的价格",
+            "E2",
+            [
+                [0.18, 0.17, 0.16, 0.15, 0.15],  # IDC
+                [0.16, 0.15, 0.14, 0.13, 0.13],  # AU SGE
+                [0.17, 0.16, 0.15, 0.14, 0.14],  # 其他
+            ],
+        )
+
+        for sheet_name, handler in CBG_SHEET_HANDLER.items():
+            wb.add_sheet(sheet_name)
+            labels = {
+                int(row): label for label, (row, _) in handler.fields_rule_dict.items()
+            }
+            labels.update(
+                {int(row): label for label, row in handler.other_dict.items()}
+            )
+            labels[handler.quote_line] = handler.quote_name
+            labels.update(TEMPLATE_LABEL_ROWS)
+            for row, label in labels.items():
+                wb.set_value(sheet_name, f"A{row}", label)
+
+            other_dict = handler.other_dict
+            wb.set_formula(
+                sheet_name,
+                f"B{other_dict['交易日']}",
+                "=NETWORKDAYS(B4,B5,交易日历!$C:$C)",
+            )
+            wb.set_formula(
+                sheet_name, f"B{other_dict['T']}", f"=B{other_dict['交易日']}/365"
+            )
+            function, fields = TEMPLATE_PRICING_FORMULAS[sheet_name]
+            rows = {**handler.fields_rule_dict, **other_dict}
+            arguments = ",".join(
+                f"B{rows[field][0] if isinstance(rows[field], tuple) else rows[field]}"
+                for field in fields
+            )
+            wb.set_formula(
+                sheet_name, f"B{handler.quote_line}", f"={function}({arguments})"
+            )
+
+        wb.add_sheet("8080结构")
+        wb.calls.clear()
+        return wb
+
+
+# 模板中标题、哈希和确认行所在的行号
+TEMPLATE_LABEL_ROWS = {
+    30: "邮件标题",
+    31: "邮件标记",
+    32: "是否可以回复报价邮件（是/否/[空]忽略）",
+}
+
+
+# 模板交易日历中的节假日：A 列为上海金交易所，C 列为伦敦金
+TEMPLATE_HOLIDAYS = {
+    "A": [
+        "2025-10-01", "2025-10-02", "2025-10-03", "2025-10-06", "2025-10-07",
+        "2025-10-08", "2026-01-01", "2026-02-16", "2026-02-17", "2026-02-18",
+        "2026-02-19", "2026-02-20", "2026-04-06", "2026-05-01", "2026-06-19",
+    ],
+    "C": [
+        "2025-12-25", "2025-12-26", "2026-01-01", "2026-04-03", "2026-04-06",
+        "2026-05-04", "2026-05-25", "2026-08-31", "2026-12-25", "2026-12-28",
+    ],
+}  # fmt: skip
+
+# 模板报价公式：产品 -> (函数名, 参数对应的字段)，参数顺序与 core.pricing 中的定价函数一致
+TEMPLATE_PRICING_FORMULAS = {
+    "二元看涨": (
+        "BINARYCALLSTRIKE",
+        (
+            "最低收益率（年化）",
+            "最高收益率（年化）",
+            "期权费 （年化）",
+            "T",
+            "VOL",
+            "无风险利率",
+        ),
+    ),
+    "看涨阶梯": (
+        "BULLLADDERSTRIKE",
+        (
+            "最低收益率（年化）",
+            "中间收益率（年化）",
+            "最高收益率（年化）",
+            "行权价格2（高）",
+            "期权费（年化）",
+            "T",
+            "VOL",
+            "无风险利率",
+        ),
+    ),
+}
+
+_PRICING_FORMULA_PATTERN = re.compile(r"^=(BINARYCALLSTRIKE|BULLLADDERSTRIKE)\((.*)\)$")
+_DAYS_TO_T_PATTERN = re.compile(r"^=([A-Z]+)(\d+)/365$")
+_HOLIDAY_COLUMN_PATTERN = re.compile(r"交易日历!\$?([A-Z]+):")
+
+
+def _template_calendar(wb: MemoryWorkbook):
+    """由交易日历 Sheet 构建交易日历，模板运行期间不变，构建一次后缓存在工作簿上"""
+    from core.trading_calendar import CALENDAR_SHEET, MARKET_COLUMNS, TradingCalendar
+
+    calendar = getattr(wb, "_template_calendar", None)
+    if calendar is None:
+        cells = wb._cells(CALENDAR_SHEET)
+        holidays = {}
+        for market, column in MARKET_COLUMNS.items():
+            col = col_letter_to_index(column)
+            days = [parse_date(value) for (_, c), value in cells.items() if c == col]
+            holidays[market] = [day.date() for day in days if day]
+        calendar = wb._template_calendar = TradingCalendar(holidays, CALENDAR_SHEET)
+    return calendar
+
+
+def _template_evaluator(
+    wb: MemoryWorkbook, sheet: str, row: int, col: int, formula: str
+) -> Any:
+    """
+    模板公式求值：交易日按 NETWORKDAYS 和公式引用的节假日列计算，T 为交易日 / 365，
+    报价按 core.pricing 的定价函数计算，其余公式返回 None
+    """
+    cells = wb._cells(sheet)
+    match = _PRICING_FORMULA_PATTERN.match(formula)
+    if match:
+        return _template_quote(wb, sheet, match.group(1), match.group(2))
+
+    if formula.startswith("=NETWORKDAYS("):
+        from core.trading_calendar import MARKET_COLUMNS
+
+        match = _HOLIDAY_COLUMN_PATTERN.search(formula)
+        column = match.group(1) if match else MARKET_COLUMNS["IDC"]
+        # 按节假日列选择市场，上海金的标的名称以 AU 开头
+        underlying = "AU" if column == MARKET_COLUMNS["SGE"] else ""
+        days = _template_calendar(wb).trading_days(
+            underlying, cells.get((4, col)), cells.get((5, col))
+        )
+        return days or 0
+
+    match = _DAYS_TO_T_PATTERN.match(formula)
+    if match:
+        days_row, days_col = int(match.group(2)), col_letter_to_index(match.group(1))
+        days = wb._evaluate(sheet, days_row, days_col, cells.get((days_row, days_col)))
+        return (days or 0) / 365
+
+    return None
+
+
+def _template_quote(
+    wb: MemoryWorkbook, sheet: str, function: str, arguments: str
+) -> Optional[float]:
+    """按报价公式引用的单元格取值定价，输入不完整时返回 None"""
+    import math
+
+    from core.pricing import (
+        binary_call_strike,
+        bull_ladder_strike,
+        parse_rate,
+        parse_strike,
+    )
+
+    cells = wb._cells(sheet)
+    values = []
+    for argument in arguments.split(","):
+        row, col, _, _ = parse_address(argument.strip())
+        values.append(wb._evaluate(sheet, row, col, cells.get((row, col))))
+
+    # 定价函数按向量计算，单个报价以长度为 1 的数组传入
+    parse = [parse_rate] * len(values)
+    if function == "BULLLADDERSTRIKE":
+        parse[3] = parse_strike
+        price = bull_ladder_strike
+    else:
+        price = binary_call_strike
+    quote = float(price(*([f(value)] for f, value in zip(parse, values)))[0])
+    return None if math.isnan(quote) else quote
@@ -1,32 +1,51 @@
 import email
 import imaplib
 import os
-import re
 import smtplib
+import threading
+import time
 from collections import defaultdict
 from datetime import date, datetime
+from email.mime.base import MIMEBase
 from email.mime.message import MIMEMessage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import make_msgid
-from typing import Dict, List, Union
-
-from bs4 import BeautifulSoup
-from imapclient.imap_utf7 import encode as encode_folder_name
+from typing import Dict, List, Optional, Tuple, Union
 
 from core.context import mail_context
+from core.metrics import metrics
+from core.parse_pool import get_parse_pool
 from core.parser import (
+    ParsedMail,
     gen_cc,
     parse_from_info,
-    parse_html_to_dict,
+    parse_mail_message,
     parse_mail_sent_time,
-    parse_multipart_content,
     parse_subject,
 )
+from core.profiling import timed
 from core.schemas import EachMail
+from core.timings import timing_recorder
 from processor.registry import choose_sheet_by_subject, get_cc_map
 
 
+def rfc822_part(raw_email: bytes) -> MIMEBase:
+    """
+    以原始邮件数据构造 message/rfc822 附件
+
+    7bit 的邮件（正文经过 base64 或 quoted-printable 编码，绝大多数邮件如此）以原始数据作为 payload，
+    发送时原样写出，不解析也不重新序列化原始邮件；
+    含 8bit 字节的邮件 email 包无法原样写出，解析后按原来的方式附加
+    """
+    if not raw_email.isascii():
+        return MIMEMessage(email.message_from_bytes(raw_email))
+
+    part = MIMEBase("message", "rfc822")
+    part.set_payload(raw_email.decode("ascii"))
+    return part
+
+
 class EmailClient:
     def __init__(
         self,
@@ -78,17 +97,22 @@ class EmailClient:
 
         return client
 
+    @timed("read_mail")
     def read_mail(
         self,
         folder: str = "银行询价",
         since_date: date = date.today(),
+        parse_workers: Optional[int] = None,
     ) -> Dict[str, List[EachMail]]:
         """读取所有邮件，并整理成字典
 
         :param folder: 邮件文件夹，默认为 "INBOX"
         :param since_date: 读取指定日期之后的邮件，默认为今天
+        :param parse_workers: 解析邮件的进程数，默认读取 PARSE_WORKERS，1 为不使用进程池
         :return: 返回一个字典，键为发件人地址，值为 EachMail 对象列表
         """
+        from imapclient.imap_utf7 import encode as encode_folder_name
+
         mail_client = self.connect(protocol="imap")
 
         encoded_folder = encode_folder_name("银行询价")  # 编码为 IMAP 支持格式
@@ -106,99 +130,129 @@ class EmailClient:
         #     (my_date + timedelta(days=1)).strftime("%d-%b-%Y"),
         # )
 
+        message_ids = self.search_mail_ids(mail_client, since_date)
+        if message_ids is None:
+            print("未找到邮件")
+            return result_dict
+
+        # 开启解析进程池时，读取下一封邮件的同时由子进程解析已读取的邮件
+        pool = get_parse_pool(parse_workers)
+        parsing = []
+
+        for msg_id in message_ids:
+            fetched = self.fetch_raw_mail(mail_client, msg_id)
+            if not fetched:
+                continue
+            fetched_at = time.time()
+            metrics.fetched.inc()
+
+            if pool is not None:
+                parsing.append((fetched_at, fetched[1], pool.submit(msg_id, *fetched)))
+                continue
+
+            each_mail = self.parse_raw_mail(msg_id, *fetched)
+            if each_mail:
+                timing_recorder.mark_parsed(each_mail, fetched_at)
+                result_dict[each_mail.from_addr].append(each_mail)
+
+        mail_client.close()
+
+        for fetched_at, raw_email, future in parsing:
+            each_mail = pool.build(self, future, raw_email)
+            if each_mail:
+                timing_recorder.mark_parsed(each_mail, fetched_at)
+                result_dict[each_mail.from_addr].append(each_mail)
+
+        return result_dict
+
+    def search_mail_ids(
+        self, mail_client: imaplib.IMAP4, since_date: date
+    ) -> Optional[List[bytes]]:
+        """搜索指定日期之后的邮件编号，搜索失败时返回 None"""
         status, messages = mail_client.search(  # type: ignore
             None, "Since", since_date.strftime("%d-%b-%Y")
         )
         if status != "OK":
-            print("未找到邮件")
-            return result_dict
+            return None
 
         # 邮件ID列表
-        message_ids = messages[0].split()
+        return messages[0].split()
 
-        for msg_id in message_ids:
-            # 读取邮件头部
-            status, msg_data = mail_client.fetch(msg_id, "(BODY.PEEK[HEADER])")
-            if status != "OK" or not msg_data or not msg_data[0]:
-                continue
+    @metrics.observe("fetch")
+    def fetch_raw_mail(
+        self, mail_client: imaplib.IMAP4, msg_id: bytes
+    ) -> Optional[Tuple[tuple, bytes]]:
+        """
+        先读取邮件头筛选，再读取有效邮件的原始数据
 
-            header_msg = email.message_from_bytes(msg_data[0][1])
+        :return: (邮件头信息, 原始邮件数据)，无效邮件返回 None
+        """
+        # 读取邮件头部
+        status, msg_data = mail_client.fetch(msg_id, "(BODY.PEEK[HEADER])")
+        if status != "OK" or not msg_data or not msg_data[0]:
+            return None
 
-            processed_header_msg = self._is_valid_header_msg(header_msg)
-            if not processed_header_msg:
-                continue
-            else:
-                subject, sender, sender_email, sent_time, sheet_name = (
-                    processed_header_msg
-                )
-
-            # 邮件原始数据
-            status, msg_data = mail_client.fetch(msg_id, "(RFC822)")
-            if status != "OK" or not msg_data or not msg_data[0]:
-                continue
+        header_msg = email.message_from_bytes(msg_data[0][1])
 
-            # 邮件内容
-            raw_email = msg_data[0][1]
-            msg = email.message_from_bytes(raw_email)
-
-            # 文本内容
-            content = parse_multipart_content(msg)
-
-            # HTML　表格的内容（字典类型）
-            df_dict = parse_html_to_dict(content.html)
-            if not df_dict:
-                mail_context.skip_mail(
-                    subject,
-                    sender_email,
-                    sent_time,
-                    datetime.now(),
-                    "无可用表格内容，跳过邮件",
-                )
-                continue
+        processed_header_msg = self._is_valid_header_msg(header_msg)
+        if not processed_header_msg:
+            return None
 
-            # 处理挂钩标的合约
-            underlying_asset = df_dict.get("挂钩标的合约")
-            if underlying_asset:
-                underlying_asset = (
-                    re.findall(r"[（(](.*?)[）)]", underlying_asset)[0]
-                    .replace(".", "")
-                    .upper()
-                )
-
-            if not (
-                underlying_asset.startswith("AU") or underlying_asset.startswith("XAU")
-            ):
-                mail_context.skip_mail(
-                    subject,
-                    sender_email,
-                    sent_time,
-                    datetime.now(),
-                    "非 AU 或 XAU 开头的标的合约，暂时跳过",
-                )
-                continue
+        # 邮件原始数据
+        status, msg_data = mail_client.fetch(msg_id, "(RFC822)")
+        if status != "OK" or not msg_data or not msg_data[0]:
+            return None
 
-            soup = BeautifulSoup(content.html, "html.parser")
-
-            result_dict[sender_email].append(
-                EachMail(
-                    msg_id=msg_id,
-                    subject=subject,
-                    from_name=sender,
-                    from_addr=sender_email,
-                    content=content,
-                    message=msg,
-                    df_dict=df_dict,
-                    soup=soup,
-                    sheet_name=sheet_name,
-                    sent_time=sent_time,
-                    underlying=underlying_asset,
-                )
-            )
+        return processed_header_msg, msg_data[0][1]
 
-        mail_client.close()
+    @timed("parse_raw_mail")
+    @metrics.observe("parse")
+    def parse_raw_mail(
+        self, msg_id, header_info: tuple, raw_email: bytes
+    ) -> Optional[EachMail]:
+        """
+        解析原始邮件数据
 
-        return result_dict
+        :param header_info: _is_valid_header_msg 返回的 (标题, 发件人, 发件人邮箱, 发送时间, Sheet 名称)
+        :return: EachMail 对象，无可用表格或标的不支持时返回 None
+        """
+        # 邮件内容
+        msg = email.message_from_bytes(raw_email)
+
+        return self.build_each_mail(
+            parse_mail_message(msg_id, header_info, msg), raw_email
+        )
+
+    def build_each_mail(
+        self, parsed: ParsedMail, raw_email: bytes
+    ) -> Optional[EachMail]:
+        """
+        把解析结果组装为 EachMail，不可报价的邮件记录跳过原因后返回 None
 
+        EachMail 只保存原始邮件数据，邮件对象和 soup 在使用时才生成
+        """
+        subject, sender, sender_email, sent_time, sheet_name = parsed.header_info
+        if parsed.skip_reason:
+            mail_context.skip_mail(
+                subject, sender_email, sent_time, datetime.now(), parsed.skip_reason
+            )
+            return None
+
+        return EachMail(
+            msg_id=parsed.msg_id,
+            subject=subject,
+            from_name=sender,
+            from_addr=sender_email,
+            content=parsed.content,
+            df_dict=parsed.df_dict,
+            sheet_name=sheet_name,
+            sent_time=sent_time,
+            underlying=parsed.underlying,
+            raw=raw_email,
+        )
+
+    @timed("reply_mail")
+    @metrics.observe("send")
     def reply_mail(
         self,
         last_email: EachMail,
@@ -212,7 +266,8 @@ class EmailClient:
     def _build_reply_mime(self, last_email) -> MIMEMultipart:
         """构建回复邮件的 MIMEMultipart 对象"""
 
-        original_msg = last_email.message
+        # 回复只用到原始邮件的邮件头，不解析正文
+        original_msg = last_email.headers
 
         reply_mime = MIMEMultipart("mixed")
         reply_mime["Message-ID"] = make_msgid()
@@ -250,7 +305,7 @@ class EmailClient:
         reply_orig_message = MIMEMultipart("alternative")
         reply_body.attach(reply_orig_message)
 
-        reply_body.attach(MIMEMessage(original_msg))
+        reply_body.attach(rfc822_part(last_email.raw))
         return reply_mime
 
     def _send_reply_mail(self, reply_mime: MIMEMultipart) -> None:
@@ -323,6 +378,45 @@ class EmailClient:
         return subject, sender, sender_email, sent_time, sheet_name
 
 
+class KeepAliveSender:
+    """
+    复用同一个 SMTP 连接回复邮件，连接断开时重连一次，供常驻进程使用
+
+    SMTP 连接不能并发使用，发送时加锁
+    """
+
+    def __init__(self, client: EmailClient) -> None:
+        self.client = client
+        self._smtp: Optional[smtplib.SMTP_SSL] = None
+        self._lock = threading.Lock()
+
+    @timed("reply_mail")
+    @metrics.observe("send")
+    def reply_mail(self, last_email: EachMail) -> None:
+        reply_mime = self.client._build_reply_mime(last_email)
+
+        with self._lock:
+            for attempt in range(2):
+                if self._smtp is None:
+                    self._smtp = self.client.connect("smtp")
+                try:
+                    self._smtp.send_message(reply_mime)
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self._smtp = None
+                    if attempt:
+                        raise
+
+    def close(self) -> None:
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except smtplib.SMTPException:
+                    pass
+                self._smtp = None
+
+
 def create_mail_client():
     """从环境变量创建并返回邮件客户端实例"""
     required_env_vars = {
@@ -361,8 +455,29 @@ def create_send_mail_client():
     )
 
 
-# 全局单例
-mail_client = create_mail_client()
+# 全局单例，首次使用时才创建，查看帮助、操作数据库等命令不需要配置邮箱
+_clients: Dict[str, EmailClient] = {}
+_client_factories = {
+    "mail_client": create_mail_client,
+    # 发送邮箱服务器
+    "send_mail_client": create_send_mail_client,
+}
+
+
+def get_mail_client() -> EmailClient:
+    """读取邮件的客户端"""
+    return __getattr__("mail_client")
+
+
+def get_send_mail_client() -> EmailClient:
+    """回复邮件的客户端"""
+    return __getattr__("send_mail_client")
+
 
-# 发送邮箱服务器
-send_mail_client = create_send_mail_client()
+def __getattr__(name: str):
+    # 兼容 from core.client import mail_client 的写法
+    if name not in _client_factories:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if name not in _clients:
+        _clients[name] = _client_factories[name]()
+    return _clients[name]
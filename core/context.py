@@ -1,5 +1,10 @@
 from datetime import datetime
 
+from core.metrics import metrics
+
+HOLD_REASON = "hold邮件，跳过"
+PRICE_FAILED_REASON = "报价失败，跳过邮件"
+
 
 class AbnormalMailContext:
     """异常邮件对象"""
@@ -26,15 +31,17 @@ class AbnormalMailContext:
                 "created_time": created_time,
             }
         )
+        metrics.skipped.inc(reason=reason)
         print(f"{reason}: {subject} 来自：【{sent_addr}】")
 
     def skip_hold_email(
         self, subject: str, sent_addr: str, sent_time: datetime, reason: str = ""
     ) -> None:
+        metrics.skipped.inc(reason=HOLD_REASON)
         self.hold_email.append(
             {
                 "subject": subject,
-                "reason": "hold邮件，跳过",
+                "reason": HOLD_REASON,
                 "sent_addr": sent_addr,
                 "sent_time": sent_time,
             }
@@ -1,105 +1,194 @@
 from datetime import datetime
+from typing import Any, Dict, List, Set, Tuple
 
-import xlwings as xw
-
+from core.backend import WorkbookBackend
+from core.backend.base import format_address
 from core.context import mail_context
+from core.parser import get_mail_hash
+from core.transaction import save_workbook
+from core.layout import (
+    FIRST_QUOTE_COLUMN,
+    ensure_page,
+    list_pages,
+    quote_columns,
+    quote_position,
+    reset_pages,
+)
 from core.utils import (
-    calc_next_letter,
     col_index_to_letter,
+    col_letter_to_index,
     find_position_in_column,
     print_banner,
+    read_row_values,
 )
 from db.models import MailState
 from processor.mapping import get_sheet_handler
 
 
+def _group_runs(indexes: List[int]) -> List[Tuple[int, int]]:
+    """把递增的列号合并为连续区间 [(起, 止)]"""
+    runs: List[Tuple[int, int]] = []
+    for index in indexes:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1] = (runs[-1][0], index)
+        else:
+            runs.append((index, index))
+    return runs
+
+
 class ExcelHandler:
     """
     Excel 公共样式处理类
     """
 
-    def clear_sheet_columns(self, wb: xw.Book, sheet_name: str) -> None:
-        """首次处理时，清空对应表格的列"""
-        sheet = wb.sheets[sheet_name]
-        sheet.range("C:Z").delete()  # 清除值、格式、批注等
-        wb.save()
+    def clear_sheet_columns(self, wb: WorkbookBackend, sheet_name: str) -> None:
+        """首次处理时，清空对应表格的报价列，并删除分页 Sheet"""
+        reset_pages(wb, sheet_name)
+        save_workbook(wb)
 
     def copy_sheet_columns(
-        self, wb: xw.Book, sheet_name: str, sheet_copy_count: int
+        self, wb: WorkbookBackend, sheet_name: str, sheet_copy_count: int
+    ) -> Tuple[str, str]:
+        """
+        复制模板列到第 sheet_copy_count 个报价所在的列，当前页写满时创建分页 Sheet
+
+        :return: (Sheet 名称, 列字母)
+        """
+        return self.allocate_sheet_columns(wb, sheet_name, sheet_copy_count, 1)[0]
+
+    def allocate_sheet_columns(
+        self, wb: WorkbookBackend, sheet_name: str, start: int, count: int
+    ) -> List[Tuple[str, str]]:
+        """
+        为第 start 个起的 count 个报价预分配列
+
+        :return: 每个报价的 (Sheet 名称, 列字母)
+        """
+        positions = [quote_position(sheet_name, start + i) for i in range(count)]
+        self.copy_template_columns(wb, positions)
+        return positions
+
+    def copy_template_columns(
+        self, wb: WorkbookBackend, positions: List[Tuple[str, str]]
     ) -> None:
-        """复制工作表的列"""
-        sheet = wb.sheets[sheet_name]
-        letter = calc_next_letter("C", sheet_copy_count)
+        """每页只复制一次，把 B 列模板平铺到该页所有目标列，positions 在每页内需连续"""
+        pages: Dict[str, List[str]] = {}
+        for page_sheet, letter in positions:
+            pages.setdefault(page_sheet, []).append(letter)
 
-        wb.app.enable_events = False  # 禁用VBA事件
-        wb.app.display_alerts = False  # 禁用Excel自身的警告弹窗
         try:
-            # 从 B 列复制一百行
-            sheet.range("B1:B100").api.Copy(
-                Destination=sheet.range(f"{letter}1:{letter}100").api
+            for page_sheet, letters in pages.items():
+                ensure_page(wb, page_sheet)
+                # 从 B 列复制一百行
+                wb.copy_range(page_sheet, "B1:B100", f"{letters[0]}1:{letters[-1]}100")
+        finally:
+            save_workbook(wb)
+
+    def prune_sheet_columns(
+        self, wb: WorkbookBackend, sheet_name: str, keep_hashes: Set[str]
+    ) -> Tuple[Set[str], Dict[str, int]]:
+        """
+        增量刷新：删除邮件标记不在 keep_hashes 中的报价列（已处理、已拒绝或空列），
+        保留仍待处理的列及业务人员填写的内容
+
+        :return: (保留的邮件哈希, 各页剩余的报价列数)
+        """
+        _, columns = self._read_confirm_rows(wb, sheet_name)
+
+        kept: Set[str] = set()
+        page_columns: Dict[str, List[Tuple[int, bool]]] = {
+            page_sheet: [] for page_sheet in list_pages(wb, sheet_name)
+        }
+        for page_sheet, col, _, mail_hash in columns:
+            keep = (
+                bool(mail_hash) and mail_hash in keep_hashes and mail_hash not in kept
             )
-            sheet.api.Application.CutCopyMode = False  # 清除 复制模式 的虚线框
+            if keep:
+                kept.add(mail_hash)
+            page_columns[page_sheet].append((col_letter_to_index(col), keep))
+
+        page_counts = {}
+        for page_sheet, items in page_columns.items():
+            # 从右往左删除，连续的列合并为一次删除
+            drop = [index for index, keep in items if not keep]
+            for first, last in reversed(_group_runs(drop)):
+                wb.delete_columns(
+                    page_sheet,
+                    f"{col_index_to_letter(first)}:{col_index_to_letter(last)}",
+                )
+            page_counts[page_sheet] = len(items) - len(drop)
+
+        save_workbook(wb)
+        return kept, page_counts
 
-        finally:
-            # 无论代码是否出错，都确保这些设置被恢复，否则会影响后续的Excel操作
-            wb.app.enable_events = True
-            wb.app.display_alerts = True
-            sheet.api.Application.CutCopyMode = True
-            wb.save()
+    @classmethod
+    def read_priced_columns(
+        cls, wb: WorkbookBackend, mails: List[Tuple[Any, Tuple[str, str]]], quote_dict
+    ) -> Dict[str, Tuple[Dict[str, Any], Any]]:
+        """
+        读取已报价列的交易日、T、VOL 和无风险利率，与报价值一起组成定价结果
+
+        :param mails: (邮件, (Sheet 名称, 列字母)) 列表
+        :param quote_dict: {邮件哈希: 报价值}
+        :return: {邮件哈希: ({"days": .., "T": .., "vol": .., "r": ..}, 报价值)}
+        """
+        sheet_letters: Dict[str, List[str]] = {}
+        for _, (sheet_name, letter) in mails:
+            sheet_letters.setdefault(sheet_name, []).append(letter)
+
+        market: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for sheet_name, letters in sheet_letters.items():
+            other_dict = get_sheet_handler(sheet_name).other_dict
+            for name, key in (
+                ("days", "交易日"),
+                ("T", "T"),
+                ("vol", "VOL"),
+                ("r", "无风险利率"),
+            ):
+                values = read_row_values(wb, sheet_name, int(other_dict[key]), letters)
+                for letter, value in values.items():
+                    market.setdefault((sheet_name, letter), {})[name] = value
+
+        return {
+            get_mail_hash(mail): (
+                market.get(position, {}),
+                quote_dict.get(get_mail_hash(mail)),
+            )
+            for mail, position in mails
+        }
 
-    def ensure_sheet_exists(self, wb: xw.Book, sheet_name: str):
+    def ensure_sheet_exists(self, wb: WorkbookBackend, sheet_name: str) -> str:
         """确保 sheet_name Sheet 存在，如果不存在就创建"""
-        if sheet_name not in [s.name for s in wb.sheets]:  # type: ignore
-            sheet = wb.sheets.add(name=sheet_name, before="8080结构")  # type: ignore
-            self._init_sheet_header(sheet)
-        else:
-            sheet = wb.sheets[sheet_name]  # type: ignore
-        return sheet
+        if sheet_name not in wb.sheet_names():
+            wb.add_sheet(sheet_name, before="8080结构")
+            self._init_sheet_header(wb, sheet_name)
+        return sheet_name
 
-    def _init_sheet_header(self, sheet: xw.Sheet):
+    def _init_sheet_header(self, wb: WorkbookBackend, sheet_name: str):
         """设置Sheet 表头和样式"""
-        if "失败" in sheet.name:
-            sheet.range("A1").value = "邮件主题"
-            sheet.range("B1").value = "失败原因"
-            sheet.range("C1").value = "发件人"
-            sheet.range("D1").value = "询价时间"
-            sheet.range("E1").value = "报价时间"
-            # 表格颜色
-            sheet.api.Tab.Color = 255  # 红色
-        elif "成功" in sheet.name:
-            sheet.range("A1").value = "邮件主题"
-            sheet.range("B1").value = "发件人"
-            sheet.range("C1").value = "询价时间"
-            sheet.range("D1").value = "报价时间"
-            # 表格颜色
-            sheet.api.Tab.Color = 65280  # 绿色
+        if "失败" in sheet_name:
+            header = ["邮件主题", "失败原因", "发件人", "询价时间", "报价时间"]
+            tab_color = 255  # 红色
+        elif "成功" in sheet_name:
+            header = ["邮件主题", "发件人", "询价时间", "报价时间"]
+            tab_color = 65280  # 绿色
         else:
-            sheet.range("A1").value = "邮件主题"
-            sheet.range("B1").value = "发件人"
-            sheet.range("C1").value = "询价时间"
-            sheet.range("D1").value = "报价时间"
-            sheet.api.Tab.Color = 65535  # 黄色
-
-        # 定位表头范围
-        header_range = sheet.range("A1").expand("right")
-        # 设置样式
-        header_range.api.Font.Bold = True  # 加粗
-        header_range.api.HorizontalAlignment = -4108  # 水平居中
-        header_range.api.VerticalAlignment = -4108  # 垂直居中
-        header_range.color = (192, 192, 192)  # 设置背景色
-        header_range.columns.autofit()
-        header_range.column_width = 80  # 表头宽度
-        header_range.row_height = 30  # 表头高度
-
-    def clear_sheet_content(self, sheet: xw.Sheet):
+            header = ["邮件主题", "发件人", "询价时间", "报价时间"]
+            tab_color = 65535  # 黄色
+
+        wb.set_value(sheet_name, "A1", header)
+
+        # 设置表头样式和表格颜色
+        wb.format_header(sheet_name, format_address(1, 1, 1, len(header)), tab_color)
+
+    def clear_sheet_content(self, wb: WorkbookBackend, sheet_name: str):
         """清空指定 Sheet 表头以下所有内容"""
-        used_range = sheet.used_range
-        if used_range.rows.count > 1:
+        last_row, last_col = wb.used_bounds(sheet_name)
+        if last_row > 1:
             # 清空 A2:最后一行最后一列
-            last_cell = used_range.end("down").end("right")
-            sheet.range(f"A2:{last_cell.address}").clear()
+            wb.clear_range(sheet_name, format_address(2, 1, last_row, last_col))
 
-    def write_abnormal_mails(self, sheet: xw.Sheet):
+    def write_abnormal_mails(self, wb: WorkbookBackend, sheet_name: str):
         """把上下文中的异常邮件批量写入 Sheet"""
         print_banner("开始写入当次报价失败的邮件数据...")
 
@@ -117,16 +206,17 @@ class ExcelHandler:
             for mail in mail_context.email
         ]
         # 从 A2 开始批量写值
-        sheet.range("A2").value = data
+        wb.set_value(sheet_name, "A2", data)
 
-    def write_today_successful_mails(self, sheet: xw.Sheet):
+    def write_today_successful_mails(self, wb: WorkbookBackend, sheet_name: str):
         print_banner("开始写入今日报价成功的邮件数据...")
 
         mail_state = MailState()
         result = mail_state.get_successful_mail_info()  # type: ignore
-        sheet.range("A2").value = result
+        if result:
+            wb.set_value(sheet_name, "A2", result)
 
-    def write_hold_mails(self, sheet: xw.Sheet):
+    def write_hold_mails(self, wb: WorkbookBackend, sheet_name: str):
         print_banner("开始写入当次hold价的邮件数据...")
 
         if not mail_context.hold_email:
@@ -142,83 +232,104 @@ class ExcelHandler:
             for mail in mail_context.hold_email
         ]
         # 从 A2 开始批量写值
-        sheet.range("A2").value = data
+        wb.set_value(sheet_name, "A2", data)
 
-    def process_abnormal_mails_sheet(self, wb: xw.Book):
+    def process_abnormal_mails_sheet(self, wb: WorkbookBackend):
         """处理异常邮件的 sheet"""
-        sheet = self.ensure_sheet_exists(wb, "今日失败报价")
-        self.clear_sheet_content(sheet)
-        self.write_abnormal_mails(sheet)
-        wb.save()
+        sheet_name = self.ensure_sheet_exists(wb, "今日失败报价")
+        self.clear_sheet_content(wb, sheet_name)
+        self.write_abnormal_mails(wb, sheet_name)
+        save_workbook(wb)
 
-    def process_successful_mails_sheet(self, wb: xw.Book):
+    def process_successful_mails_sheet(self, wb: WorkbookBackend):
         """数据库查询出今日成功报价的数据，写入Excel"""
-        sheet = self.ensure_sheet_exists(wb, "今日成功报价")
-        self.clear_sheet_content(sheet)
-        self.write_today_successful_mails(sheet)
-        wb.save()
+        sheet_name = self.ensure_sheet_exists(wb, "今日成功报价")
+        self.clear_sheet_content(wb, sheet_name)
+        self.write_today_successful_mails(wb, sheet_name)
+        save_workbook(wb)
 
-    def process_hold_mails_sheet(self, wb: xw.Book):
+    def process_hold_mails_sheet(self, wb: WorkbookBackend):
         """当次运行的hold邮件写入Excel"""
-        sheet = self.ensure_sheet_exists(wb, "hold价邮件")
-        self.clear_sheet_content(sheet)
-        self.write_hold_mails(sheet)
-        wb.save()
+        sheet_name = self.ensure_sheet_exists(wb, "hold价邮件")
+        self.clear_sheet_content(wb, sheet_name)
+        self.write_hold_mails(wb, sheet_name)
+        save_workbook(wb)
 
     @classmethod
-    def get_confirmed_mail_hash_and_price(cls, sheet: xw.Sheet):
-        """查询确认报价的邮件哈希值和报价值"""
+    def _read_confirm_rows(cls, wb: WorkbookBackend, sheet_name: str, *rows):
+        """
+        读取产品 Sheet 及所有分页 Sheet 中，确认行及其上一行（邮件标记）在报价列的值，
+        以及 rows 指定的其他行
+
+        :return: (确认行, [(Sheet 名称, 列字母, 确认值, 邮件哈希, *其他行的值)])，
+                 未找到确认行时返回 (None, [])
+        """
         value = "是否可以回复报价邮件（是/否/[空]忽略）"
-        row, _ = find_position_in_column(sheet, value, "A")
+        row, _ = find_position_in_column(wb, sheet_name, value, "A")
         if not row:
-            return
+            return None, []
+
+        columns = []
+        # 分页 Sheet 由产品 Sheet 复制而来，行结构相同
+        for page_sheet in list_pages(wb, sheet_name):
+            address = quote_columns(wb, page_sheet)
+            if not address:
+                continue
+            first, last = address.split(":")
+
+            def read_row(r):
+                values = wb.get_value(page_sheet, f"{first}{r}:{last}{r}")
+                return values if isinstance(values, list) else [values]
+
+            confirm_values = read_row(row)
+            hash_values = read_row(row - 1)
+            other_values = [read_row(r) for r in rows]
+
+            for index, confirm in enumerate(confirm_values):
+                col = col_index_to_letter(index + FIRST_QUOTE_COLUMN)
+                extra = [values[index] for values in other_values]
+                columns.append((page_sheet, col, confirm, hash_values[index], *extra))
+        return row, columns
 
-        handler = get_sheet_handler(sheet_name=sheet.name)
+    @classmethod
+    def get_confirmed_mail_hash_and_price(cls, wb: WorkbookBackend, sheet_name: str):
+        """查询确认报价的邮件哈希值和报价值"""
+        handler = get_sheet_handler(sheet_name=sheet_name)
         quote_line = handler.quote_line
 
-        cell_range = sheet.range(f"C{row}:Z{row}")
+        row, columns = cls._read_confirm_rows(wb, sheet_name, quote_line)
+        if not row:
+            return
+
         _dict = {}
-        for cell in cell_range:
-            if str(cell.value).strip() == "是":
-                col = col_index_to_letter(cell.column)
-                target = f"{col}{row - 1}"
-                _dict[sheet.range(target).value] = sheet.range(
-                    f"{col}{quote_line}"
-                ).value
+        for _, _, confirm, mail_hash, quote_value in columns:
+            if str(confirm).strip() == "是":
+                _dict[mail_hash] = quote_value
 
         return _dict
 
     @classmethod
-    def get_draft_mail_hash(cls, sheet: xw.Sheet):
-        value = "是否可以回复报价邮件（是/否/[空]忽略）"
-        row, _ = find_position_in_column(sheet, value, "A")
+    def get_draft_mail_hash(cls, wb: WorkbookBackend, sheet_name: str):
+        row, columns = cls._read_confirm_rows(wb, sheet_name)
         if not row:
             return
 
-        cell_range = sheet.range(f"C{row}:Z{row}")
         hash_list = []
-        for cell in cell_range:
-            if not str(cell.value).strip():
-                col = col_index_to_letter(cell.column)
-                target = f"{col}{row - 1}"
-                hash_list.append(sheet.range(f"{col}{target}").value)
+        for _, _, confirm, mail_hash in columns:
+            if mail_hash and (confirm is None or not str(confirm).strip()):
+                hash_list.append(mail_hash)
 
         return hash_list
 
     @classmethod
-    def get_reject_mail_hash(cls, sheet: xw.Sheet):
-        value = "是否可以回复报价邮件（是/否/[空]忽略）"
-        row, _ = find_position_in_column(sheet, value, "A")
+    def get_reject_mail_hash(cls, wb: WorkbookBackend, sheet_name: str):
+        row, columns = cls._read_confirm_rows(wb, sheet_name)
         if not row:
             return
 
-        cell_range = sheet.range(f"C{row}:Z{row}")
         hash_list = []
-        for cell in cell_range:
-            if str(cell.value).strip() == "否":
-                col = col_index_to_letter(cell.column)
-                target = f"{col}{row - 1}"
-                hash_list.append(sheet.range(target).value)
+        for _, _, confirm, mail_hash in columns:
+            if str(confirm).strip() == "否":
+                hash_list.append(mail_hash)
 
-        # print(_dict)
         return hash_list
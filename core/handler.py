@@ -1,66 +1,106 @@
+import os
 from collections import defaultdict
 from datetime import date, datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple
 
-import xlwings as xw
-
-from core.client import mail_client
+from core.backend import WorkbookBackend
+from core.client import get_mail_client
 from core.context import mail_context
 from core.excel import ExcelHandler
+from core.layout import free_positions
+from core.market import get_market_snapshot, load_market_snapshot
+from core.metrics import metrics
+from core.parser import get_mail_hash
+from core.profiling import timed
+from core.quote_cache import get_quote_cache, quote_key
 from core.schemas import EachMail
+from core.shard import check_workers, get_worker_count, price_sharded
+from core.timings import timing_recorder
+from core.trading_calendar import (
+    get_trading_calendar,
+    load_trading_calendar,
+    require_trading_calendar,
+)
+from core.transaction import workbook_transaction
 from core.utils import print_banner
+from core.workbook_calls import workbook_calls
 from db.enums import MailStateEnum
 from db.models import MailState
+from processor.base import get_pricing_engine
 from processor.registry import get_processor, subject_sheet_map
 
 
 class MailHandler:
-    def __init__(self, folder: str = "INBOX", since_date: date = date.today()) -> None:
+    def __init__(
+        self,
+        folder: str = "INBOX",
+        since_date: date = date.today(),
+        pricing_engine: Optional[str] = None,
+        incremental: Optional[bool] = None,
+        workers: Optional[int] = None,
+    ) -> None:
         self.folder = folder
         self.since_date = since_date
+        # 报价引擎，未指定时读取环境变量 QUOTE_ENGINE
+        self.pricing_engine = pricing_engine or get_pricing_engine()
+        # 增量刷新工作簿，未指定时读取环境变量 QUOTE_INCREMENTAL
+        if incremental is None:
+            incremental = os.getenv("QUOTE_INCREMENTAL", "").lower() in ("1", "true")
+        self.incremental = incremental
+        # 并行定价的进程数，大于 1 时按客户和产品分片，需要 headless 工作簿文件和 native 引擎
+        self.workers = workers or get_worker_count()
+        check_workers(self.pricing_engine, self.workers)
 
-    def handle(self, wb: xw.Book) -> None:
-        # 读取邮件并获取结果字典
-        result_dict = mail_client.read_mail(
-            folder=self.folder, since_date=self.since_date
-        )
+    def handle(
+        self,
+        wb: WorkbookBackend,
+        result_dict: Optional[Dict[str, List[EachMail]]] = None,
+    ) -> None:
+        """
+        处理邮件并写入工作簿
 
-        # 过滤不可报价结果字典
-        filter_dict = self.filter_unquotable_result_dict(result_dict)
+        :param wb: 工作簿后端对象
+        :param result_dict: 已读取的邮件，为空时从邮箱读取
+        """
+        # 每次运行开始时刷新行情快照和交易日历，运行期间不再读取标的价格和交易日历 Sheet
+        with workbook_calls.stage("snapshot"):
+            load_market_snapshot(wb)
+            load_trading_calendar(wb)
+            require_trading_calendar(self.pricing_engine, wb)
 
-        # 处理未报价邮件并回复
-        excel_handler = ExcelHandler()
+        # 事务内合并所有保存操作，结束时统一保存一次，保存由本次报价的邮件分摊
+        with workbook_calls.stage("quote"):
+            with workbook_transaction(wb):
+                quoted = self._handle(wb, result_dict)
+            workbook_calls.add_mails(quoted)
 
-        # 清空Sheet
-        sheet_names = subject_sheet_map.keys()
-        for _sheet_name in sheet_names:
-            excel_handler.clear_sheet_columns(wb, _sheet_name)
+        timing_recorder.mark_many(quoted, "written")
+        timing_recorder.flush()
 
-        for email_addr, result_list in filter_dict.items():
-            print_banner("开始处理可报价邮件......")
-            processor = get_processor(email_addr)  # 获取每个客户对应的邮件处理策略
+    def _handle(
+        self,
+        wb: WorkbookBackend,
+        result_dict: Optional[Dict[str, List[EachMail]]] = None,
+    ) -> List[str]:
+        # 读取邮件并获取结果字典
+        if result_dict is None:
+            result_dict = get_mail_client().read_mail(
+                folder=self.folder, since_date=self.since_date
+            )
 
-            sheet_name_count_dict = {_sheet_name: 0 for _sheet_name in sheet_names}
-            for mail in result_list:
-                print(f"处理邮件: {mail.subject} 来自: 【{email_addr}】")
+        # 过滤不可报价结果字典
+        filter_dict = self.filter_unquotable_result_dict(result_dict)
 
-                # 处理 Excel 对应 Sheet
-                excel_handler.copy_sheet_columns(
-                    wb, mail.sheet_name, sheet_name_count_dict[mail.sheet_name]
-                )
+        # 处理未报价邮件并写入工作簿
+        quoted = self.quote_mails(wb, filter_dict)
 
-                # 获取报价值，并写入待发送邮件内容中
-                processor.process_excel(
-                    mail, wb, sheet_name_count_dict[mail.sheet_name]
-                )
+        with workbook_calls.stage("report"):
+            self.write_report_sheets(wb)
 
-                # 写入数据库
-                try:
-                    MailState().create_record(mail)  # type: ignore
-                except Exception as e:
-                    print(f"写入数据库出错: {e}")
+        return quoted
 
-                sheet_name_count_dict[mail.sheet_name] += 1
+    def write_report_sheets(self, wb: WorkbookBackend) -> None:
+        excel_handler = ExcelHandler()
 
         # 写入当次报价异常邮件
         try:
@@ -80,6 +120,171 @@ class MailHandler:
         except Exception as e:
             print(f"写入今日成功报价报错：{e}")
 
+    def quote_mails(
+        self,
+        wb: WorkbookBackend,
+        result_dict: Dict[str, List[EachMail]],
+        create_record: bool = True,
+        keep_hashes: Optional[Set[str]] = None,
+    ) -> List[str]:
+        """
+        为所有待报价邮件分配报价列并报价
+
+        全量模式先清空产品 Sheet；增量模式保留仍待处理邮件的列，删除其他列，只为新邮件追加列。
+        分配好的列一次复制模板，之后逐封只写入询价要素
+        :param create_record: 是否把新报价的邮件写入数据库
+        :param keep_hashes: 增量模式下额外保留的列，如常驻进程中之前批次报价、尚未回复的邮件
+        :return: 本次报价的邮件哈希，工作簿保存后由调用方记录写入时间
+        """
+        excel_handler = ExcelHandler()
+
+        sheet_mails: Dict[str, List[EachMail]] = defaultdict(list)
+        for result_list in result_dict.values():
+            for mail in result_list:
+                sheet_mails[mail.sheet_name].append(mail)
+
+        # 为每封需要报价的邮件分配 (Sheet, 列)
+        positions: Dict[str, Tuple[str, str]] = {}
+        for _sheet_name in subject_sheet_map.keys():
+            mails = sheet_mails.get(_sheet_name, [])
+            if self.incremental:
+                hashes = {get_mail_hash(mail) for mail in mails} | (
+                    keep_hashes or set()
+                )
+                kept, page_counts = excel_handler.prune_sheet_columns(
+                    wb, _sheet_name, hashes
+                )
+            else:
+                excel_handler.clear_sheet_columns(wb, _sheet_name)
+                kept, page_counts = set(), {}
+
+            new_mails, seen = [], set(kept)
+            for mail in mails:
+                mail_hash = get_mail_hash(mail)
+                if mail_hash not in seen:
+                    seen.add(mail_hash)
+                    new_mails.append(mail)
+
+            sheet_positions = free_positions(_sheet_name, page_counts, len(new_mails))
+            excel_handler.copy_template_columns(wb, sheet_positions)
+            for mail, position in zip(new_mails, sheet_positions):
+                positions[get_mail_hash(mail)] = position
+
+            if self.incremental:
+                print(f"{_sheet_name}: 保留 {len(kept)} 列，新增 {len(new_mails)} 列")
+
+        batches = {}
+        for email_addr, result_list in result_dict.items():
+            batch = [
+                (mail, positions.pop(get_mail_hash(mail)))
+                for mail in result_list
+                if get_mail_hash(mail) in positions
+            ]
+            if batch:
+                batches[email_addr] = batch
+
+        # 询价要素相同的重复询价直接使用缓存的定价结果；excel 引擎的报价由工作簿公式重算得出，
+        # 缓存的结果无法省去重算，只有 native 引擎使用缓存
+        cache = get_quote_cache() if self.pricing_engine == "native" else None
+        priced, cache_keys = {}, {}
+        if cache is not None:
+            version = get_market_snapshot(wb).version
+            calendar = get_trading_calendar(wb)
+            calendar_version = calendar.version if calendar is not None else ""
+            for batch in batches.values():
+                for mail, _ in batch:
+                    key = quote_key(
+                        mail, version, self.pricing_engine, calendar_version
+                    )
+                    value = cache.get(key)
+                    if value is None:
+                        cache_keys[get_mail_hash(mail)] = key
+                    else:
+                        priced[get_mail_hash(mail)] = value
+
+        # 多进程时先在工作簿副本上并行定价，再把结果写回主工作簿
+        pending = {
+            email_addr: [item for item in batch if get_mail_hash(item[0]) not in priced]
+            for email_addr, batch in batches.items()
+        }
+        pending = {email_addr: batch for email_addr, batch in pending.items() if batch}
+        if self.workers > 1 and pending:
+            print_banner(f"使用 {self.workers} 个进程并行报价......")
+            shard_priced, failed = price_sharded(
+                wb, pending, self.pricing_engine, self.workers
+            )
+            priced.update(shard_priced)
+
+            # 子进程中报价失败的邮件在这里记录，不再报价，列不写入邮件标题和哈希值
+            for email_addr, batch in list(batches.items()):
+                for mail, _ in batch:
+                    if get_mail_hash(mail) in failed:
+                        self.skip(mail, failed[get_mail_hash(mail)])
+                batch = [item for item in batch if get_mail_hash(item[0]) not in failed]
+                if batch:
+                    batches[email_addr] = batch
+                else:
+                    del batches[email_addr]
+
+        # 批处理模式：所有邮件写入完成后统一重算，避免每次写入都触发重算
+        batch_mails = [mail for batch in batches.values() for mail, _ in batch]
+        with workbook_calls.stage("price", mails=batch_mails), wb.batch_mode():
+            for email_addr, batch in batches.items():
+                print_banner("开始处理可报价邮件......")
+                processor = get_processor(email_addr)  # 获取每个客户对应的邮件处理策略
+                for mail, _ in batch:
+                    print(f"处理邮件: {mail.subject} 来自: 【{email_addr}】")
+
+                # 获取报价值，已有定价结果（缓存或子进程）的邮件直接写入
+                misses = [
+                    item for item in batch if get_mail_hash(item[0]) not in priced
+                ]
+                hits = [item for item in batch if get_mail_hash(item[0]) in priced]
+                quoted = {get_mail_hash(mail) for mail, _ in hits}
+                if misses:
+                    quote_dict = processor.price_batch(misses, wb, self.pricing_engine)
+                    quoted.update(quote_dict)
+                    if cache is not None:
+                        priced.update(
+                            ExcelHandler.read_priced_columns(
+                                wb,
+                                [
+                                    item
+                                    for item in misses
+                                    if get_mail_hash(item[0]) in quote_dict
+                                ],
+                                quote_dict,
+                            )
+                        )
+                if hits:
+                    processor.write_priced_columns(hits, wb, priced)
+
+                # 报价失败的邮件已由处理器记录为异常邮件，不写入数据库，也不返回
+                batch = [item for item in batch if get_mail_hash(item[0]) in quoted]
+                batches[email_addr] = batch
+                timing_recorder.mark_many([mail for mail, _ in batch], "priced")
+                metrics.quoted.inc(len(batch))
+
+                if not create_record:
+                    continue
+
+                # 写入数据库
+                for mail, _ in batch:
+                    try:
+                        MailState().create_record(mail)  # type: ignore
+                    except Exception as e:
+                        print(f"写入数据库出错: {e}")
+
+        if cache is not None:
+            for mail_hash, key in cache_keys.items():
+                if mail_hash in priced:
+                    cache.put(key, priced[mail_hash])
+            cache.save()
+            print(cache.report())
+
+        return [get_mail_hash(mail) for batch in batches.values() for mail, _ in batch]
+
+    @timed("filter_unquotable_result_dict")
     def filter_unquotable_result_dict(
         self, result_dict: Dict[str, List[EachMail]]
     ) -> Dict[str, List[EachMail]]:
@@ -119,7 +324,9 @@ class MailHandler:
     def pull_quote_mails_to_db(self, since_date: date = date.today()):
         """获取报价邮件数据，存入数据库表中"""
 
-        result_dict = mail_client.read_mail(folder=self.folder, since_date=since_date)
+        result_dict = get_mail_client().read_mail(
+            folder=self.folder, since_date=since_date
+        )
         filter_dict = self.filter_unquotable_result_dict(result_dict)
 
         for _, result_list in filter_dict.items():
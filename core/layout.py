@@ -0,0 +1,141 @@
+import os
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from core.utils import col_index_to_letter
+
+if TYPE_CHECKING:
+    from core.backend import WorkbookBackend
+
+# 报价列从 C 列开始，A 列为标签，B 列为模板
+FIRST_QUOTE_COLUMN = 3
+TEMPLATE_COLUMN = "B"
+
+# 每页 Sheet 的默认报价列数，写满后续写到分页 Sheet（如 看涨阶梯-2）
+DEFAULT_PAGE_COLUMNS = 50
+
+_PAGE_PATTERN = re.compile(r"^(?P<base>.+)-(?P<page>\d+)$")
+
+
+def get_page_columns() -> int:
+    """从环境变量 QUOTE_PAGE_COLUMNS 读取每页报价列数"""
+    value = os.getenv("QUOTE_PAGE_COLUMNS")
+    page_columns = int(value) if value else DEFAULT_PAGE_COLUMNS
+    if page_columns < 1:
+        raise ValueError(f"QUOTE_PAGE_COLUMNS 必须为正整数: {value}")
+    return page_columns
+
+
+def page_sheet_name(sheet_name: str, page: int) -> str:
+    """第 1 页为产品 Sheet 本身，之后为 产品-页码"""
+    return sheet_name if page == 1 else f"{sheet_name}-{page}"
+
+
+def split_page(sheet_name: str) -> Tuple[str, int]:
+    """拆分 Sheet 名称，返回 (产品 Sheet, 页码)"""
+    match = _PAGE_PATTERN.match(sheet_name)
+    if match:
+        return match.group("base"), int(match.group("page"))
+    return sheet_name, 1
+
+
+def base_sheet_name(sheet_name: str) -> str:
+    """分页 Sheet 对应的产品 Sheet 名称"""
+    return split_page(sheet_name)[0]
+
+
+def quote_position(
+    sheet_name: str, index: int, page_columns: Optional[int] = None
+) -> Tuple[str, str]:
+    """
+    第 index 个报价（从 0 开始）所在的 (Sheet, 列字母)
+
+    :param sheet_name: 产品 Sheet 名称
+    :param page_columns: 每页报价列数，默认读取 QUOTE_PAGE_COLUMNS
+    """
+    page_columns = page_columns or get_page_columns()
+    page, offset = divmod(index, page_columns)
+    letter = col_index_to_letter(FIRST_QUOTE_COLUMN + offset)
+    return page_sheet_name(sheet_name, page + 1), letter
+
+
+def free_positions(
+    sheet_name: str,
+    page_counts: Dict[str, int],
+    count: int,
+    page_columns: Optional[int] = None,
+) -> List[Tuple[str, str]]:
+    """
+    在已有报价列之后分配 count 个空闲位置，先填满前面的页，再续写到新的分页
+
+    :param page_counts: 各页已占用的报价列数，已占用的列从 C 列开始连续
+    :return: 每个位置的 (Sheet 名称, 列字母)
+    """
+    page_columns = page_columns or get_page_columns()
+    positions: List[Tuple[str, str]] = []
+    page = 1
+    while len(positions) < count:
+        page_sheet = page_sheet_name(sheet_name, page)
+        used = page_counts.get(page_sheet, 0)
+        for offset in range(used, page_columns):
+            if len(positions) == count:
+                break
+            letter = col_index_to_letter(FIRST_QUOTE_COLUMN + offset)
+            positions.append((page_sheet, letter))
+        page += 1
+    return positions
+
+
+def list_pages(wb: "WorkbookBackend", sheet_name: str) -> List[str]:
+    """按页码顺序返回产品 Sheet 及其已存在的分页 Sheet"""
+    pages = []
+    for name in wb.sheet_names():
+        base, page = split_page(name)
+        if base == sheet_name:
+            pages.append((page, name))
+    return [name for _, name in sorted(pages)]
+
+
+def quote_columns(
+    wb: "WorkbookBackend", sheet_name: str, page_columns: Optional[int] = None
+) -> Optional[str]:
+    """
+    Sheet 中已使用的报价列的整列地址（如 "C:AZ"），没有报价列时返回 None
+
+    只包括每页分配的 page_columns 列以内，报价列右侧的其他内容不会被读取为报价列，也不会被删除
+    :param page_columns: 每页报价列数，默认读取 QUOTE_PAGE_COLUMNS
+    """
+    _, last_col = wb.used_bounds(sheet_name)
+    if last_col < FIRST_QUOTE_COLUMN:
+        return None
+    page_columns = page_columns or get_page_columns()
+    last_col = min(last_col, FIRST_QUOTE_COLUMN + page_columns - 1)
+    first = col_index_to_letter(FIRST_QUOTE_COLUMN)
+    return f"{first}:{col_index_to_letter(last_col)}"
+
+
+def ensure_page(wb: "WorkbookBackend", sheet_name: str) -> None:
+    """
+    分页 Sheet 不存在时，复制产品 Sheet（标签、模板列和格式）创建，并删除复制过来的报价列
+    """
+    if sheet_name in wb.sheet_names():
+        return
+
+    # 放在页码更小的最后一个分页之后
+    base, page = split_page(sheet_name)
+    after = [name for name in list_pages(wb, base) if split_page(name)[1] < page]
+    wb.copy_sheet(base, sheet_name, after=after[-1])
+    columns = quote_columns(wb, sheet_name)
+    if columns:
+        wb.delete_columns(sheet_name, columns)
+
+
+def reset_pages(wb: "WorkbookBackend", sheet_name: str) -> None:
+    """删除所有分页 Sheet，并清空产品 Sheet 的报价列"""
+    for name in list_pages(wb, sheet_name):
+        if name != sheet_name:
+            wb.delete_sheet(name)
+
+    columns = quote_columns(wb, sheet_name)
+    if columns:
+        wb.delete_columns(sheet_name, columns)  # 清除值、格式、批注等
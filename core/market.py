@@ -0,0 +1,173 @@
+import csv
+import hashlib
+import json
+import os
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from core.backend import WorkbookBackend
+
+MARKET_SHEET = "标的价格"
+
+# 标的分类及其在标的价格 Sheet 中的 VOL 行：伦敦金、上海金和其他
+UNDERLYING_CLASSES = ("IDC", "SGE", "OTHER")
+_CLASS_ROWS = {"IDC": 2, "SGE": 3, "OTHER": 4}
+
+
+def underlying_class(underlying: str) -> str:
+    """返回标的所属的分类"""
+    if underlying.endswith("IDC"):
+        return "IDC"
+    if underlying.startswith("AU") and underlying.endswith("SGE"):
+        return "SGE"
+    return "OTHER"
+
+
+def _coerce(value: Any) -> Any:
+    """文件中读取的数字字符串转为浮点数，与工作簿读取的值保持一致"""
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value.strip()
+    return value
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """
+    行情数据快照：期限阈值（年）和各标的分类对应的 VOL
+
+    version 由内容计算，数据不变时版本不变，可用于缓存键
+    """
+
+    thresholds: Tuple[float, ...]
+    rates: Dict[str, Tuple[Any, ...]]
+    source: str = ""
+    loaded_at: datetime = field(default_factory=datetime.now, compare=False)
+
+    @property
+    def version(self) -> str:
+        payload = json.dumps(self.to_dict(), sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+    def vol(self, underlying: str, value: float) -> Any:
+        """
+        返回期限 value 所在区间的 VOL，即第一个不小于 value 的阈值对应的值，
+        大于最大阈值时返回最后一个
+        """
+        rates = self.rates[underlying_class(underlying)]
+        index = bisect_left(self.thresholds, value)
+        return rates[min(index, len(rates) - 1)]
+
+    def to_dict(self) -> dict:
+        return {
+            "thresholds": list(self.thresholds),
+            "rates": {name: list(values) for name, values in self.rates.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, source: str = "") -> "MarketSnapshot":
+        thresholds = [float(value) for value in data["thresholds"]]
+        if thresholds != sorted(thresholds):
+            raise ValueError(f"期限阈值必须递增: {thresholds}")
+
+        rates = {}
+        for name in UNDERLYING_CLASSES:
+            values = tuple(_coerce(value) for value in data["rates"][name])
+            if len(values) != len(thresholds):
+                raise ValueError(f"{name} 的 VOL 数量与期限阈值数量不一致")
+            rates[name] = values
+        return cls(tuple(thresholds), rates, source)
+
+    @classmethod
+    def from_workbook(cls, wb: "WorkbookBackend") -> "MarketSnapshot":
+        """从标的价格 Sheet 的 E1:I4 一次读取"""
+        block = wb.get_value(MARKET_SHEET, "E1:I4")
+
+        # 去掉末尾的空阈值
+        columns = [i for i, value in enumerate(block[0]) if value is not None]
+        data = {
+            "thresholds": [block[0][i] for i in columns],
+            "rates": {
+                name: [block[row - 1][i] for i in columns]
+                for name, row in _CLASS_ROWS.items()
+            },
+        }
+        return cls.from_dict(data, source=f"{wb.name}:{MARKET_SHEET}")
+
+    @classmethod
+    def from_file(cls, path: str) -> "MarketSnapshot":
+        """
+        从 JSON 或 CSV 文件加载
+
+        JSON 格式与 to_dict 一致；CSV 首行为 class 和各期限阈值，之后每行一个标的分类
+        """
+        if path.lower().endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                return cls.from_dict(json.load(f), source=path)
+
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows: List[Sequence[str]] = [row for row in csv.reader(f) if row]
+        data = {
+            "thresholds": rows[0][1:],
+            "rates": {row[0].strip().upper(): row[1:] for row in rows[1:]},
+        }
+        return cls.from_dict(data, source=path)
+
+    def dump(self, path: str) -> None:
+        """保存为 JSON 或 CSV 文件，供 headless 运行时加载"""
+        if path.lower().endswith(".json"):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            return
+
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["class", *self.thresholds])
+            for name in UNDERLYING_CLASSES:
+                writer.writerow([name, *self.rates[name]])
+
+
+# 当前进程使用的行情快照，显式失效前不会重新读取
+_snapshot: Optional[MarketSnapshot] = None
+
+
+def load_market_snapshot(wb: Optional["WorkbookBackend"] = None) -> MarketSnapshot:
+    """
+    重新加载行情快照并缓存
+
+    配置了环境变量 MARKET_DATA_FILE 时从文件加载，否则从工作簿的标的价格 Sheet 读取
+    """
+    global _snapshot
+
+    path = os.getenv("MARKET_DATA_FILE")
+    if path:
+        _snapshot = MarketSnapshot.from_file(path)
+    elif wb is not None:
+        _snapshot = MarketSnapshot.from_workbook(wb)
+    else:
+        raise ValueError("未配置 MARKET_DATA_FILE，加载行情快照需要传入工作簿")
+    return _snapshot
+
+
+def get_market_snapshot(wb: Optional["WorkbookBackend"] = None) -> MarketSnapshot:
+    """返回缓存的行情快照，尚未加载时加载一次"""
+    if _snapshot is None:
+        return load_market_snapshot(wb)
+    return _snapshot
+
+
+def set_market_snapshot(snapshot: MarketSnapshot) -> None:
+    """直接使用给定的行情快照，如子进程沿用主进程加载的快照"""
+    global _snapshot
+    _snapshot = snapshot
+
+
+def invalidate_market_snapshot() -> None:
+    """使缓存的行情快照失效，下次使用时重新加载"""
+    global _snapshot
+    _snapshot = None
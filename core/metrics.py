@@ -0,0 +1,276 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Prometheus 文本格式 0.0.4，node_exporter textfile 采集器读取同样的格式
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 阶段耗时的桶（秒）：IMAP 读取和解析在毫秒级，Excel 计算和保存可能到数十秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """按标签值分别计数的指标，可在多个线程中更新"""
+
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("计数只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        # 没有标签的计数器从 0 开始输出，便于告警规则区分“没有流量”和“没有采集到”
+        if not self.labelnames and not values:
+            values[()] = 0
+        for key, value in sorted(values.items()):
+            labels = _format_labels(list(zip(self.labelnames, key)))
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数（不累计，最后一个为 +Inf）, 总和, 次数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            }
+        for key, (counts, total, count) in sorted(values.items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels([*labels, ("le", _format_value(bound))])
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序输出 Prometheus 文本格式"""
+
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if any(m.name == metric.name for m in self._metrics):
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "".join(metric.render() + "\n" for metric in self._metrics)
+
+    def reset(self) -> None:
+        for metric in self._metrics:
+            metric.reset()
+
+    def write_textfile(self, path: str) -> None:
+        """
+        写入文本文件供 node_exporter textfile 采集器读取
+
+        先写临时文件再替换，避免采集器读到写了一半的文件
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class QuoterMetrics(MetricsRegistry):
+    """报价流程的指标：各环节的邮件数和阶段耗时"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.fetched = self.counter("quoter_mails_fetched_total", "读取的询价邮件数")
+        self.skipped = self.counter(
+            "quoter_mails_skipped_total", "按原因统计跳过的邮件数", ["reason"]
+        )
+        self.quoted = self.counter("quoter_mails_quoted_total", "完成报价的邮件数")
+        self.confirmed = self.counter(
+            "quoter_mails_confirmed_total", "业务人员确认后开始回复的邮件数"
+        )
+        self.rejected = self.counter(
+            "quoter_mails_rejected_total", "业务人员拒绝报价的邮件数"
+        )
+        self.sent = self.counter("quoter_mails_sent_total", "回复成功的邮件数")
+        self.stage_seconds = self.histogram(
+            "quoter_stage_duration_seconds",
+            "各阶段耗时：fetch 读取单封邮件，parse 解析单封邮件，"
+            "price 一批报价，save 保存工作簿，send 发送单封回复",
+            ["stage"],
+        )
+
+    @contextmanager
+    def observe(self, stage: str) -> Iterator[None]:
+        """统计代码块耗时，也可作为函数装饰器"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started, stage=stage)
+
+
+metrics = QuoterMetrics()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+    """在后台线程中提供 /metrics，返回的服务器调用 shutdown() 停止"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:
+            # 采集器每隔几秒请求一次，不输出访问日志
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="quoter-metrics", daemon=True
+    )
+    thread.start()
+    return server
+
+
+def write_metrics_textfile(path: Optional[str] = None) -> Optional[str]:
+    """
+    把指标写入文本文件，单次运行的命令在结束时调用
+
+    :param path: 文件路径，默认读取环境变量 METRICS_TEXTFILE，都未配置时不写入
+    :return: 写入的文件路径
+    """
+    path = path or os.getenv("METRICS_TEXTFILE")
+    if not path:
+        return None
+    metrics.write_textfile(path)
+    return path
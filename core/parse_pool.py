@@ -0,0 +1,60 @@
+import atexit
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional
+
+from core.parser import ParsedMail, parse_mail_bytes
+
+
+def get_parse_worker_count() -> int:
+    """从环境变量 PARSE_WORKERS 读取解析邮件的进程数，默认 1（在读取邮件的线程中解析）"""
+    return max(int(os.getenv("PARSE_WORKERS") or 1), 1)
+
+
+class ParsePool:
+    """
+    在子进程中解析原始邮件：MIME 解码、HTML 表格读取和标的筛选
+
+    submit 立即返回，读取邮件的线程继续拉取下一封，解析与 IMAP 的网络 I/O 重叠，
+    积压较多时解析速度随进程数增加。子进程只返回 ParsedMail，由主进程组装为 EachMail
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(
+        self, msg_id, header_info: tuple, raw_email: bytes
+    ) -> "Future[ParsedMail]":
+        return self._executor.submit(parse_mail_bytes, msg_id, header_info, raw_email)
+
+    @staticmethod
+    def build(client, future: "Future[ParsedMail]", raw_email: bytes):
+        """等待解析结果并组装为 EachMail，不可报价时返回 None"""
+        return client.build_each_mail(future.result(), raw_email)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+# 按进程数共用的解析进程池，进程退出时关闭
+_pools: Dict[int, ParsePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_parse_pool(workers: Optional[int] = None) -> Optional[ParsePool]:
+    """
+    返回共用的解析进程池，首次调用时创建
+
+    :param workers: 进程数，默认读取 PARSE_WORKERS，不大于 1 时返回 None（不使用进程池）
+    """
+    workers = workers or get_parse_worker_count()
+    if workers <= 1:
+        return None
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ParsePool(workers)
+            atexit.register(pool.close)
+        return pool
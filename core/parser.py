@@ -1,13 +1,20 @@
-import base64
+import email
 import hashlib
+import os
+import re
 from datetime import datetime
 from email.header import decode_header
 from email.message import Message
 from email.utils import parseaddr, parsedate_to_datetime
-from typing import List, Optional, Tuple
-
-from bs4 import BeautifulSoup
-
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from core.attachments import (
+    AttachmentRef,
+    decoded_size,
+    remove_spilled,
+    spill_part,
+    spilled_paths,
+)
 from core.schemas import EachMail, MailContent
 
 
@@ -24,6 +31,20 @@ def get_mail_hash(mail: EachMail) -> str:
     return hash_obj.hexdigest()
 
 
+def split_header(raw_email: bytes) -> bytes:
+    """原始邮件的邮件头部分（含结尾的空行），没有正文时返回全部数据"""
+    for separator in (b"\r\n\r\n", b"\n\n"):
+        index = raw_email.find(separator)
+        if index != -1:
+            return raw_email[: index + len(separator)]
+    return raw_email
+
+
+def parse_headers(raw_email: bytes) -> Message:
+    """只解析邮件头，不解析和复制正文"""
+    return email.message_from_bytes(split_header(raw_email))
+
+
 def parse_mail_sent_time(msg: Message) -> Optional[datetime]:
     """
     解析邮件的发送时间，返回格式化后的字符串
@@ -45,6 +66,8 @@ def parse_html_to_dict(html: str) -> Optional[dict]:
     """
     解析邮件 HTML 的 table 内容，返回字典格式的数据
     """
+    from bs4 import BeautifulSoup
+
     try:
         soup = BeautifulSoup(html, "html.parser")
         table = soup.find("table")
@@ -74,8 +97,12 @@ def parse_multipart_content(msg: Message) -> MailContent:
     return extract_mail_content(msg)
 
 
-def extract_mail_content(msg: Message) -> MailContent:
-    """解析邮件内容"""
+def extract_mail_content(msg: Message, part_path: Tuple[int, ...] = ()) -> MailContent:
+    """
+    解析邮件内容
+
+    :param part_path: msg 在原始邮件 multipart 结构中的下标路径，用于记录附件位置
+    """
     plain = ""
     html = ""
     attachments = []
@@ -83,17 +110,17 @@ def extract_mail_content(msg: Message) -> MailContent:
 
     payload = msg.get_payload(decode=False)  # 获取邮件的内容部分
 
-    for part in payload:
+    for index, part in enumerate(payload):
         content_type = part.get_content_type()  # type: ignore
         if content_type == "text/plain":
             plain += decode_part(part)  # type: ignore
         elif content_type == "text/html":
             html += decode_part(part)  # type: ignore
         elif part.get_filename():  # type: ignore
-            attachments.extend(parse_attachments(part))  # type: ignore
+            attachments.extend(parse_attachments(part, (*part_path, index)))  # type: ignore
         # 嵌套的multipart
         elif content_type.startswith("multipart/"):
-            nested_multipart = extract_mail_content(part)  # type: ignore
+            nested_multipart = extract_mail_content(part, (*part_path, index))  # type: ignore
             nested.append(nested_multipart)
 
     return MailContent(plain, html, attachments, nested)
@@ -113,21 +140,26 @@ def decode_part(part: Message) -> str:
         return ""
 
 
-def parse_attachments(part: Message) -> list:
-    """解析附件内容"""
+def parse_attachments(part: Message, part_path: Tuple[int, ...] = ()) -> list:
+    """
+    记录附件的位置、大小和类型，不解码附件数据
+
+    设置了环境变量 ATTACHMENT_SPILL_DIR 时附件按块解码写入该目录，之后读取不再需要原始邮件
+    """
     attachments = []
     filename = part.get_filename()
     if filename:
-        content = part.get_payload(decode=True)
-        if content:
+        size = decoded_size(part)
+        if size:
+            spill_dir = os.getenv("ATTACHMENT_SPILL_DIR")
             attachments.append(
-                {
-                    "filename": filename,
-                    "content_type": part.get_content_type(),
-                    "size": len(content),
-                    # 使用 base64 编码附件内容
-                    "data": base64.b64encode(content).decode("ascii"),  # type: ignore
-                }
+                AttachmentRef(
+                    filename,
+                    part.get_content_type(),
+                    size,
+                    part_path,
+                    spill_part(part, filename, spill_dir) if spill_dir else None,
+                )
             )
     return attachments
 
@@ -197,3 +229,51 @@ def gen_cc(msg: Message, except_addresses: List[str]) -> str:
     cc.append(addr)
 
     return ",".join(cc)
+
+
+class ParsedMail(NamedTuple):
+    """
+    邮件正文的解析结果，只含可序列化的基本类型，可以在进程之间传递
+
+    skip_reason 不为空时邮件不可报价，content、df_dict 和 underlying 为空
+    """
+
+    msg_id: Any
+    header_info: tuple  # _is_valid_header_msg 返回的 (标题, 发件人, 发件人邮箱, 发送时间, Sheet 名称)
+    content: Optional[MailContent] = None
+    df_dict: Optional[dict] = None
+    underlying: Optional[str] = None
+    skip_reason: Optional[str] = None
+
+
+def parse_mail_message(msg_id, header_info: tuple, msg: Message) -> ParsedMail:
+    """解码邮件正文，读取 HTML 表格和挂钩标的"""
+    # 文本内容
+    content = parse_multipart_content(msg)
+
+    # HTML　表格的内容（字典类型）
+    df_dict = parse_html_to_dict(content.html)
+    if not df_dict:
+        # 跳过的邮件不会生成 EachMail，附件临时文件在这里删除
+        remove_spilled(spilled_paths(content))
+        return ParsedMail(msg_id, header_info, skip_reason="无可用表格内容，跳过邮件")
+
+    # 处理挂钩标的合约
+    underlying_asset = df_dict.get("挂钩标的合约")
+    if underlying_asset:
+        underlying_asset = (
+            re.findall(r"[（(](.*?)[）)]", underlying_asset)[0].replace(".", "").upper()
+        )
+
+    if not (underlying_asset.startswith("AU") or underlying_asset.startswith("XAU")):
+        remove_spilled(spilled_paths(content))
+        return ParsedMail(
+            msg_id, header_info, skip_reason="非 AU 或 XAU 开头的标的合约，暂时跳过"
+        )
+
+    return ParsedMail(msg_id, header_info, content, df_dict, underlying_asset)
+
+
+def parse_mail_bytes(msg_id, header_info: tuple, raw_email: bytes) -> ParsedMail:
+    """从原始邮件数据解析，供解析进程池调用"""
+    return parse_mail_message(msg_id, header_info, email.message_from_bytes(raw_email))
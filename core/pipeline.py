@@ -0,0 +1,473 @@
+import imaplib
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from core.context import PRICE_FAILED_REASON
+from core.excel import ExcelHandler
+from core.handler import MailHandler
+from core.market import load_market_snapshot
+from core.metrics import metrics
+from core.parse_pool import ParsePool
+from core.parser import get_mail_hash
+from core.timings import timing_recorder
+from core.trading_calendar import load_trading_calendar, require_trading_calendar
+from core.transaction import workbook_transaction
+from core.watcher import ConfirmationWatcher
+from db.models import MailState
+from processor.registry import subject_sheet_map
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from core.backend import WorkbookBackend
+    from core.client import EmailClient
+
+# 原始邮件：(邮件编号, 邮件头信息, 原始邮件数据)
+RawMail = Tuple[Any, tuple, bytes]
+
+# 阶段之间传递的结束标记，收到后处理完手头的数据并传给下一阶段
+_STOP = object()
+
+
+class ImapSource:
+    """
+    保持 IMAP 连接的邮件来源，每次轮询只读取之前未读取过的邮件，连接断开时重连一次
+    """
+
+    def __init__(self, client: "EmailClient", folder: str = "银行询价") -> None:
+        self.client = client
+        self.folder = folder
+        self._imap: Optional[imaplib.IMAP4] = None
+        self._seen: Set[bytes] = set()
+
+    def _connect(self) -> imaplib.IMAP4:
+        from imapclient.imap_utf7 import encode as encode_folder_name
+
+        if self._imap is None:
+            self._imap = self.client.connect("imap")
+            self._imap.select(encode_folder_name(self.folder))  # type: ignore
+        return self._imap
+
+    def poll(self) -> Iterator[RawMail]:
+        for attempt in range(2):
+            try:
+                mail_client = self._connect()
+                mail_client.noop()  # 刷新邮箱状态
+                message_ids = self.client.search_mail_ids(mail_client, date.today())
+                break
+            except (imaplib.IMAP4.abort, OSError):
+                self._imap = None
+                if attempt:
+                    raise
+        if not message_ids:
+            return
+
+        for msg_id in message_ids:
+            if msg_id in self._seen:
+                continue
+            self._seen.add(msg_id)
+            fetched = self.client.fetch_raw_mail(mail_client, msg_id)
+            if fetched:
+                yield (msg_id, *fetched)
+
+    def close(self) -> None:
+        if self._imap is not None:
+            try:
+                self._imap.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+            self._imap = None
+
+
+class Stage(threading.Thread):
+    """
+    流水线中的一个阶段：从 inbox 取出数据交给 handle，把返回的结果放入 outbox
+
+    队列有容量上限，下游处理不过来时 put 阻塞，上游随之放慢（背压）
+    """
+
+    def __init__(
+        self,
+        name: str,
+        inbox: "queue.Queue",
+        outbox: Optional["queue.Queue"],
+        handle: Callable[[Any], Iterable[Any]],
+    ) -> None:
+        super().__init__(name=f"quoter-{name}", daemon=True)
+        self.stage_name = name
+        self.inbox = inbox
+        self.outbox = outbox
+        self.handle = handle
+        self.processed = 0
+        self.failed = 0
+
+    def run(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                if self.outbox is not None:
+                    self.outbox.put(_STOP)
+                return
+
+            try:
+                for result in self.handle(item) or ():
+                    if self.outbox is not None:
+                        self.outbox.put(result)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"{self.stage_name} 阶段处理失败：{e}")
+
+
+class Pipeline:
+    """
+    常驻报价流水线：fetch → parse → filter → price → persist → confirm/reply
+
+    - fetch: 保持 IMAP 连接，按间隔读取新邮件
+    - parse: 解析原始邮件为 EachMail，可交给解析进程池（PARSE_WORKERS）并行解析
+    - filter: 按邮件哈希去重，过滤不可报价和已处理的邮件
+    - price: 工作簿线程，攒批后增量报价，工作簿只在这个线程中打开和读写
+    - persist: 写入数据库
+    - confirm/reply: 工作簿线程在报价间隙轮询确认行，已确认且已写入数据库的邮件立即回复
+
+    停止时不再读取新邮件，已读取的邮件依次走完各阶段后退出
+    """
+
+    def __init__(
+        self,
+        source,
+        parser: "EmailClient",
+        open_wb: Callable[[], "WorkbookBackend"],
+        sender=None,
+        queue_size: int = 100,
+        batch_size: int = 50,
+        batch_window: float = 0.5,
+        fetch_interval: float = 10.0,
+        watch_interval: float = 2.0,
+        debounce: float = 1.0,
+        pricing_engine: Optional[str] = None,
+        parse_pool: Optional[ParsePool] = None,
+    ) -> None:
+        self.source = source
+        self.parser = parser
+        self.open_wb = open_wb
+        self.sender = sender
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.fetch_interval = fetch_interval
+        self.watch_interval = watch_interval
+        self.debounce = debounce
+        self.handler = MailHandler(pricing_engine=pricing_engine, incremental=True)
+        # 解析进程池，读取邮件后立即提交解析，parse 阶段按顺序取回结果
+        self.parse_pool = parse_pool
+
+        self.queues: Dict[str, "queue.Queue"] = {
+            name: queue.Queue(maxsize=queue_size)
+            for name in ("parse", "filter", "price", "persist")
+        }
+        # 在工作簿线程中执行的任务，如模拟业务人员确认
+        self._tasks: "queue.Queue[Callable[[WorkbookBackend], Any]]" = queue.Queue()
+        self._stop = threading.Event()
+
+        # 已去重的邮件哈希、已写入数据库的邮件哈希和已报价尚未回复的邮件哈希
+        self._seen: Set[str] = set()
+        self.persisted: Set[str] = set()
+        self.open_hashes: Set[str] = set()
+
+        self.fetched = 0
+        self.quoted = 0
+        self.price_failed = 0
+        self.sent = 0
+        self.watcher: Optional[ConfirmationWatcher] = None
+        # 工作簿线程异常退出的原因，此时不再报价和回复
+        self.error: Optional[Exception] = None
+
+        self.stages = [
+            Stage("parse", self.queues["parse"], self.queues["filter"], self._parse),
+            Stage("filter", self.queues["filter"], self.queues["price"], self._filter),
+            Stage("persist", self.queues["persist"], None, self._persist),
+        ]
+        self._threads = [
+            threading.Thread(target=self._fetch_loop, name="quoter-fetch", daemon=True),
+            threading.Thread(
+                target=self._workbook_loop, name="quoter-workbook", daemon=True
+            ),
+        ]
+
+    # ---------------------------------------------------------------------------------
+    # 各阶段
+    # ---------------------------------------------------------------------------------
+
+    def _fetch_loop(self) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    for raw_mail in self.source.poll():
+                        future = (
+                            self.parse_pool.submit(*raw_mail)
+                            if self.parse_pool is not None
+                            else None
+                        )
+                        self.queues["parse"].put((time.time(), raw_mail, future))
+                        self.fetched += 1
+                        metrics.fetched.inc()
+                        if self._stop.is_set():
+                            break
+                except Exception as e:
+                    print(f"读取邮件失败：{e}")
+                self._stop.wait(self.fetch_interval)
+        finally:
+            self.source.close()
+            self.queues["parse"].put(_STOP)
+
+    def _parse(self, item: Tuple[float, RawMail, Optional["Future"]]):
+        fetched_at, raw_mail, future = item
+        if future is None:
+            each_mail = self.parser.parse_raw_mail(*raw_mail)
+        else:
+            each_mail = self.parse_pool.build(self.parser, future, raw_mail[2])
+        if not each_mail:
+            return []
+        timing_recorder.mark_parsed(each_mail, fetched_at)
+        return [each_mail]
+
+    def _filter(self, each_mail):
+        mail_hash = get_mail_hash(each_mail)
+        if mail_hash in self._seen:
+            return []
+
+        filtered = self.handler.filter_unquotable_result_dict(
+            {each_mail.from_addr: [each_mail]}
+        )
+        if not filtered:
+            return []
+        self._seen.add(mail_hash)
+        return [each_mail]
+
+    def _persist(self, each_mail):
+        MailState().create_record(each_mail)
+        self.persisted.add(get_mail_hash(each_mail))
+        return []
+
+    def _take_batch(self) -> Tuple[list, bool]:
+        """
+        从报价队列取出一批邮件：最多等待 watch_interval 秒，取到第一封后再攒 batch_window 秒
+
+        :return: (邮件列表, 是否收到结束标记)
+        """
+        inbox = self.queues["price"]
+        try:
+            item = inbox.get(timeout=self.watch_interval)
+        except queue.Empty:
+            return [], False
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = inbox.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _price(self, wb: "WorkbookBackend", batch: list) -> list:
+        """报价一批邮件，返回报价成功的邮件"""
+        # 行情可能在盘中更新，每批报价前刷新行情快照
+        load_market_snapshot(wb)
+
+        # 已被业务人员拒绝的列不再保留
+        for sheet_name in subject_sheet_map:
+            self.open_hashes -= set(
+                ExcelHandler.get_reject_mail_hash(wb, sheet_name) or []
+            )
+
+        result_dict = defaultdict(list)
+        for each_mail in batch:
+            result_dict[each_mail.from_addr].append(each_mail)
+
+        quoted = set(
+            self.handler.quote_mails(
+                wb, result_dict, create_record=False, keep_hashes=self.open_hashes
+            )
+        )
+        # 报价失败的邮件已记录为异常邮件，不保留列，也不入库
+        batch = [each_mail for each_mail in batch if get_mail_hash(each_mail) in quoted]
+        for each_mail in batch:
+            self.open_hashes.add(get_mail_hash(each_mail))
+            self.queues["persist"].put(each_mail)
+        self.quoted += len(batch)
+        return batch
+
+    def _price_guarded(self, wb: "WorkbookBackend", batch: list) -> list:
+        """
+        报价一批邮件，失败时逐封重试，仍然失败的邮件记为异常邮件，不再报价和入库
+
+        失败邮件的列不在保留集合中，下一批报价时被删除
+        :return: 报价成功的邮件
+        """
+        try:
+            return self._price(wb, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self._quarantine(batch[0], e)
+                return []
+            print(f"批量报价失败，逐封重试：{e}")
+
+        quoted = []
+        for each_mail in batch:
+            try:
+                quoted.extend(self._price(wb, [each_mail]))
+            except Exception as e:
+                self._quarantine(each_mail, e)
+        return quoted
+
+    def _quarantine(self, each_mail, error: Exception) -> None:
+        self.price_failed += 1
+        print(f"报价失败：{error}")
+        self.handler.skip(each_mail, PRICE_FAILED_REASON)
+
+    def _workbook_loop(self) -> None:
+        try:
+            self._run_workbook()
+        except Exception as e:
+            # 工作簿线程退出后无法继续报价，停止读取新邮件，由 is_alive 报告给调用方
+            self.error = e
+            print(f"工作簿线程异常退出：{e}")
+            self._stop.set()
+
+    def _run_workbook(self) -> None:
+        # 之前运行（如 mail proc）报价、尚未处理的列继续保留，已确认的可以直接回复
+        pending = MailState().get_unprocessed_hashes()
+        self.open_hashes |= pending
+        self.persisted |= pending
+        print(f"保留 {len(pending)} 封未处理邮件的报价列")
+
+        wb = self.open_wb()
+        try:
+            load_trading_calendar(wb)
+            require_trading_calendar(self.handler.pricing_engine, wb)
+            self.watcher = ConfirmationWatcher(
+                lambda: wb,
+                list(subject_sheet_map),
+                interval=self.watch_interval,
+                debounce=self.debounce,
+                sender=self.sender,
+                reload=False,
+                is_ready=lambda mail_hash: mail_hash in self.persisted,
+            )
+            persist_stage = next(s for s in self.stages if s.stage_name == "persist")
+
+            while True:
+                batch, stopping = self._take_batch()
+                with workbook_transaction(wb):
+                    if batch:
+                        batch = self._price_guarded(wb, batch)
+                    if stopping:
+                        # 等待数据库写入完成，最后一次轮询确认
+                        self.queues["persist"].put(_STOP)
+                        persist_stage.join()
+                    self._run_tasks(wb)
+
+                    try:
+                        sent = self.watcher.poll()
+                    except Exception as e:
+                        print(f"轮询确认报价失败：{e}")
+                        sent = []
+                    self.open_hashes -= set(sent)
+                    self.sent += len(sent)
+
+                timing_recorder.mark_many(batch, "written")
+                timing_recorder.flush()
+                if stopping:
+                    break
+        finally:
+            wb.close()
+
+    def _run_tasks(self, wb: "WorkbookBackend") -> None:
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                task(wb)
+            except Exception as e:
+                print(f"工作簿任务执行失败：{e}")
+
+    # ---------------------------------------------------------------------------------
+    # 控制和状态
+    # ---------------------------------------------------------------------------------
+
+    def submit(self, task: Callable[["WorkbookBackend"], Any]) -> None:
+        """在工作簿线程中执行任务，在下一次轮询确认之前运行"""
+        self._tasks.put(task)
+
+    def start(self) -> "Pipeline":
+        for thread in [*self.stages, *self._threads]:
+            thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止读取新邮件，已读取的邮件继续处理完"""
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for thread in [self._threads[0], *self.stages, self._threads[1]]:
+            thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        """工作簿线程异常退出时返回 False，否则在所有线程结束前返回 True"""
+        if self.error is not None:
+            return False
+        return any(thread.is_alive() for thread in [*self.stages, *self._threads])
+
+    def status(self) -> Dict[str, Any]:
+        """各阶段队列深度和处理数量"""
+        pending = self.watcher.pending_count() if self.watcher is not None else 0
+        return {
+            "queues": {name: q.qsize() for name, q in self.queues.items()},
+            "processed": {
+                "fetch": self.fetched,
+                **{stage.stage_name: stage.processed for stage in self.stages},
+                "price": self.quoted,
+                "reply": self.sent,
+            },
+            "failed": {
+                **{stage.stage_name: stage.failed for stage in self.stages},
+                "price": self.price_failed,
+            },
+            "awaiting_confirmation": len(self.open_hashes),
+            "pending_send": pending,
+        }
+
+    def format_status(self) -> str:
+        status = self.status()
+        queues = " ".join(f"{k}={v}" for k, v in status["queues"].items())
+        processed = " ".join(f"{k}={v}" for k, v in status["processed"].items())
+        return (
+            f"队列 [{queues}]  已处理 [{processed}]  "
+            f"待确认 {status['awaiting_confirmation']}  待发送 {status['pending_send']}  "
+            f"报价失败 {status['failed']['price']}"
+        )
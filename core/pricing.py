@@ -0,0 +1,415 @@
+import math
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from scipy.special import ndtr as _ndtr, ndtri as _ndtri
+except ImportError:  # pragma: no cover
+    _ndtr = _ndtri = None
+
+from core.layout import FIRST_QUOTE_COLUMN, list_pages, quote_columns
+from core.market import MarketSnapshot, get_market_snapshot
+from core.parser import get_mail_hash
+from core.schemas import EachMail
+from core.trading_calendar import (
+    DAY_BASIS,
+    TradingCalendar,
+    get_trading_calendar,
+    require_trading_calendar,
+)
+from core.utils import col_index_to_letter, find_position_in_column, get_risk_free_rate
+from processor.mapping import get_sheet_handler
+
+if TYPE_CHECKING:
+    from core.backend import WorkbookBackend
+
+# 各产品定价所需的询价字段（与 fields_rule_dict 中的字段名一致）
+PRODUCT_FIELDS = {
+    "二元看涨": {
+        "low": "最低收益率（年化）",
+        "high": "最高收益率（年化）",
+        "fee": "期权费 （年化）",
+    },
+    "看涨阶梯": {
+        "low": "最低收益率（年化）",
+        "mid": "中间收益率（年化）",
+        "high": "最高收益率（年化）",
+        "strike_high": "行权价格2（高）",
+        "fee": "期权费（年化）",
+    },
+}
+
+# Hart 的有理逼近（West, 2005），双精度下误差约 1e-14
+_CDF_NUMERATOR = [
+    3.52624965998911e-02,
+    0.700383064443688,
+    6.37396220353165,
+    33.912866078383,
+    112.079291497871,
+    221.213596169931,
+    220.206867912376,
+]
+_CDF_DENOMINATOR = [
+    8.83883476483184e-02,
+    1.75566716318264,
+    16.064177579207,
+    86.7807322029461,
+    296.564248779674,
+    637.333633378831,
+    793.826512519948,
+    440.413735824752,
+]
+
+# Acklam 的有理逼近，相对误差约 1e-9，再用一步 Halley 迭代修正到双精度
+_PPF_CENTRAL_NUMERATOR = [
+    -3.969683028665376e01,
+    2.209460984245205e02,
+    -2.759285104469687e02,
+    1.383577518672690e02,
+    -3.066479806614716e01,
+    2.506628277459239e00,
+]
+_PPF_CENTRAL_DENOMINATOR = [
+    -5.447609879822406e01,
+    1.615858368580409e02,
+    -1.556989798598866e02,
+    6.680131188771972e01,
+    -1.328068155288572e01,
+    1.0,
+]
+_PPF_TAIL_NUMERATOR = [
+    -7.784894002430293e-03,
+    -3.223964580411365e-01,
+    -2.400758277161838e00,
+    -2.549671010229583e00,
+    4.374664141464968e00,
+    2.938163982698783e00,
+]
+_PPF_TAIL_DENOMINATOR = [
+    7.784695709041462e-03,
+    3.224671290700398e-01,
+    2.445134137142996e00,
+    3.754408661907416e00,
+    1.0,
+]
+_PPF_TAIL = 0.02425
+_SQRT_2PI = math.sqrt(2 * math.pi)
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """标准正态分布函数"""
+    if _ndtr is not None:
+        return _ndtr(np.asarray(x, dtype=float))
+    x = np.asarray(x, dtype=float)
+    z = np.abs(x)
+    with np.errstate(over="ignore", invalid="ignore"):
+        density = np.exp(-z * z / 2)
+        near = density * np.polyval(_CDF_NUMERATOR, z) / np.polyval(_CDF_DENOMINATOR, z)
+        # 尾部用连分式
+        fraction = z + 0.65
+        for k in (4, 3, 2, 1):
+            fraction = z + k / fraction
+        far = density / fraction / _SQRT_2PI
+    tail = np.where(z < 7.07106781186547, near, far)
+    return np.where(x > 0, 1 - tail, tail)
+
+
+def norm_ppf(p: np.ndarray) -> np.ndarray:
+    """标准正态分布的分位数，p 不在 (0, 1) 内时返回 nan"""
+    p = np.asarray(p, dtype=float)
+    valid = (p > 0) & (p < 1)
+    if _ndtri is not None:
+        return np.where(valid, _ndtri(np.where(valid, p, 0.5)), np.nan)
+
+    # 在下半侧求解后按对称性得到上半侧，Halley 迭代在下半侧的精度更高
+    p = np.where(valid, p, 0.5)
+    lower = np.minimum(p, 1 - p)
+    q = lower - 0.5
+    r = q * q
+    central = (
+        q
+        * np.polyval(_PPF_CENTRAL_NUMERATOR, r)
+        / np.polyval(_PPF_CENTRAL_DENOMINATOR, r)
+    )
+    t = np.sqrt(-2 * np.log(lower))
+    tail = np.polyval(_PPF_TAIL_NUMERATOR, t) / np.polyval(_PPF_TAIL_DENOMINATOR, t)
+    x = np.where(lower < _PPF_TAIL, tail, central)
+
+    u = (norm_cdf(x) - lower) * _SQRT_2PI * np.exp(x * x / 2)
+    x = x - u / (1 + x * u / 2)
+    x = np.where(p > 0.5, -x, x)
+    return np.where(valid, x, np.nan)
+
+
+def parse_rate(value: Any) -> float:
+    """
+    解析收益率和利率，"2.4%" 返回 0.024，数值原样返回，无法解析时返回 nan
+    """
+    if value is None:
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip().replace("*", "").replace(",", "")
+    try:
+        if text.endswith("%"):
+            return float(text[:-1]) / 100
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def parse_strike(value: Any) -> float:
+    """
+    解析以期初价格百分比表示的行权价格，返回比例
+
+    "105%" 和 1.05 返回 1.05；大于 10 的数值视为百分点，105 返回 1.05
+    """
+    strike = parse_rate(value)
+    if strike > 10:
+        strike /= 100
+    return strike
+
+
+def _digital_d2(strike: np.ndarray, T: np.ndarray, vol: np.ndarray, r: np.ndarray):
+    """以期初价格为 1 时，行权价为 strike 的 d2"""
+    return (np.log(1 / strike) + (r - vol**2 / 2) * T) / (vol * np.sqrt(T))
+
+
+def _strike_from_probability(
+    p: np.ndarray, T: np.ndarray, vol: np.ndarray, r: np.ndarray
+) -> np.ndarray:
+    """由风险中性下到期高于行权价的概率 N(d2) 反解行权价（期初价格的百分比）"""
+    d2 = norm_ppf(p)
+    return 100 * np.exp((r - vol**2 / 2) * T - vol * np.sqrt(T) * d2)
+
+
+def binary_call_strike(low, high, fee, T, vol, r) -> np.ndarray:
+    """
+    二元看涨：到期价格不低于行权价时支付最高收益率，否则支付最低收益率
+
+    期权费 = (最高 - 最低) * e^(-rT) * N(d2)，反解行权价，年化收益率与期权费的期限相同可直接相除
+    """
+    low, high, fee, T, vol, r = (
+        np.asarray(v, dtype=float) for v in (low, high, fee, T, vol, r)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = fee * np.exp(r * T) / (high - low)
+        return _strike_from_probability(p, T, vol, r)
+
+
+def bull_ladder_strike(low, mid, high, strike_high, fee, T, vol, r) -> np.ndarray:
+    """
+    看涨阶梯：到期价格低于行权价格1 支付最低收益率，介于两者之间支付中间收益率，
+    不低于行权价格2 支付最高收益率
+
+    期权费 = e^(-rT) * [(中间 - 最低) * N(d2(K1)) + (最高 - 中间) * N(d2(K2))]，
+    已知 K2 反解行权价格1
+    """
+    low, mid, high, strike_high, fee, T, vol, r = (
+        np.asarray(v, dtype=float)
+        for v in (low, mid, high, strike_high, fee, T, vol, r)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        high_leg = (high - mid) * norm_cdf(_digital_d2(strike_high, T, vol, r))
+        p = (fee * np.exp(r * T) - high_leg) / (mid - low)
+        return _strike_from_probability(p, T, vol, r)
+
+
+def price_arrays(sheet_name: str, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+    """按产品对一组输入向量化定价，返回行权价（期初价格的百分比）"""
+    if sheet_name == "二元看涨":
+        return binary_call_strike(
+            inputs["low"],
+            inputs["high"],
+            inputs["fee"],
+            inputs["T"],
+            inputs["vol"],
+            inputs["r"],
+        )
+    if sheet_name == "看涨阶梯":
+        return bull_ladder_strike(
+            inputs["low"],
+            inputs["mid"],
+            inputs["high"],
+            inputs["strike_high"],
+            inputs["fee"],
+            inputs["T"],
+            inputs["vol"],
+            inputs["r"],
+        )
+    raise ValueError(f"不支持的产品类型: {sheet_name}")
+
+
+def _to_quote(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+class NativePricer:
+    """
+    Python/NumPy 定价引擎，复现二元看涨和看涨阶梯 Sheet 的报价，不依赖工作簿重算
+
+    VOL 从行情快照中查找，无风险利率由 get_risk_free_rate 给出；
+    T 按交易日历的交易日 / 365 计算，与工作簿一致，没有交易日历时不能使用
+    """
+
+    def __init__(
+        self,
+        wb: "WorkbookBackend",
+        snapshot: Optional[MarketSnapshot] = None,
+        calendar: Optional[TradingCalendar] = None,
+    ) -> None:
+        self.wb = wb
+        self.snapshot = snapshot or get_market_snapshot(wb)
+        self.calendar = calendar or get_trading_calendar(wb)
+        if self.calendar is None:
+            require_trading_calendar("native", wb)
+
+    def mail_inputs(
+        self, mail: EachMail, days: Optional[int] = None
+    ) -> Dict[str, float]:
+        """
+        从邮件表格中提取一封询价的定价输入
+
+        :param days: 已批量算出的交易日数，未给出时按交易日历单独计算
+        """
+        fields = PRODUCT_FIELDS[mail.sheet_name]
+        inputs = {}
+        for name, label in fields.items():
+            value = mail.df_dict.get(label)
+            inputs[name] = (
+                parse_strike(value) if name == "strike_high" else parse_rate(value)
+            )
+
+        start, end = mail.df_dict.get("产品启动日"), mail.df_dict.get("期末观察日")
+        if days is None:
+            days = self.calendar.trading_days(mail.underlying, start, end)
+        T_ = math.nan if days is None else days / DAY_BASIS
+        inputs["days"] = days
+        inputs["T"] = T_
+        inputs["vol"] = (
+            parse_rate(self.snapshot.vol(mail.underlying, T_))
+            if not math.isnan(T_)
+            else math.nan
+        )
+        inputs["r"] = parse_rate(get_risk_free_rate(mail.underlying))
+        return inputs
+
+    def price(self, mails: Sequence[EachMail]) -> Dict[str, Optional[float]]:
+        """
+        按产品分组后整批定价
+
+        :return: {邮件哈希: 报价值}，输入不合法时报价值为 None
+        """
+        return {
+            mail_hash: quote
+            for mail_hash, (_, quote) in self.price_detailed(mails).items()
+        }
+
+    def price_detailed(
+        self, mails: Sequence[EachMail]
+    ) -> Dict[str, Tuple[Dict[str, float], Optional[float]]]:
+        """整批定价，同时返回每封邮件的定价输入：{邮件哈希: (输入, 报价值)}"""
+        groups: Dict[str, List[EachMail]] = defaultdict(list)
+        for mail in mails:
+            groups[mail.sheet_name].append(mail)
+
+        result = {}
+        for sheet_name, group in groups.items():
+            days = self.calendar.trading_days_batch(
+                [mail.underlying for mail in group],
+                [mail.df_dict.get("产品启动日") for mail in group],
+                [mail.df_dict.get("期末观察日") for mail in group],
+            )
+            rows = [self.mail_inputs(mail, day) for mail, day in zip(group, days)]
+            inputs = {
+                name: np.array([row[name] for row in rows], dtype=float)
+                for name in ("T", "vol", "r", *PRODUCT_FIELDS[sheet_name])
+            }
+            quotes = price_arrays(sheet_name, inputs)
+            for mail, row, quote in zip(group, rows, quotes):
+                result[get_mail_hash(mail)] = (row, _to_quote(quote))
+
+        return result
+
+
+def reconcile_sheet(
+    wb: "WorkbookBackend", sheet_name: str, tolerance: float = 1e-3
+) -> List[dict]:
+    """
+    对账：读取产品 Sheet 及其分页 Sheet 中已报价的列（询价要素、T、VOL、无风险利率和报价），
+    用原生引擎重新定价并与工作簿结果比较
+
+    :param tolerance: 允许的绝对误差
+    :return: 每列的对账结果，包含 sheet、column、subject、excel、native、diff 和 matched
+    """
+    handler = get_sheet_handler(sheet_name)
+    fields_rows = {
+        label: int(row) for label, (row, _) in handler.fields_rule_dict.items()
+    }
+    other_dict = handler.other_dict
+
+    subject_row, _ = find_position_in_column(wb, sheet_name, "邮件标题", "A")
+    if not subject_row:
+        return []
+
+    fields = PRODUCT_FIELDS[sheet_name]
+    market_rows = {
+        "T": int(other_dict["T"]),
+        "vol": int(other_dict["VOL"]),
+        "r": int(other_dict["无风险利率"]),
+    }
+    last_row = max(subject_row, handler.quote_line)
+
+    # 每页一次读取报价列的所有行
+    quoted, values = [], defaultdict(list)
+    for page_sheet in list_pages(wb, sheet_name):
+        address = quote_columns(wb, page_sheet)
+        if not address:
+            continue
+        first, last = address.split(":")
+        block = wb.get_value(page_sheet, f"{first}1:{last}{last_row}")
+        block = [row if isinstance(row, list) else [row] for row in block]
+
+        for index in range(len(block[0])):
+            subject = block[subject_row - 1][index]
+            if subject is None:
+                continue
+
+            def cell(row: int) -> Any:
+                return block[row - 1][index]
+
+            letter = col_index_to_letter(index + FIRST_QUOTE_COLUMN)
+            quoted.append((page_sheet, letter, subject, cell(handler.quote_line)))
+            for name, label in fields.items():
+                parse = parse_strike if name == "strike_high" else parse_rate
+                values[name].append(parse(cell(fields_rows[label])))
+            for name, row in market_rows.items():
+                values[name].append(parse_rate(cell(row)))
+
+    if not quoted:
+        return []
+
+    inputs = {name: np.array(items, dtype=float) for name, items in values.items()}
+    native_quotes = price_arrays(sheet_name, inputs)
+
+    report = []
+    for (page_sheet, letter, subject, excel_value), native in zip(
+        quoted, native_quotes
+    ):
+        excel = parse_rate(excel_value)
+        diff = native - excel
+        report.append(
+            {
+                "sheet": page_sheet,
+                "column": letter,
+                "subject": subject,
+                "excel": _to_quote(excel),
+                "native": _to_quote(native),
+                "diff": _to_quote(diff),
+                "matched": bool(abs(diff) <= tolerance),
+            }
+        )
+    return report
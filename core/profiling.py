@@ -0,0 +1,126 @@
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+# 未开启时所有计时钩子只做一次布尔判断
+_enabled = False
+_lock = threading.Lock()
+# 阶段名称 -> [调用次数, 总耗时, 最大耗时]
+_stages: Dict[str, List[float]] = {}
+_null = nullcontext()
+
+
+def enable_stage_timing() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable_stage_timing() -> None:
+    global _enabled
+    _enabled = False
+
+
+def reset_stage_timing() -> None:
+    with _lock:
+        _stages.clear()
+
+
+def _record(name: str, seconds: float) -> None:
+    with _lock:
+        stats = _stages.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+
+
+@contextmanager
+def _timer(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - started)
+
+
+def stage_timer(name: str):
+    """统计代码块耗时的上下文管理器，未开启时返回空的上下文"""
+    if not _enabled:
+        return _null
+    return _timer(name)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """统计函数耗时的装饰器"""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - started)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def stage_report() -> str:
+    """各阶段的调用次数、总耗时、平均耗时和最大耗时，按总耗时降序"""
+    with _lock:
+        items = sorted(_stages.items(), key=lambda item: item[1][1], reverse=True)
+
+    lines = [f"{'阶段':<30}{'次数':>8}{'总耗时':>10}{'平均':>10}{'最大':>10}"]
+    for name, (count, total, longest) in items:
+        lines.append(
+            f"{name:<32}{int(count):>8}{total:>11.3f}s"
+            f"{total / count * 1000:>10.1f}ms{longest * 1000:>10.1f}ms"
+        )
+    return "\n".join(lines)
+
+
+class Profiler:
+    """
+    用 cProfile 分析一次命令的运行，同时开启阶段计时
+
+    只分析调用 start 的线程，常驻模式下各阶段线程的耗时见阶段计时表
+    """
+
+    def __init__(self, output: Optional[str] = None, limit: int = 30) -> None:
+        self.output = output
+        self.limit = limit
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        reset_stage_timing()
+        enable_stage_timing()
+        self._profile.enable()
+
+    def stop(self) -> str:
+        """停止分析并返回报告，指定了 output 时保存 pstats 文件"""
+        self._profile.disable()
+        disable_stage_timing()
+
+        if self.output:
+            self._profile.dump_stats(self.output)
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(self.limit)
+
+        report = [stream.getvalue().rstrip(), "", stage_report()]
+        if self.output:
+            report.append(
+                f"\n分析结果已保存到 {self.output}，可用 snakeviz 或 pstats 查看"
+            )
+        return "\n".join(report)
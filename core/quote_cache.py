@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from core.utils import parse_date
+from processor.mapping import get_sheet_handler
+
+# 默认保存在数据库文件所在目录
+DEFAULT_CACHE_FILE = "quote_cache.json"
+DEFAULT_CACHE_SIZE = 1000
+
+# 缓存的定价结果：({"days": .., "T": .., "vol": .., "r": ..}, 报价值)
+CachedQuote = Tuple[Dict[str, Any], Any]
+
+
+def _normalize(value: Any) -> Any:
+    """统一询价要素的写法：百分数转为小数，日期转为 ISO 格式，其余去掉空白"""
+    if value is None:
+        return None
+
+    text = str(value).strip().replace(" ", "").replace("*", "")
+    if text.endswith("%"):
+        try:
+            return round(float(text[:-1]) / 100, 10)
+        except ValueError:
+            return text
+
+    parsed = parse_date(text)
+    if parsed:
+        return parsed.date().isoformat()
+
+    try:
+        return round(float(text), 10)
+    except ValueError:
+        return text
+
+
+def quote_key(
+    mail, snapshot_version: str, engine: str, calendar_version: str = ""
+) -> str:
+    """
+    由 fields_rule_dict 中的询价要素、行情快照版本、交易日历版本和报价引擎生成缓存键，
+    询价要素相同的重复询价得到相同的键，行情或交易日历更新后旧的结果不再命中
+    """
+    fields_rule_dict = get_sheet_handler(mail.sheet_name).fields_rule_dict
+
+    terms = {}
+    for header, (_, apply_method) in fields_rule_dict.items():
+        value = mail.df_dict.get(header)
+        if value is not None:
+            value = apply_method(value)
+        terms[header] = _normalize(value)
+
+    payload = json.dumps(
+        [mail.sheet_name, engine, snapshot_version, calendar_version, terms],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QuoteCache:
+    """
+    报价缓存，按 TTL 过期、超过容量时淘汰最久未使用的条目，保存到 JSON 文件供下次运行使用
+    """
+
+    def __init__(
+        self, path: str, ttl: float, max_size: int = DEFAULT_CACHE_SIZE
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        # 缓存键 -> (写入时间, 定价结果)，按最近使用排序
+        self._entries: "OrderedDict[str, Tuple[float, CachedQuote]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, key: str) -> Optional[CachedQuote]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        created, value = entry
+        if time.time() - created > self.ttl:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: CachedQuote) -> None:
+        # 报价失败的结果不缓存
+        if value[1] is None:
+            return
+
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> "QuoteCache":
+        """从文件加载，跳过已过期的条目"""
+        if not os.path.exists(self.path):
+            return self
+
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        now = time.time()
+        for key, created, inputs, quote in data.get("entries", []):
+            if now - created <= self.ttl:
+                self._entries[key] = (created, (inputs, quote))
+        return self
+
+    def save(self) -> None:
+        data = {
+            "entries": [
+                [key, created, inputs, quote]
+                for key, (created, (inputs, quote)) in self._entries.items()
+            ]
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return (
+            f"报价缓存：命中 {self.hits}，未命中 {self.misses}，命中率 {rate:.1%}，"
+            f"过期 {self.expired}，淘汰 {self.evicted}，当前 {len(self)} 条"
+        )
+
+
+def default_cache_path() -> str:
+    """数据库文件所在目录的 quote_cache.json，内存数据库时使用当前目录"""
+    from db.engine import engine
+
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return DEFAULT_CACHE_FILE
+    return os.path.join(os.path.dirname(os.path.abspath(database)), DEFAULT_CACHE_FILE)
+
+
+def get_quote_cache() -> Optional[QuoteCache]:
+    """
+    按环境变量创建报价缓存，QUOTE_CACHE_TTL（秒）未配置或不大于 0 时不使用缓存；
+    只有 native 引擎使用缓存，excel 引擎的报价总是由工作簿公式重算
+
+    QUOTE_CACHE_FILE 指定缓存文件，默认为数据库文件所在目录的 quote_cache.json，
+    QUOTE_CACHE_SIZE 指定最大条目数
+    """
+    ttl = float(os.getenv("QUOTE_CACHE_TTL") or 0)
+    if ttl <= 0:
+        return None
+
+    path = os.getenv("QUOTE_CACHE_FILE") or default_cache_path()
+    max_size = int(os.getenv("QUOTE_CACHE_SIZE") or DEFAULT_CACHE_SIZE)
+    return QuoteCache(path, ttl, max_size).load()
@@ -1,29 +1,149 @@
+import email
+import weakref
 from dataclasses import dataclass
 from datetime import datetime
 from email.message import Message
-from typing import List, Literal, Optional, Union
+from typing import TYPE_CHECKING, List, Literal, Optional
 
-from bs4 import BeautifulSoup
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+    from core.attachments import AttachmentRef
 
 
 @dataclass
 class MailContent:
     plain: str
     html: str
-    attachments: Optional[Union[List[str], str]] = None  # noqa: F821
+    attachments: Optional[List["AttachmentRef"]] = None  # 附件引用，数据按需读取
     nested: Optional[List["MailContent"]] = None
 
 
-@dataclass
 class EachMail:
-    msg_id: str  # 邮件编号
-    subject: str  # 邮件标题
-    from_name: str  # 发件人名称
-    from_addr: str  # 发件人邮箱地址
-    content: MailContent
-    message: Message  # 原始邮件内容
-    sent_time: datetime  # 邮件发送时间，格式为 "YYYY-MM-DD HH:MM:SS"
-    df_dict: dict
-    soup: Optional[BeautifulSoup] = None  # BeautifulSoup 对象，解析后的邮件 HTML 内容
-    sheet_name: Literal["二元看涨", "看涨阶梯"] = "二元看涨"
-    underlying: str = "标的合约"
+    """
+    一封询价邮件：原始邮件数据和解析得到的字段
+
+    message（原始邮件对象）、headers（只含邮件头）和 soup（邮件 HTML 的 BeautifulSoup）
+    首次访问时由 raw 和 content.html 生成并缓存，序列化时只保存原始数据和解析字段
+    """
+
+    __slots__ = (
+        "msg_id",
+        "subject",
+        "from_name",
+        "from_addr",
+        "content",
+        "sent_time",
+        "df_dict",
+        "sheet_name",
+        "underlying",
+        "_raw",
+        "_message",
+        "_headers",
+        "_soup",
+        "__weakref__",
+    )
+
+    def __init__(
+        self,
+        msg_id: str,  # 邮件编号
+        subject: str,  # 邮件标题
+        from_name: str,  # 发件人名称
+        from_addr: str,  # 发件人邮箱地址
+        content: MailContent,
+        message: Optional[Message] = None,  # 原始邮件对象，为空时由 raw 生成
+        sent_time: Optional[datetime] = None,  # 邮件发送时间
+        df_dict: Optional[dict] = None,
+        soup: Optional["BeautifulSoup"] = None,  # 为空时由 content.html 生成
+        sheet_name: Literal["二元看涨", "看涨阶梯"] = "二元看涨",
+        underlying: str = "标的合约",
+        raw: Optional[bytes] = None,  # 原始邮件数据（RFC822）
+    ) -> None:
+        if raw is None and message is None:
+            raise ValueError("raw 和 message 不能同时为空")
+        self.msg_id = msg_id
+        self.subject = subject
+        self.from_name = from_name
+        self.from_addr = from_addr
+        self.content = content
+        self.sent_time = sent_time
+        self.df_dict = df_dict
+        self.sheet_name = sheet_name
+        self.underlying = underlying
+        self._raw = raw
+        self._message = message
+        self._headers: Optional[Message] = None
+        self._soup = soup
+
+        # 附件临时文件随邮件对象释放时删除，反序列化得到的副本不负责删除
+        if content.attachments or content.nested:
+            from core.attachments import remove_spilled, spilled_paths
+
+            paths = spilled_paths(content)
+            if paths:
+                weakref.finalize(self, remove_spilled, paths)
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            self._raw = self._message.as_bytes()  # type: ignore
+        return self._raw
+
+    @property
+    def message(self) -> Message:
+        if self._message is None:
+            self._message = email.message_from_bytes(self._raw)  # type: ignore
+        return self._message
+
+    @message.setter
+    def message(self, value: Message) -> None:
+        self._message = value
+
+    @property
+    def headers(self) -> Message:
+        """只含邮件头的邮件对象，已解析完整邮件时直接使用完整邮件"""
+        if self._message is not None:
+            return self._message
+        if self._headers is None:
+            from core.parser import parse_headers
+
+            self._headers = parse_headers(self.raw)
+        return self._headers
+
+    @property
+    def soup(self) -> "BeautifulSoup":
+        if self._soup is None:
+            from bs4 import BeautifulSoup
+
+            self._soup = BeautifulSoup(self.content.html, "html.parser")
+        return self._soup
+
+    @soup.setter
+    def soup(self, value: "BeautifulSoup") -> None:
+        self._soup = value
+
+    def __getstate__(self) -> dict:
+        state = {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if not name.startswith("_")
+        }
+        state["raw"] = self.raw
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        # 兼容旧版本序列化的数据：保存了 message 和 soup，没有 raw
+        state = dict(state)
+        self._message = state.pop("message", None)
+        self._raw = state.pop("raw", None)
+        self._headers = None
+        self._soup = None
+        state.pop("soup", None)
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        return (
+            f"EachMail(subject={self.subject!r}, from_addr={self.from_addr!r}, "
+            f"sent_time={self.sent_time!r}, sheet_name={self.sheet_name!r})"
+        )
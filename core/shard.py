@@ -0,0 +1,178 @@
+import math
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from core.context import PRICE_FAILED_REASON, mail_context
+from core.excel import ExcelHandler
+from core.market import MarketSnapshot, get_market_snapshot, set_market_snapshot
+from core.parser import get_mail_hash
+from core.trading_calendar import (
+    TradingCalendar,
+    get_trading_calendar,
+    set_trading_calendar,
+)
+from core.transaction import flush_workbook, workbook_transaction
+from processor.registry import get_processor
+
+if TYPE_CHECKING:
+    from core.backend import WorkbookBackend
+
+Position = Tuple[str, str]
+# 一个分片：(客户邮箱, [(邮件, (Sheet 名称, 列字母))])
+Shard = Tuple[str, List[Tuple[Any, Position]]]
+# 定价结果：{邮件哈希: ({"days": .., "T": .., "vol": .., "r": ..}, 报价值)}
+Priced = Dict[str, Tuple[Dict[str, Any], Any]]
+# 报价失败的邮件：{邮件哈希: 跳过原因}
+Failed = Dict[str, str]
+
+
+def get_worker_count() -> int:
+    """从环境变量 QUOTE_WORKERS 读取并行定价的进程数，默认 1（不并行）"""
+    return max(int(os.getenv("QUOTE_WORKERS") or 1), 1)
+
+
+def check_workers(engine: str, workers: int) -> None:
+    """
+    并行定价只支持 native 引擎：excel 引擎的报价由主工作簿的公式重算得出，
+    子进程的定价结果无法复用，多进程只会更慢
+    """
+    if workers > 1 and engine != "native":
+        raise ValueError(
+            f"并行定价（{workers} 个进程）只支持 native 引擎，"
+            "请设置 QUOTE_ENGINE=native 或 QUOTE_WORKERS=1"
+        )
+
+
+def shard_mail(mail) -> SimpleNamespace:
+    """只保留定价需要的字段，去掉 soup 和 MIME 对象，便于传给子进程"""
+    return SimpleNamespace(
+        subject=mail.subject,
+        sent_time=mail.sent_time,
+        from_addr=mail.from_addr,
+        df_dict=mail.df_dict,
+        sheet_name=mail.sheet_name,
+        underlying=mail.underlying,
+    )
+
+
+def partition(
+    batches: Dict[str, List[Tuple[Any, Position]]], shards: int
+) -> List[Shard]:
+    """
+    按客户和产品分组，分组数不足 shards 时把大的分组按列切分，使每个分片的邮件数接近
+    """
+    groups: Dict[Tuple[str, str], List[Tuple[Any, Position]]] = defaultdict(list)
+    for email_addr, batch in batches.items():
+        for mail, position in batch:
+            groups[(email_addr, mail.sheet_name)].append((shard_mail(mail), position))
+
+    total = sum(len(items) for items in groups.values())
+    if not total:
+        return []
+
+    size = math.ceil(total / shards)
+    result = []
+    for (email_addr, _), items in groups.items():
+        for start in range(0, len(items), size):
+            result.append((email_addr, items[start : start + size]))
+    return result
+
+
+# 子进程中的工作簿副本，每个进程只打开一次
+_worker_wb: Optional["WorkbookBackend"] = None
+
+
+def _init_worker(
+    path: str, snapshot: MarketSnapshot, calendar: Optional[TradingCalendar]
+) -> None:
+    """子进程初始化：以 headless 后端打开主进程复制的工作簿文件，沿用主进程的行情快照和交易日历"""
+    global _worker_wb
+    from core.backend.headless import OpenpyxlWorkbook
+
+    _worker_wb = OpenpyxlWorkbook(path)
+    set_market_snapshot(snapshot)
+    set_trading_calendar(calendar)
+
+
+def price_shard(shard: Shard, engine: str) -> Tuple[Priced, Failed]:
+    """
+    在子进程的工作簿副本上为一个分片报价，副本不保存
+
+    子进程中记录的异常邮件不会回到主进程，报价失败的邮件连同跳过原因一起返回，由主进程记录
+    :return: (报价成功的定价结果, 报价失败的邮件)
+    """
+    email_addr, items = shard
+    wb = _worker_wb
+    processor = get_processor(email_addr)
+    skipped = len(mail_context.email)
+
+    with workbook_transaction(wb) as transaction:
+        ExcelHandler().copy_template_columns(wb, [position for _, position in items])
+        quote_dict = processor.price_batch(items, wb, engine)
+
+        # 连同 T、VOL 和无风险利率一起返回，合并时写回主工作簿
+        priced = ExcelHandler.read_priced_columns(wb, items, quote_dict)
+        transaction.discard()
+
+    reasons = {
+        record["subject"]: record["reason"] for record in mail_context.email[skipped:]
+    }
+    failed = {
+        get_mail_hash(mail): reasons.get(mail.subject, PRICE_FAILED_REASON)
+        for mail, _ in items
+        if priced[get_mail_hash(mail)][1] is None
+    }
+    return {
+        mail_hash: value for mail_hash, value in priced.items() if value[1] is not None
+    }, failed
+
+
+def price_sharded(
+    wb: "WorkbookBackend",
+    batches: Dict[str, List[Tuple[Any, Position]]],
+    engine: str,
+    workers: int,
+    filename: Optional[str] = None,
+) -> Tuple[Priced, Failed]:
+    """
+    把待报价邮件分片后交给多个子进程，各自在工作簿副本上定价
+
+    子进程读取的是工作簿文件，开始前先保存主工作簿，使副本包含事务中尚未保存的修改（如新分配的列）；
+    副本放在临时目录中，所有子进程共用（副本不保存），结束后删除
+    :param batches: {客户邮箱: [(邮件, (Sheet 名称, 列字母))]}，列已在主工作簿中分配
+    :param filename: 子进程复制的工作簿文件，默认使用 headless 主工作簿的文件或 EXCEL_FILENAME
+    :return: (所有分片报价成功的定价结果, 报价失败的邮件及跳过原因)
+    """
+    filename = filename or getattr(wb, "filename", None) or os.getenv("EXCEL_FILENAME")
+    if not filename:
+        raise ValueError("并行定价需要工作簿文件（EXCEL_FILENAME）")
+
+    shards = partition(batches, workers)
+    if not shards:
+        return {}, {}
+    flush_workbook(wb)
+
+    priced: Priced = {}
+    failed: Failed = {}
+    directory = tempfile.mkdtemp(prefix="quoter-shard-")
+    try:
+        path = os.path.join(directory, "shard.xlsx")
+        shutil.copyfile(filename, path)
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(shards)),
+            initializer=_init_worker,
+            initargs=(path, get_market_snapshot(wb), get_trading_calendar(wb)),
+        ) as executor:
+            for shard_priced, shard_failed in executor.map(
+                price_shard, shards, [engine] * len(shards)
+            ):
+                priced.update(shard_priced)
+                failed.update(shard_failed)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return priced, failed
@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.parser import get_mail_hash
+from db.models import TIMING_STAGES, MailTiming
+
+# 统计的阶段耗时：(起始阶段, 结束阶段)，最后一项为端到端耗时
+LATENCY_INTERVALS = (
+    *zip(TIMING_STAGES, TIMING_STAGES[1:]),
+    ("received", "sent"),
+)
+
+PERCENTILES = (50, 95, 99)
+
+
+class TimingRecorder:
+    """
+    记录邮件在各阶段的时间戳，先缓存在内存中，flush 时批量写入 mail_timing 表
+
+    同一封邮件同一阶段只记录第一次的时间，可在多个线程中调用
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, mail, stage: str, at: Optional[float] = None) -> None:
+        """
+        :param mail: 邮件对象（EachMail 或 MailState）或邮件哈希
+        :param stage: TIMING_STAGES 中的阶段
+        :param at: Unix 时间戳，默认为当前时间
+        """
+        at = time.time() if at is None else at
+        mail_hash = mail if isinstance(mail, str) else get_mail_hash(mail)
+        with self._lock:
+            record = self._pending.setdefault(mail_hash, {})
+            record.setdefault(stage, at)
+            if not isinstance(mail, str):
+                record.setdefault("from_addr", mail.from_addr)
+                record.setdefault("sheet_name", mail.sheet_name)
+
+    def mark_many(self, mails: Iterable, stage: str, at: Optional[float] = None):
+        at = time.time() if at is None else at
+        for mail in mails:
+            self.mark(mail, stage, at)
+
+    def mark_parsed(self, mail, fetched_at: float) -> None:
+        """解析完成时记录询价发送、读取和解析三个时间"""
+        self.mark(mail, "received", mail.sent_time.timestamp())
+        self.mark(mail, "fetched", fetched_at)
+        self.mark(mail, "parsed")
+
+    def flush(self) -> None:
+        """把缓存的时间戳写入数据库，写入失败时只打印错误，不影响报价流程"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        try:
+            MailTiming().upsert_records(pending)
+        except Exception as e:
+            print(f"写入邮件耗时记录失败：{e}")
+
+
+timing_recorder = TimingRecorder()
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """最近秩法计算百分位数，values 需已排序"""
+    index = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def latency_report(
+    records: List[MailTiming], by: Optional[str] = None
+) -> Dict[str, List[Tuple[str, int, Tuple[float, ...]]]]:
+    """
+    统计各阶段耗时的百分位数
+
+    :param by: 分组字段，None 为不分组，"from_addr" 按客户，"sheet_name" 按产品
+    :return: {分组: [(阶段, 样本数, (p50, p95, p99))]}，耗时单位为秒
+    """
+    groups: Dict[str, List[MailTiming]] = defaultdict(list)
+    for record in records:
+        key = (getattr(record, by) or "-") if by else "全部"
+        groups[key].append(record)
+
+    report = {}
+    for key in sorted(groups):
+        rows = []
+        for begin, end in LATENCY_INTERVALS:
+            values = sorted(
+                getattr(r, end) - getattr(r, begin)
+                for r in groups[key]
+                if getattr(r, begin) is not None and getattr(r, end) is not None
+            )
+            if values:
+                stats = tuple(percentile(values, p) for p in PERCENTILES)
+                rows.append((f"{begin}→{end}", len(values), stats))
+        report[key] = rows
+    return report
@@ -0,0 +1,261 @@
+import csv
+import hashlib
+import json
+import os
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence
+
+from core.utils import parse_date
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+if TYPE_CHECKING:
+    from core.backend import WorkbookBackend
+
+CALENDAR_SHEET = "交易日历"
+
+# 交易日历 Sheet 中各市场节假日所在的列：上海金交易所为 A 列，伦敦金（IDC/XAU）为 C 列
+MARKET_COLUMNS = {"SGE": "A", "IDC": "C"}
+
+# T = 交易日 / DAY_BASIS，与工作簿 T 行的公式一致
+DAY_BASIS = 365
+
+
+def market_of(underlying: str) -> str:
+    """标的使用的交易日历，与交易日公式的取列规则一致：AU 开头用上海金，其余用伦敦金"""
+    return "SGE" if str(underlying).startswith("AU") else "IDC"
+
+
+def _to_date(value: Any) -> Optional[date]:
+    parsed = parse_date(value)
+    return parsed.date() if parsed else None
+
+
+def _weekdays(start: date, end: date) -> int:
+    """起止日之间（含两端）的周一至周五天数"""
+    weeks, extra = divmod((end - start).days + 1, 7)
+    first = start.weekday()
+    return weeks * 5 + sum((first + i) % 7 < 5 for i in range(extra))
+
+
+class TradingCalendar:
+    """
+    交易日历：按市场保存排序后的工作日节假日，交易日数 = 工作日数 - 区间内的节假日数
+
+    与 Excel 的 NETWORKDAYS(起始日, 结束日, 节假日) 一致，起止日均计入，结束日早于起始日时为 0；
+    单个查询用 bisect，批量查询用 numpy 向量化（需安装 numpy）
+    """
+
+    def __init__(self, holidays: Dict[str, Iterable[date]], source: str = "") -> None:
+        self.source = source
+        self._ordinals: Dict[str, List[int]] = {}
+        self._arrays: Dict[str, Any] = {}
+        for market in MARKET_COLUMNS:
+            # 周末本来就不计入，只保留工作日的节假日
+            days = sorted(
+                {day for day in holidays.get(market, ()) if day.weekday() < 5}
+            )
+            self._ordinals[market] = [day.toordinal() for day in days]
+            if np is not None:
+                self._arrays[market] = np.array(days, dtype="datetime64[D]")
+
+    @property
+    def version(self) -> str:
+        """由节假日计算，日历不变时版本不变，可用于缓存键"""
+        payload = json.dumps(self._ordinals, sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+    def holidays(self, market: str) -> List[date]:
+        return [date.fromordinal(ordinal) for ordinal in self._ordinals[market]]
+
+    def trading_days(self, underlying: str, start: Any, end: Any) -> Optional[int]:
+        """起止日之间的交易日数，日期无法解析时返回 None"""
+        start_date, end_date = _to_date(start), _to_date(end)
+        if not (start_date and end_date):
+            return None
+        if end_date < start_date:
+            return 0
+
+        weekdays = _weekdays(start_date, end_date)
+        ordinals = self._ordinals[market_of(underlying)]
+        holidays = bisect_right(ordinals, end_date.toordinal()) - bisect_left(
+            ordinals, start_date.toordinal()
+        )
+        return weekdays - holidays
+
+    def trading_days_array(
+        self, underlyings: Sequence[str], starts: Sequence[Any], ends: Sequence[Any]
+    ) -> "np.ndarray":
+        """批量计算交易日数，日期无法解析的位置为 nan"""
+        count = len(underlyings)
+        start_dates = [_to_date(value) for value in starts]
+        end_dates = [_to_date(value) for value in ends]
+        valid = np.array(
+            [bool(s and e) for s, e in zip(start_dates, end_dates)], dtype=bool
+        )
+        result = np.full(count, np.nan)
+        if not valid.any():
+            return result
+
+        start_array = np.array(
+            [s or date.min for s in start_dates], dtype="datetime64[D]"
+        )[valid]
+        end_array = np.array([e or date.min for e in end_dates], dtype="datetime64[D]")[
+            valid
+        ]
+        # busday_count 不含结束日，这里按 NETWORKDAYS 计入结束日
+        weekdays = np.busday_count(start_array, end_array + 1, weekmask="1111100")
+
+        markets = np.array([market_of(u) for u in underlyings])[valid]
+        holidays = np.zeros(len(start_array), dtype=int)
+        for market, array in self._arrays.items():
+            mask = markets == market
+            if mask.any() and len(array):
+                holidays[mask] = np.searchsorted(
+                    array, end_array[mask], side="right"
+                ) - np.searchsorted(array, start_array[mask], side="left")
+
+        days = np.where(end_array < start_array, 0, weekdays - holidays)
+        result[valid] = days
+        return result
+
+    def trading_days_batch(
+        self, underlyings: Sequence[str], starts: Sequence[Any], ends: Sequence[Any]
+    ) -> List[Optional[int]]:
+        """批量计算交易日数，有 numpy 时向量化，否则逐个 bisect；日期无法解析的位置为 None"""
+        if np is None:
+            return [
+                self.trading_days(underlying, start, end)
+                for underlying, start, end in zip(underlyings, starts, ends)
+            ]
+        days = self.trading_days_array(underlyings, starts, ends)
+        return [None if np.isnan(value) else int(value) for value in days]
+
+    def year_fraction(self, underlying: str, start: Any, end: Any) -> Optional[float]:
+        """T = 交易日 / DAY_BASIS"""
+        days = self.trading_days(underlying, start, end)
+        return None if days is None else days / DAY_BASIS
+
+    def year_fractions(
+        self, underlyings: Sequence[str], starts: Sequence[Any], ends: Sequence[Any]
+    ) -> "np.ndarray":
+        return self.trading_days_array(underlyings, starts, ends) / DAY_BASIS
+
+    @classmethod
+    def from_workbook(cls, wb: "WorkbookBackend") -> "TradingCalendar":
+        """从交易日历 Sheet 一次读取各市场的节假日列"""
+        last_row, _ = wb.used_bounds(CALENDAR_SHEET)
+        holidays: Dict[str, List[date]] = {}
+        for market, column in MARKET_COLUMNS.items():
+            values = wb.get_value(CALENDAR_SHEET, f"{column}1:{column}{last_row}")
+            if not isinstance(values, list):
+                values = [values]
+            holidays[market] = [day for day in map(_to_date, values) if day]
+        return cls(holidays, source=f"{wb.name}:{CALENDAR_SHEET}")
+
+    @classmethod
+    def from_file(cls, path: str) -> "TradingCalendar":
+        """从 CSV 文件加载，每行为 市场（SGE/IDC）,节假日"""
+        holidays: Dict[str, List[date]] = {market: [] for market in MARKET_COLUMNS}
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) < 2:
+                    continue
+                market, day = row[0].strip().upper(), _to_date(row[1].strip())
+                if market in holidays and day:
+                    holidays[market].append(day)
+        return cls(holidays, source=path)
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["market", "holiday"])
+            for market in MARKET_COLUMNS:
+                for day in self.holidays(market):
+                    writer.writerow([market, day.isoformat()])
+
+
+# 当前进程使用的交易日历，显式失效前不会重新读取
+_calendar: Optional[TradingCalendar] = None
+_loaded = False
+
+
+def load_trading_calendar(
+    wb: Optional["WorkbookBackend"] = None,
+) -> Optional[TradingCalendar]:
+    """
+    重新加载交易日历
+
+    配置了环境变量 TRADING_CALENDAR_FILE 时从文件加载，否则从工作簿的交易日历 Sheet 读取；
+    都没有时返回 None，T 仍由工作簿公式计算
+    """
+    global _calendar, _loaded
+
+    path = os.getenv("TRADING_CALENDAR_FILE")
+    if path:
+        _calendar = TradingCalendar.from_file(path)
+    elif wb is not None and CALENDAR_SHEET in wb.sheet_names():
+        _calendar = TradingCalendar.from_workbook(wb)
+    else:
+        _calendar = None
+    _loaded = True
+    return _calendar
+
+
+def get_trading_calendar(
+    wb: Optional["WorkbookBackend"] = None,
+) -> Optional[TradingCalendar]:
+    """返回缓存的交易日历，尚未加载时加载一次"""
+    if not _loaded:
+        return load_trading_calendar(wb)
+    return _calendar
+
+
+def require_trading_calendar(
+    engine: str, wb: Optional["WorkbookBackend"] = None
+) -> None:
+    """
+    native 引擎按交易日计算 T，没有交易日历时与工作簿的报价不一致，拒绝使用
+    """
+    if engine == "native" and get_trading_calendar(wb) is None:
+        raise ValueError(
+            f"native 引擎需要交易日历：工作簿中没有 {CALENDAR_SHEET} Sheet，"
+            "也未配置 TRADING_CALENDAR_FILE"
+        )
+
+
+def use_native_trading_days() -> bool:
+    """
+    excel 引擎是否按交易日历直接计算交易日和 T，以数值代替工作簿中的交易日和 T 公式
+
+    计算规则为 NETWORKDAYS 和 T = 交易日 / DAY_BASIS，与工作簿公式不一致时报价会出错，
+    因此默认关闭，设置环境变量 QUOTE_NATIVE_DAYS=1 开启
+    """
+    return os.getenv("QUOTE_NATIVE_DAYS", "").lower() in ("1", "true")
+
+
+def get_native_days_calendar(
+    wb: Optional["WorkbookBackend"] = None,
+) -> Optional[TradingCalendar]:
+    """开启 QUOTE_NATIVE_DAYS 时返回交易日历，否则返回 None，交易日和 T 由工作簿公式计算"""
+    if not use_native_trading_days():
+        return None
+    return get_trading_calendar(wb)
+
+
+def set_trading_calendar(calendar: Optional[TradingCalendar]) -> None:
+    """直接使用给定的交易日历，如子进程沿用主进程加载的日历"""
+    global _calendar, _loaded
+    _calendar = calendar
+    _loaded = True
+
+
+def invalidate_trading_calendar() -> None:
+    """使缓存的交易日历失效，下次使用时重新加载"""
+    global _calendar, _loaded
+    _calendar = None
+    _loaded = False
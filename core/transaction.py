@@ -0,0 +1,114 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
+
+from core.metrics import metrics
+from core.profiling import stage_timer
+
+if TYPE_CHECKING:
+    from core.backend import WorkbookBackend
+
+# 工作簿 id 与当前活动事务的映射
+_active_transactions: Dict[int, "WorkbookTransaction"] = {}
+
+
+class WorkbookTransaction:
+    """
+    Excel 工作簿事务
+
+    事务期间所有 save_workbook 调用只标记为待保存，提交时统一保存一次；
+    设置 checkpoint_interval 后，距上次保存超过该秒数会额外保存一次，限制异常时的数据损失
+    """
+
+    def __init__(
+        self, wb: "WorkbookBackend", checkpoint_interval: Optional[float] = None
+    ) -> None:
+        self.wb = wb
+        self.checkpoint_interval = checkpoint_interval
+        self.dirty = False
+        self.save_count = 0  # 实际保存次数
+        self.deferred_count = 0  # 被合并的保存次数
+        self._last_saved = time.monotonic()
+
+    def request_save(self) -> None:
+        """记录一次保存请求，到达检查点时才真正保存"""
+        self.dirty = True
+        self.deferred_count += 1
+
+        if self.checkpoint_interval is None:
+            return
+
+        if time.monotonic() - self._last_saved >= self.checkpoint_interval:
+            self._flush()
+
+    def commit(self) -> None:
+        """提交事务，存在未保存的修改时保存一次"""
+        if self.dirty:
+            self._flush()
+
+    def discard(self) -> None:
+        """放弃未保存的修改，提交时不再保存，用于无需落盘的工作副本"""
+        self.dirty = False
+
+    def _flush(self) -> None:
+        with stage_timer("wb.save"), metrics.observe("save"):
+            self.wb.save()
+        self.dirty = False
+        self.save_count += 1
+        self._last_saved = time.monotonic()
+
+
+def get_checkpoint_interval() -> Optional[float]:
+    """从环境变量 EXCEL_CHECKPOINT_SECONDS 读取检查点间隔，未配置时不做周期保存"""
+    value = os.getenv("EXCEL_CHECKPOINT_SECONDS")
+    if not value:
+        return None
+    return float(value)
+
+
+@contextmanager
+def workbook_transaction(
+    wb: "WorkbookBackend", checkpoint_interval: Optional[float] = None
+) -> Iterator[WorkbookTransaction]:
+    """
+    开启工作簿事务，嵌套使用时复用最外层事务，由最外层负责提交
+
+    Excel 无法回滚，因此出错时同样会保存已写入的内容
+    """
+    key = id(wb)
+    existing = _active_transactions.get(key)
+    if existing is not None:
+        yield existing
+        return
+
+    if checkpoint_interval is None:
+        checkpoint_interval = get_checkpoint_interval()
+
+    transaction = WorkbookTransaction(wb, checkpoint_interval)
+    _active_transactions[key] = transaction
+    try:
+        yield transaction
+    finally:
+        del _active_transactions[key]
+        transaction.commit()
+
+
+def flush_workbook(wb: "WorkbookBackend") -> None:
+    """立即保存工作簿，如其他进程需要读取文件；处于事务中时同时清除待保存标记"""
+    transaction = _active_transactions.get(id(wb))
+    if transaction is None:
+        with stage_timer("wb.save"), metrics.observe("save"):
+            wb.save()
+    else:
+        transaction._flush()
+
+
+def save_workbook(wb: "WorkbookBackend") -> None:
+    """保存工作簿，处于事务中时推迟到事务提交"""
+    transaction = _active_transactions.get(id(wb))
+    if transaction is None:
+        with stage_timer("wb.save"), metrics.observe("save"):
+            wb.save()
+    else:
+        transaction.request_save()
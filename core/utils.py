@@ -1,9 +1,14 @@
-import os
-
-import xlwings as xw
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
+from core.market import get_market_snapshot
 from core.parser import get_mail_hash
 from core.schemas import EachMail
+from core.transaction import save_workbook
+from core.workbook_calls import workbook_calls
+
+if TYPE_CHECKING:
+    from core.backend import WorkbookBackend
 
 
 def print_banner(message: str, line_length: int = 120) -> None:
@@ -20,44 +25,53 @@ def print_init_db(message: str, line_length: int = 120) -> None:
 
 def calc_next_letter(letter: str, count: int) -> str:
     """
-    计算下一个字母
+    计算向右偏移 count 列后的列字母，超过 Z 时进位为多字母列（如 AA）
     :param letter: 当前字母
     :return: 下一个字母
     """
-    finally_cell = str(chr(ord(letter) + count))
+    finally_cell = col_index_to_letter(col_letter_to_index(letter) + count)
     return finally_cell
 
 
-def add_excel_subject_cell(wb: xw.Book, mail: EachMail, next_letter: str) -> None:
-    """在工作表中添加邮件标题和哈希值"""
-    sheet = wb.sheets[mail.sheet_name]
+def add_excel_subject_cell(
+    wb: "WorkbookBackend",
+    mail: EachMail,
+    next_letter: str,
+    sheet_name: Optional[str] = None,
+) -> None:
+    """在工作表中添加邮件标题和哈希值，sheet_name 默认为邮件对应的产品 Sheet"""
+    with workbook_calls.mail(mail):
+        _add_excel_subject_cell(wb, mail, next_letter, sheet_name or mail.sheet_name)
+
+
+def _add_excel_subject_cell(
+    wb: "WorkbookBackend", mail: EachMail, next_letter: str, sheet_name: str
+) -> None:
     target = "邮件标题"
-    row, _ = find_position_in_column(sheet, target, "A")
+    row, _ = find_position_in_column(wb, sheet_name, target, "A")
     if not row:
         return
 
-    sheet.range(f"{next_letter}{row}").value = mail.subject
+    wb.set_value(sheet_name, f"{next_letter}{row}", mail.subject)
 
     hash_target = "邮件标记"
-    row, _ = find_position_in_column(sheet, hash_target, "A")
-    sheet.range(f"{next_letter}{row}").value = get_mail_hash(mail)
+    row, _ = find_position_in_column(wb, sheet_name, hash_target, "A")
+    wb.set_value(sheet_name, f"{next_letter}{row}", get_mail_hash(mail))
 
-    sheet.range(f"{next_letter}:{next_letter}").autofit()  # 宽度自适应
+    wb.autofit_columns(sheet_name, f"{next_letter}:{next_letter}")  # 宽度自适应
 
-    wb.save()
+    save_workbook(wb)
 
 
-def find_position_in_column(sheet, keyword, col_index):
+def find_position_in_column(wb: "WorkbookBackend", sheet_name, keyword, col_index):
     """
     在指定工作表的某一列中查找包含 keyword 的单元格，返回其 (行号, 列号)
     """
     _100_row = 100  # 只处理一百行
-    for row_index in range(1, _100_row + 1):
-        cell = sheet.cells(row_index, col_index)
-        value = cell.value
-        if value is not None and str(value).strip() == str(keyword).strip():
-            return row_index, col_index
-    return None, None
+    row_index = wb.find_in_column(sheet_name, keyword, col_index, _100_row)
+    if row_index is None:
+        return None, None
+    return row_index, col_index
 
 
 def col_index_to_letter(n):
@@ -69,27 +83,85 @@ def col_index_to_letter(n):
     return result
 
 
-def get_rate(underlying: str, value: float, wb: xw.Book) -> str:
+def col_letter_to_index(letter: str) -> int:
+    """将 Excel 列字母转换为列号（从 1 开始）"""
+    n = 0
+    for char in letter.upper():
+        n = n * 26 + (ord(char) - 64)
+    return n
+
+
+def read_row_values(
+    wb: "WorkbookBackend", sheet_name: str, row: int, letters: List[str]
+) -> Dict[str, object]:
     """
-    根据输入值，返回对应区间的利率（百分比）
+    一次读取同一行中多个列的值，返回 {列字母: 值}
     """
-    sheet = wb.sheets["标的价格"]
+    if not letters:
+        return {}
 
-    thresholds = sheet.range("E1:I1").value
+    indexes = [col_letter_to_index(letter) for letter in letters]
+    first, last = min(indexes), max(indexes)
+    values = wb.get_value(
+        sheet_name,
+        f"{col_index_to_letter(first)}{row}:{col_index_to_letter(last)}{row}",
+    )
+    # 单个单元格时返回标量
+    if first == last:
+        values = [values]
 
-    if underlying.endswith("IDC"):
-        rates = sheet.range("E2:I2").value
-    elif underlying.startswith("AU") and underlying.endswith("SGE"):
-        rates = sheet.range("E3:I3").value
-    else:
-        rates = sheet.range("E4:I4").value
+    return {letter: values[index - first] for letter, index in zip(letters, indexes)}
+
+
+def write_row_values(
+    wb: "WorkbookBackend", sheet_name: str, row: int, values: Dict[str, object]
+) -> None:
+    """
+    一次写入同一行中多个列的值，values 为 {列字母: 值}，中间未指定的列保持原值
+    """
+    if not values:
+        return
+
+    indexes = {col_letter_to_index(letter): v for letter, v in values.items()}
+    first, last = min(indexes), max(indexes)
+    if len(indexes) != last - first + 1:
+        # 列不连续时逐个写入，避免覆盖中间的单元格
+        for letter, value in values.items():
+            wb.set_value(sheet_name, f"{letter}{row}", value)
+        return
+
+    wb.set_value(
+        sheet_name,
+        f"{col_index_to_letter(first)}{row}",
+        [indexes[index] for index in range(first, last + 1)],
+    )
+
+
+def parse_date(value: Any) -> Optional[datetime]:
+    """解析询价邮件中的日期，支持 2025-07-01、2025/07/01 和 2025年7月1日"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    if not value:
+        return None
 
-    for threshold, rate in zip(thresholds, rates):
-        if value <= threshold:
-            return rate
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y年%m月%d日", "%Y%m%d"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def get_rate(underlying: str, value: float, wb: "WorkbookBackend") -> str:
+    """
+    根据输入值，返回对应区间的利率（百分比）
 
-    # 如果大于最大阈值，默认返回最低利率
-    return rates[-1]
+    从行情快照中查找，快照在每次运行开始时加载，不再逐封邮件读取标的价格 Sheet
+    """
+    return get_market_snapshot(wb).vol(underlying, value)
 
 
 def get_risk_free_rate(underlying: str) -> str:
@@ -98,24 +170,3 @@ def get_risk_free_rate(underlying: str) -> str:
     else:
         r = "4.5%"
     return r
-
-
-def selected_excel_if_open(filename):
-    """如果待处理Excel已经打开，直接使用"""
-    selected = False
-    selected_book = ""
-    selected_app = ""
-
-    for app in xw.apps:
-        for book in list(app.books):
-            book_name = os.path.basename(book.fullname) if book.fullname else book.name
-            if book_name.lower() == filename.lower():
-                selected_book = book
-                selected_app = app
-
-                selected = True
-                break
-        if selected:
-            break
-
-    return selected_book, selected_app
@@ -0,0 +1,247 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Set
+
+from core.excel import ExcelHandler
+from core.timings import timing_recorder
+from core.workbook_calls import workbook_calls
+from db.models import MailState
+
+if TYPE_CHECKING:
+    from core.backend import WorkbookBackend
+
+DEFAULT_INTERVAL = 2.0
+DEFAULT_DEBOUNCE = 1.0
+DEFAULT_RETRY_INTERVAL = 30.0
+
+
+@dataclass
+class PendingConfirmation:
+    """已确认但尚未发送的报价：首次发现确认的时间、当前报价值和报价最近一次变化的时间"""
+
+    first_seen: float
+    quote: object
+    changed_at: float
+    retry_at: float = 0.0  # 发送失败后下一次重试的时间
+
+    def ready_at(self, debounce: float) -> float:
+        return max(self.changed_at + debounce, self.retry_at)
+
+
+class ConfirmationWatcher:
+    """
+    轮询产品 Sheet 的确认行，发现新填写“是”的报价后尽快回复
+
+    - 每次轮询与上一次的确认快照比较，只处理新出现的确认
+    - 防抖：确认后报价值保持 debounce 秒不变才发送，避免业务人员还在修改报价时就发出
+    - 幂等：已发送的哈希不会再次派发，reply_emails 也只回复数据库中未处理的邮件；
+      数据库中已处理的确认（如已通过 mail reply 回复、列仍留在 Sheet 中）不再等待发送；
+      发送失败的确认保留在等待列表中，retry_interval 秒后重试
+    - 记录从发现确认到发送完成的耗时
+    """
+
+    def __init__(
+        self,
+        open_wb: Callable[[], "WorkbookBackend"],
+        sheet_names: Sequence[str],
+        interval: float = DEFAULT_INTERVAL,
+        debounce: float = DEFAULT_DEBOUNCE,
+        sender=None,
+        clock: Callable[[], float] = time.monotonic,
+        reload: bool = True,
+        is_ready: Optional[Callable[[str], bool]] = None,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+    ) -> None:
+        """
+        :param open_wb: 打开工作簿的函数
+        :param reload: 基于文件的后端在文件被外部保存后是否重新打开，由调用方持有并写入工作簿时传 False
+        :param is_ready: 判断邮件是否可以发送，如常驻进程中邮件已写入数据库，未就绪的确认继续等待
+        """
+        self.open_wb = open_wb
+        self.sheet_names = list(sheet_names)
+        self.interval = interval
+        self.debounce = debounce
+        self.sender = sender
+        self.clock = clock
+        self.reload = reload
+        self.is_ready = is_ready
+        self.retry_interval = retry_interval
+
+        self.wb: Optional["WorkbookBackend"] = None
+        self._mtime: Optional[float] = None
+        # 各 Sheet 上一次轮询时的确认快照 {邮件哈希: 报价值}
+        self._snapshots: Dict[str, Dict[str, object]] = {}
+        self._pending: Dict[str, Dict[str, PendingConfirmation]] = {
+            name: {} for name in self.sheet_names
+        }
+        self._dispatched: Set[str] = set()
+        self.latencies: List[float] = []
+
+    def _refresh(self) -> None:
+        """
+        Excel 桌面端直接读取打开中的工作簿；基于文件的后端在文件被外部保存后重新打开
+        """
+        if self.wb is None:
+            self.wb = self.open_wb()
+            self._mtime = self._file_mtime()
+            return
+
+        if not self.reload:
+            return
+
+        mtime = self._file_mtime()
+        if mtime is not None and mtime != self._mtime:
+            self.wb.close()
+            self.wb = self.open_wb()
+            self._mtime = mtime
+
+    def _file_mtime(self) -> Optional[float]:
+        filename = getattr(self.wb, "filename", None)
+        if filename and os.path.exists(filename):
+            return os.path.getmtime(filename)
+        return None
+
+    def poll(self) -> List[str]:
+        """
+        轮询一次所有 Sheet，发送防抖期已过的新确认
+
+        :return: 本次发送成功的邮件哈希
+        """
+        from main import reply_emails
+
+        self._refresh()
+        now = self.clock()
+        sent: List[str] = []
+
+        for sheet_name in self.sheet_names:
+            with workbook_calls.stage("confirm"):
+                confirmed = (
+                    ExcelHandler.get_confirmed_mail_hash_and_price(self.wb, sheet_name)
+                    or {}
+                )
+            previous = self._snapshots.get(sheet_name, {})
+            self._snapshots[sheet_name] = confirmed
+
+            pending = self._pending[sheet_name]
+            # 取消确认的报价不再等待发送
+            for mail_hash in list(pending):
+                if mail_hash not in confirmed:
+                    del pending[mail_hash]
+
+            # 只处理与上一次快照相比新确认或报价被修改的列
+            changed = {
+                mail_hash: quote
+                for mail_hash, quote in confirmed.items()
+                if mail_hash
+                and mail_hash not in self._dispatched
+                and not (mail_hash in previous and previous[mail_hash] == quote)
+            }
+            # 首次轮询时 Sheet 上已回复的确认也是新出现的，数据库中已处理的不再发送
+            self._skip_handled([h for h in changed if h not in pending], pending)
+
+            for mail_hash, quote in changed.items():
+                if mail_hash in self._dispatched:
+                    continue
+                entry = pending.get(mail_hash)
+                if entry is None:
+                    pending[mail_hash] = PendingConfirmation(now, quote, now)
+                    timing_recorder.mark(mail_hash, "confirmed")
+                else:
+                    # 报价被修改，重新计算防抖时间
+                    entry.quote = quote
+                    entry.changed_at = now
+
+            ready = [
+                mail_hash
+                for mail_hash, entry in pending.items()
+                if now >= entry.ready_at(self.debounce)
+                and (self.is_ready is None or self.is_ready(mail_hash))
+            ]
+            if not ready:
+                continue
+
+            try:
+                replied = reply_emails(
+                    sheet_name, wb=self.wb, sender=self.sender, mail_hashes=ready
+                )
+            except Exception as e:
+                print(f"回复确认报价失败：{e}")
+                replied = []
+            self._dispatched.update(replied)
+            done = self.clock()
+            for mail_hash in replied:
+                self.latencies.append(done - pending.pop(mail_hash).first_seen)
+            # 未发送成功的确认稍后重试，期间已在别处处理的不再重试
+            self._skip_handled([h for h in ready if h in pending], pending)
+            for mail_hash in ready:
+                if mail_hash in pending:
+                    pending[mail_hash].retry_at = done + self.retry_interval
+            sent.extend(replied)
+
+        # 回复后工作簿已保存，以保存后的文件时间作为基准，避免把自己的保存当作外部修改
+        self._mtime = self._file_mtime()
+        return sent
+
+    def _skip_handled(
+        self, mail_hashes: List[str], pending: Dict[str, PendingConfirmation]
+    ) -> None:
+        """数据库中已处理的邮件记为已派发，不再等待发送"""
+        if not mail_hashes:
+            return
+        for mail_hash in MailState().get_handled_hashes(mail_hashes):
+            self._dispatched.add(mail_hash)
+            pending.pop(mail_hash, None)
+
+    def run(
+        self, duration: Optional[float] = None, max_polls: Optional[int] = None
+    ) -> None:
+        """
+        持续轮询，直到超过 duration 秒、达到 max_polls 次或按 Ctrl+C 停止
+
+        防抖期比轮询间隔短时，等待发送的确认会在防抖期结束时立即再轮询一次
+        """
+        started = self.clock()
+        polls = 0
+        try:
+            while True:
+                sent = self.poll()
+                polls += 1
+                if sent:
+                    print(f"已回复 {len(sent)} 封确认报价的邮件")
+                if max_polls is not None and polls >= max_polls:
+                    break
+                if duration is not None and self.clock() - started >= duration:
+                    break
+                time.sleep(self._next_delay())
+        except KeyboardInterrupt:
+            print("停止监听确认报价")
+        finally:
+            if self.wb is not None:
+                self.wb.close()
+                self.wb = None
+
+    def pending_count(self) -> int:
+        """已确认、等待防抖或写入数据库后发送的邮件数"""
+        return sum(len(pending) for pending in self._pending.values())
+
+    def _next_delay(self) -> float:
+        """下一次轮询前的等待时间：有等待发送的确认时在其防抖期结束时轮询"""
+        now = self.clock()
+        delay = self.interval
+        for pending in self._pending.values():
+            for entry in pending.values():
+                delay = min(delay, max(entry.ready_at(self.debounce) - now, 0.05))
+        return delay
+
+    def report(self) -> str:
+        """确认到发送完成的耗时统计"""
+        if not self.latencies:
+            return "确认到发送：无已发送的邮件"
+        latencies = sorted(self.latencies)
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        return (
+            f"确认到发送：{len(latencies)} 封，p50 {p50:.2f}s，p95 {p95:.2f}s，"
+            f"最大 {latencies[-1]:.2f}s"
+        )
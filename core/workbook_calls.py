@@ -0,0 +1,172 @@
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# 后端方法的调用类型：读取、写入、保存、重算和其他 API 调用
+CALL_KINDS = {
+    "get_value": "read",
+    "get_formula": "read",
+    "used_bounds": "read",
+    "set_value": "write",
+    "set_formula": "write",
+    "copy_range": "write",
+    "clear_range": "write",
+    "delete_columns": "write",
+    "save": "save",
+    "calculate": "calc",
+}
+KIND_ORDER = ("read", "write", "save", "calc", "api")
+
+# 不在任何阶段中的调用
+NO_STAGE = "other"
+
+_null = nullcontext()
+
+
+class WorkbookCallRecorder:
+    """
+    按阶段和邮件统计工作簿调用次数，Excel 桌面端每次调用都是一次跨进程 COM 往返
+
+    - stage: 当前线程所处的阶段，可嵌套，调用计入最内层阶段
+    - mail: 只属于一封邮件的调用（如写入该邮件的输入）计入该邮件
+    - 阶段中不属于某封邮件的调用（如按行批量读取）由该阶段的邮件平均分摊
+
+    未开启时 stage 和 mail 返回空的上下文
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            # 阶段 -> 调用类型 -> 次数
+            self.stages: Dict[str, Counter] = defaultdict(Counter)
+            # 阶段 -> 邮件哈希 -> 次数，只含直接属于邮件的调用
+            self.mail_calls: Dict[str, Counter] = defaultdict(Counter)
+            # 阶段 -> 参与该阶段的邮件哈希
+            self.stage_mails: Dict[str, set] = defaultdict(set)
+
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def stage(self, name: str, mails: Iterable = ()):
+        """进入阶段，mails 为参与该阶段、分摊共享调用的邮件"""
+        if not self.enabled:
+            return _null
+        return self._stage(name, mails)
+
+    @contextmanager
+    def _stage(self, name: str, mails: Iterable) -> Iterator[None]:
+        stack = self._stack()
+        stack.append(name)
+        self.add_mails(mails)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def add_mails(self, mails: Iterable) -> None:
+        if not self.enabled:
+            return
+        hashes = {_mail_hash(mail) for mail in mails}
+        if hashes:
+            with self._lock:
+                self.stage_mails[self._current_stage()].update(hashes)
+
+    def mail(self, mail):
+        """期间的调用直接计入这封邮件"""
+        if not self.enabled:
+            return _null
+        return self._mail(mail)
+
+    @contextmanager
+    def _mail(self, mail) -> Iterator[None]:
+        previous = getattr(self._local, "mail", None)
+        mail_hash = _mail_hash(mail)
+        self._local.mail = mail_hash
+        with self._lock:
+            self.stage_mails[self._current_stage()].add(mail_hash)
+        try:
+            yield
+        finally:
+            self._local.mail = previous
+
+    def _current_stage(self) -> str:
+        stack = self._stack()
+        return stack[-1] if stack else NO_STAGE
+
+    def record(self, method: str) -> None:
+        stage = self._current_stage()
+        mail_hash = getattr(self._local, "mail", None)
+        with self._lock:
+            self.stages[stage][CALL_KINDS.get(method, "api")] += 1
+            if mail_hash is not None:
+                self.mail_calls[stage][mail_hash] += 1
+
+    def per_mail(self) -> Dict[str, float]:
+        """每封邮件的调用次数：直接属于该邮件的调用加上所在阶段分摊的共享调用"""
+        with self._lock:
+            totals: Dict[str, float] = defaultdict(float)
+            for stage, mails in self.stage_mails.items():
+                if not mails:
+                    continue
+                direct = self.mail_calls.get(stage, Counter())
+                shared = sum(self.stages[stage].values()) - sum(direct.values())
+                for mail_hash in mails:
+                    totals[mail_hash] += direct[mail_hash] + shared / len(mails)
+            return dict(totals)
+
+    def check_budget(self, budget: float) -> List[Tuple[str, float]]:
+        """返回超出每封邮件调用预算的 [(邮件哈希, 调用次数)]，按调用次数降序"""
+        over = [(h, calls) for h, calls in self.per_mail().items() if calls > budget]
+        return sorted(over, key=lambda item: item[1], reverse=True)
+
+    def report(self) -> str:
+        with self._lock:
+            stages = {name: Counter(counts) for name, counts in self.stages.items()}
+            mails = {name: len(hashes) for name, hashes in self.stage_mails.items()}
+
+        columns = (*KIND_ORDER, "total")
+        lines = [
+            f"{'stage':<12}"
+            + "".join(f"{c:>8}" for c in columns)
+            + "   mails  per_mail"
+        ]
+        total: Counter = Counter()
+        for name, counts in sorted(stages.items()):
+            total.update(counts)
+            count = sum(counts.values())
+            per_mail = f"{count / mails[name]:.1f}" if mails.get(name) else "-"
+            values = [counts[kind] for kind in KIND_ORDER] + [count]
+            lines.append(
+                f"{name:<12}"
+                + "".join(f"{value:>8}" for value in values)
+                + f"{mails.get(name, 0):>8}{per_mail:>10}"
+            )
+        values = [total[kind] for kind in KIND_ORDER] + [sum(total.values())]
+        lines.append(f"{'total':<12}" + "".join(f"{value:>8}" for value in values))
+
+        per_mail_calls = self.per_mail()
+        if per_mail_calls:
+            values = sorted(per_mail_calls.values())
+            lines.append(
+                f"每封邮件调用：{len(values)} 封，平均 {sum(values) / len(values):.1f}，"
+                f"最多 {values[-1]:.1f}"
+            )
+        return "\n".join(lines)
+
+
+def _mail_hash(mail) -> str:
+    from core.parser import get_mail_hash
+
+    return mail if isinstance(mail, str) else get_mail_hash(mail)
+
+
+workbook_calls = WorkbookCallRecorder()
@@ -1,12 +1,13 @@
 import json
 import pickle
 from datetime import date, datetime, timedelta, timezone
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Set
 
-from sqlalchemy import JSON, DateTime, Enum, LargeBinary, String, func
+from sqlalchemy import JSON, DateTime, Enum, Float, LargeBinary, String, func, or_
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 from core.parser import get_mail_hash
+from core.profiling import timed
 from core.schemas import EachMail
 from db.enums import MailStateEnum
 from db.session import session_scope
@@ -21,9 +22,10 @@ class MailState(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
+    # 默认值必须是函数，否则只在导入时取一次时间，所有记录的创建时间相同
     created_time: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True),
-        default=datetime.now(timezone(timedelta(hours=8))),
+        default=lambda: datetime.now(timezone(timedelta(hours=8))),
     )
 
     rev_time: Mapped[DateTime] = mapped_column(
@@ -66,6 +68,7 @@ class MailState(Base):
     def __repr__(self) -> str:
         return f"ID: {self.id:>3} 标题：{self.subject} 来自：<{self.from_addr}> 处理状态：{self.state.value}"
 
+    @timed("create_record")
     def create_record(self, mail: EachMail) -> None:
         """将处理结果更新或写入数据库"""
         mail_hash = get_mail_hash(mail)
@@ -113,8 +116,10 @@ class MailState(Base):
 
     def get_unprocessed_mails(
         self, sheet_name: str, mail_hash_list: list
-    ) -> Optional["MailState"]:
+    ) -> List["MailState"]:
+        # 在会话内取出结果，返回查询对象会在会话关闭后另开连接且不归还连接池
         with session_scope() as session:
+            session.expire_on_commit = False
             mails = (
                 session.query(MailState)
                 .filter(
@@ -124,9 +129,27 @@ class MailState(Base):
                     MailState.mail_hash.in_(mail_hash_list),
                 )
                 .order_by(MailState.rev_time)
+                .all()
             )
             return mails
 
+    def get_unprocessed_hashes(self) -> Set[str]:
+        """所有未处理邮件的哈希值"""
+        with session_scope() as session:
+            rows = session.query(MailState.mail_hash).filter(
+                MailState.state == MailStateEnum.UNPROCESSED
+            )
+            return {mail_hash for (mail_hash,) in rows}
+
+    def get_handled_hashes(self, mail_hashes: Iterable[str]) -> Set[str]:
+        """mail_hashes 中已入库且不是未处理状态（已回复或手动处理）的邮件哈希"""
+        with session_scope() as session:
+            rows = session.query(MailState.mail_hash).filter(
+                MailState.state != MailStateEnum.UNPROCESSED,
+                MailState.mail_hash.in_(list(mail_hashes)),
+            )
+            return {mail_hash for (mail_hash,) in rows}
+
     def batch_update_mails_state(self, mail_ids: list):
         with session_scope() as session:
             session.query(MailState).filter(MailState.id.in_(mail_ids)).update(
@@ -135,10 +158,13 @@ class MailState(Base):
 
     def update_state_by_hash_mail(
         self, mail_hash: list, state: MailStateEnum = MailStateEnum.MANUAL
-    ):
+    ) -> int:
+        """更新指定邮件的状态，返回状态发生变化的记录数"""
         with session_scope() as session:
-            session.query(MailState).filter(MailState.mail_hash.in_(mail_hash)).update(
-                {"state": state}, synchronize_session="fetch"
+            return (
+                session.query(MailState)
+                .filter(MailState.mail_hash.in_(mail_hash), MailState.state != state)
+                .update({"state": state}, synchronize_session="fetch")
             )
 
     # ------------------------------------------------------------------------------------------
@@ -201,3 +227,100 @@ class MailState(Base):
             obj = session.get(MailState, _id)
             if obj:
                 obj.state = MailStateEnum.UNPROCESSED
+
+
+# 邮件生命周期中记录时间戳的阶段，依次为：询价发送、读取、解析、报价、写入 Excel、确认、回复
+TIMING_STAGES = (
+    "received",
+    "fetched",
+    "parsed",
+    "priced",
+    "written",
+    "confirmed",
+    "sent",
+)
+
+
+# 已确认存在 mail_timing 表的数据库引擎，每个引擎只检查一次
+_timing_table_binds: Set = set()
+
+
+def _ensure_timing_table(session) -> None:
+    """首次使用时创建 mail_timing 表，兼容升级后未重新执行 init_db 的数据库"""
+    bind = session.get_bind()
+    if bind not in _timing_table_binds:
+        MailTiming.__table__.create(bind, checkfirst=True)
+        _timing_table_binds.add(bind)
+
+
+class MailTiming(Base):
+    """每封邮件各阶段的时间戳（Unix 秒），每封邮件一行"""
+
+    __tablename__ = "mail_timing"
+
+    mail_hash: Mapped[str] = mapped_column(
+        String(64), primary_key=True, comment="邮件哈希值"
+    )
+    from_addr: Mapped[Optional[str]] = mapped_column(
+        String(256), nullable=True, comment="发件人"
+    )
+    sheet_name: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True, comment="产品"
+    )
+
+    received: Mapped[Optional[float]] = mapped_column(
+        Float, nullable=True, index=True, comment="询价邮件发送时间"
+    )
+    fetched: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    parsed: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    priced: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    written: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    confirmed: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    sent: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    def upsert_records(self, records: Dict[str, dict]) -> None:
+        """
+        批量写入时间戳，已有的值不覆盖，重复读取同一封邮件时保留第一次的时间
+
+        :param records: {邮件哈希: {字段: 值}}
+        """
+        hashes = list(records)
+        with session_scope() as session:
+            _ensure_timing_table(session)
+
+            existing = {}
+            # SQLite 单条语句的参数个数有限，分批查询
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start : start + 500]
+                for obj in session.query(MailTiming).filter(
+                    MailTiming.mail_hash.in_(chunk)
+                ):
+                    existing[obj.mail_hash] = obj
+
+            for mail_hash, values in records.items():
+                obj = existing.get(mail_hash)
+                if obj is None:
+                    obj = MailTiming(mail_hash=mail_hash)
+                    session.add(obj)
+                for name, value in values.items():
+                    if getattr(obj, name) is None:
+                        setattr(obj, name, value)
+
+    def get_records(self, start: datetime, end: datetime) -> List["MailTiming"]:
+        """询价时间（没有时用读取时间）在 [start, end) 内的记录"""
+        begin, finish = start.timestamp(), end.timestamp()
+        with session_scope() as session:
+            session.expire_on_commit = False
+            _ensure_timing_table(session)
+            return (
+                session.query(MailTiming)
+                .filter(
+                    or_(
+                        (MailTiming.received >= begin) & (MailTiming.received < finish),
+                        MailTiming.received.is_(None)
+                        & (MailTiming.fetched >= begin)
+                        & (MailTiming.fetched < finish),
+                    )
+                )
+                .all()
+            )
@@ -10,9 +10,10 @@ def init_db():
 
     inspector = inspect(engine)
 
-    if inspector.has_table("mail_state"):
+    if all(inspector.has_table(name) for name in Base.metadata.tables):
         print_banner("当前数据库表已完成初始化...")
     else:
+        # 只创建缺少的表，如升级后新增的 mail_timing
         Base.metadata.create_all(bind=engine)
         print_init_db("数据库表初始化完成......")
 
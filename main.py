@@ -1,42 +1,32 @@
-import os
 import pickle
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import date
+from typing import Iterable, List, Optional
 
-import xlwings as xw
-
-from core.client import send_mail_client
+from core.backend import WorkbookBackend, open_workbook
+from core.client import get_send_mail_client
 from core.excel import ExcelHandler
 from core.handler import MailHandler
-from core.utils import print_banner, selected_excel_if_open
+from core.metrics import metrics
+from core.timings import timing_recorder
+from core.transaction import workbook_transaction
+from core.utils import print_banner
+from core.workbook_calls import workbook_calls
 from db.models import MailState
 from processor.registry import get_processor
 
 
-def open_excel_with_filename():
+def open_excel_with_filename() -> WorkbookBackend:
     """
-    启动 Excel 应用并打开指定文件，失败时自动关闭 Excel
+    打开 EXCEL_FILENAME 指定的报价工作簿，后端由 EXCEL_BACKEND 决定
     """
-    filename = os.getenv("EXCEL_FILENAME")
-    wb, app = selected_excel_if_open(filename)
-
-    if wb and app:
-        return wb, app, False
-
-    app = xw.App(visible=False, add_book=False)
-    try:
-        wb = app.books.open(filename)
-        return wb, app, True
-    except Exception as e:
-        print(f"无法打开当前 Excel {filename}")
-        raise e
+    return open_workbook()
 
 
 def process_excel():
     """处理 Excel"""
-    wb, app, run_in_background = open_excel_with_filename()
+    wb = open_excel_with_filename()
 
-    # 处理邮件并回复
+    # 处理邮件并回复，保存由 MailHandler 的工作簿事务统一完成
     try:
         mail_handler = MailHandler()
         mail_handler.handle(wb)
@@ -44,80 +34,112 @@ def process_excel():
     except:
         raise
     finally:
-        print("所有邮件处理完成，保存并关闭 Excel 文件...")
-        if not run_in_background:
-            wb.save()
-        else:
-            wb.save()
-            wb.close()
-            app.quit()
+        print("所有邮件处理完成，关闭 Excel 文件...")
+        wb.close()
+
 
+def reply_emails(
+    sheet_name: str,
+    wb: Optional[WorkbookBackend] = None,
+    sender=None,
+    mail_hashes: Optional[Iterable[str]] = None,
+) -> List[str]:
+    """
+    回复邮件
 
-def reply_emails(sheet_name: str):
-    """回复邮件"""
-    wb, app, run_in_background = open_excel_with_filename()
+    :param sheet_name: 待回复邮件类型
+    :param wb: 已打开的工作簿，为空时打开 EXCEL_FILENAME 并在结束后关闭
+    :param sender: 发送邮件的客户端，默认为回复邮箱的客户端
+    :param mail_hashes: 只回复这些已确认的邮件，默认回复所有已确认的邮件
+    :return: 发送成功的邮件哈希
+    """
+    opened = wb is None
+    if opened:
+        wb = open_excel_with_filename()
 
     try:
-        state = MailState()
-        sheet = wb.sheets[sheet_name]
-        mail_hash_dict = ExcelHandler.get_confirmed_mail_hash_and_price(sheet)
-
-        mails = state.get_unprocessed_mails(sheet_name, mail_hash_dict.keys())
-        if not mails:
-            return
-
-        # 再次修改邮件的报价值，因为可能人为修改
-        send_dict = {}
-        confirmed_hash_list = []
-        for m in mails:
-            processor = get_processor(m.from_addr)
-            mail_raw = pickle.loads(m.mail_raw)
-            processor.process_mail_html(mail_raw, mail_hash_dict.get(m.mail_hash))
-            send_dict[m.id] = mail_raw
-            confirmed_hash_list.append(m.mail_hash)
-
-        successful_ids = []
-        # 使用多线程发送邮件
-        if send_dict:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                future_map = {
-                    executor.submit(send_mail_client.reply_mail, raw): id
-                    for id, raw in send_dict.items()
-                }
-                for f in as_completed(future_map):
-                    mail_id = future_map[f]
-                    try:
-                        f.result()
-                        successful_ids.append(mail_id)
-                    except Exception as e:
-                        print(f"邮件发送失败: {e}")
-
-        # 更新已处理邮件状态
-        if successful_ids:
-            try:
-                state.batch_update_mails_state(successful_ids)
-            except Exception as e:
-                print(f"更新数据库失败：{e}")
-
-        # 写入今日成功报价数据
+        with workbook_calls.stage("reply"), workbook_transaction(wb):
+            return _reply_emails(
+                wb, sheet_name, sender or get_send_mail_client(), mail_hashes
+            )
+    finally:
+        if opened:
+            wb.close()
+
+
+def _reply_emails(
+    wb: WorkbookBackend,
+    sheet_name: str,
+    sender,
+    mail_hashes: Optional[Iterable[str]] = None,
+) -> List[str]:
+    """回复邮件，并将处理结果写回工作簿"""
+    state = MailState()
+    mail_hash_dict = ExcelHandler.get_confirmed_mail_hash_and_price(wb, sheet_name)
+    if mail_hash_dict and mail_hashes is not None:
+        wanted = set(mail_hashes)
+        mail_hash_dict = {k: v for k, v in mail_hash_dict.items() if k in wanted}
+    if not mail_hash_dict:
+        return []
+
+    mails = state.get_unprocessed_mails(sheet_name, mail_hash_dict.keys())
+    if not mails:
+        return []
+
+    # 再次修改邮件的报价值，因为可能人为修改
+    send_dict = {}
+    confirmed_hash_dict = {}
+    for m in mails:
+        processor = get_processor(m.from_addr)
+        mail_raw = pickle.loads(m.mail_raw)
+        processor.process_mail_html(mail_raw, mail_hash_dict.get(m.mail_hash))
+        send_dict[m.id] = mail_raw
+        confirmed_hash_dict[m.id] = m.mail_hash
+    metrics.confirmed.inc(len(send_dict))
+    workbook_calls.add_mails(confirmed_hash_dict.values())
+
+    successful_ids = []
+    # 使用多线程发送邮件
+    if send_dict:
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            future_map = {
+                executor.submit(sender.reply_mail, raw): id
+                for id, raw in send_dict.items()
+            }
+            for f in as_completed(future_map):
+                mail_id = future_map[f]
+                try:
+                    f.result()
+                    successful_ids.append(mail_id)
+                except Exception as e:
+                    print(f"邮件发送失败: {e}")
+
+    sent_hashes = [confirmed_hash_dict[mail_id] for mail_id in successful_ids]
+    timing_recorder.mark_many(sent_hashes, "sent")
+    metrics.sent.inc(len(sent_hashes))
+    timing_recorder.flush()
+
+    # 更新已处理邮件状态
+    if successful_ids:
         try:
-            ExcelHandler().process_successful_mails_sheet(wb)
+            state.batch_update_mails_state(successful_ids)
         except Exception as e:
-            print(f"写入今日成功报价报错：{e}")
+            print(f"更新数据库失败：{e}")
 
-        # 写入被业务人员拒绝的数据
-        reject_hash_list = ExcelHandler.get_reject_mail_hash(sheet)
-        if reject_hash_list:
-            MailState().update_state_by_hash_mail(reject_hash_list)
+    # 写入今日成功报价数据
+    try:
+        ExcelHandler().process_successful_mails_sheet(wb)
+    except Exception as e:
+        print(f"写入今日成功报价报错：{e}")
 
-        print_banner("邮件发送成功")
-    finally:
-        if not run_in_background:
-            wb.save()
-        else:
-            wb.save()
-            wb.close()
-            app.quit()
+    # 写入被业务人员拒绝的数据
+    reject_hash_list = ExcelHandler.get_reject_mail_hash(wb, sheet_name)
+    if reject_hash_list:
+        rejected = MailState().update_state_by_hash_mail(reject_hash_list)
+        metrics.rejected.inc(rejected)
+
+    print_banner("邮件发送成功")
+    return sent_hashes
 
 
 if __name__ == "__main__":
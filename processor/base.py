@@ -1,5 +1,22 @@
+import os
 from abc import ABC, abstractmethod
 
+from core.metrics import metrics
+from core.parser import get_mail_hash
+from core.profiling import timed
+from core.workbook_calls import workbook_calls
+
+# 报价引擎：excel 由工作簿公式计算，native 由 core.pricing 直接计算
+PRICING_ENGINES = ("excel", "native")
+
+
+def get_pricing_engine() -> str:
+    """从环境变量 QUOTE_ENGINE 读取报价引擎，默认 excel"""
+    engine = os.getenv("QUOTE_ENGINE", "excel").lower()
+    if engine not in PRICING_ENGINES:
+        raise ValueError(f"不支持的报价引擎: {engine}，可选: {PRICING_ENGINES}")
+    return engine
+
 
 class ProcessorStrategy(ABC):
     """处理器抽象工厂基类，定义了处理 Excel 和邮件 HTML 的抽象方法"""
@@ -8,6 +25,36 @@ class ProcessorStrategy(ABC):
     def process_excel(self):
         pass
 
+    def process_excel_batch(self, mails, wb) -> dict:
+        """
+        批量处理 Excel，默认逐封调用 process_excel，返回 {邮件哈希: 报价值}
+
+        :param mails: (邮件, (Sheet 名称, 列字母)) 列表
+        """
+        quote_dict = {}
+        for mail, position in mails:
+            with workbook_calls.mail(mail):
+                quote_dict[get_mail_hash(mail)] = self.process_excel(mail, wb, position)
+        return quote_dict
+
+    @abstractmethod
+    def process_native_batch(self, mails, wb) -> dict:
+        """使用原生定价引擎批量报价，返回 {邮件哈希: 报价值}"""
+        pass
+
+    @abstractmethod
+    def write_priced_columns(self, mails, wb, priced) -> None:
+        """把其他进程或缓存得到的定价结果以数值写入报价列"""
+        pass
+
+    @timed("price_batch")
+    @metrics.observe("price")
+    def price_batch(self, mails, wb, engine: str = "excel") -> dict:
+        """按报价引擎批量报价，返回 {邮件哈希: 报价值}"""
+        if engine == "native":
+            return self.process_native_batch(mails, wb)
+        return self.process_excel_batch(mails, wb)
+
     @abstractmethod
     def process_mail_html(self):
         pass
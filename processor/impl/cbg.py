@@ -1,76 +1,327 @@
-import xlwings as xw
-from bs4 import BeautifulSoup
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
+from core.backend import WorkbookBackend
+from core.context import mail_context
+from core.parser import get_mail_hash
+from core.profiling import timed
 from core.schemas import EachMail
+from core.trading_calendar import DAY_BASIS, TradingCalendar, get_native_days_calendar
 from core.utils import (
     add_excel_subject_cell,
-    calc_next_letter,
     get_rate,
     get_risk_free_rate,
+    read_row_values,
+    write_row_values,
 )
+from core.workbook_calls import workbook_calls
 from processor.base import ProcessorStrategy
 from processor.mapping import get_sheet_handler
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
 
 class CustomerCBGProcessor(ProcessorStrategy):
+    @timed("process_excel")
     def process_excel(
-        self, mail: EachMail, wb: xw.Book, sheet_copy_count: int
+        self, mail: EachMail, wb: WorkbookBackend, position: Tuple[str, str]
     ) -> float:
         """
         操作 Excel 文件，获取指定表格中的值
         :param mail: EachMail 对象
-        :param wb: xlwings 工作簿对象
+        :param wb: 工作簿后端对象
+        :param position: 已分配的报价列 (Sheet 名称, 列字母)，Sheet 可能是分页 Sheet
         :return: quote_value: 从 Excel 中获取的经过处理的报价值
         """
 
         try:
-            sheet = wb.sheets[mail.sheet_name]
+            sheet_name, next_letter = position
 
             # 对应邮件中的数据
             sheet_mapping_handler = get_sheet_handler(mail.sheet_name)
-            # Excel 待处理字段
-            fields_to_update = sheet_mapping_handler.fields_rule_dict
-
-            # 将指定邮件内容写入 Excel
-            next_letter = calc_next_letter("C", sheet_copy_count)
-            for header, value in mail.df_dict.items():
-                if fields_to_update.get(header):
-                    cell, apply_method = fields_to_update[header]
-                    finally_cell = next_letter + str(cell)
-                    sheet.range(finally_cell).value = apply_method(value)
-
-            # 处理 Excel 中的数据
             other_dict = sheet_mapping_handler.other_dict
 
-            # 交易日
-            trade_date_index = sheet.range(next_letter + other_dict.get("交易日"))
-            trade_date_formula = trade_date_index.formula
-            if str(mail.underlying).startswith("AU"):
-                trade_date_formula = trade_date_formula.replace("$C", "$A")
-                trade_date_index.formula = trade_date_formula
-
-            T_ = sheet.range(next_letter + other_dict.get("T")).value
+            # 将指定邮件内容写入 Excel
+            calendar = get_native_days_calendar(wb)
+            self.write_mail_inputs(
+                mail, wb, sheet_name, next_letter, trade_date_formula=calendar is None
+            )
 
-            # VOL
-            rate = get_rate(mail.underlying, T_, wb)
-            sheet.range(next_letter + other_dict.get("VOL")).value = rate
+            if calendar is None:
+                T_ = wb.get_value(sheet_name, next_letter + other_dict.get("T"))
+            else:
+                T_ = self.write_trading_days(
+                    wb, sheet_name, [(mail, next_letter)], calendar
+                )[next_letter]
 
-            # 无风险利率
-            r = get_risk_free_rate(mail.underlying)
-            sheet.range(next_letter + other_dict.get("无风险利率")).value = r
+            # VOL 和无风险利率
+            rate, r = self.get_market_inputs(mail, T_, wb)
+            wb.set_value(sheet_name, next_letter + other_dict.get("VOL"), rate)
+            wb.set_value(sheet_name, next_letter + other_dict.get("无风险利率"), r)
 
             # 获取需报价字段所在位置并读取
             finally_target = next_letter + str(sheet_mapping_handler.quote_line)
-            quote_value = sheet.range(finally_target).value
+            quote_value = wb.get_value(sheet_name, finally_target)
 
             # 每个表格底部添加邮件标题和哈希值
-            add_excel_subject_cell(wb, mail, next_letter)
+            add_excel_subject_cell(wb, mail, next_letter, sheet_name)
 
         except Exception as e:
             print("操作 Excel 失败：", e)
 
         return quote_value
 
+    def process_excel_batch(
+        self, mails: List[Tuple[EachMail, Tuple[str, str]]], wb: WorkbookBackend
+    ) -> Dict[str, float]:
+        """
+        批量处理邮件报价，配合工作簿的 batch_mode 使用
+
+        先写入所有邮件的输入，统一重算一次后按行批量读取 T，再批量写入 VOL 和无风险利率，
+        重算一次后批量读取所有报价，N 封邮件只需两次重算；
+        开启 QUOTE_NATIVE_DAYS 时交易日和 T 按交易日历直接计算后以数值写入，只需一次重算
+        :param mails: (EachMail, (Sheet 名称, 列字母)) 列表
+        :param wb: 工作簿后端对象
+        :return: {邮件哈希: 报价值}
+        """
+        # 按 Sheet（含分页 Sheet）分组，同一 Sheet 的同一行可以一次读写
+        calendar = get_native_days_calendar(wb)
+
+        sheet_groups: Dict[str, List[Tuple[EachMail, str]]] = defaultdict(list)
+        for mail, (sheet_name, next_letter) in mails:
+            try:
+                self.write_mail_inputs(
+                    mail,
+                    wb,
+                    sheet_name,
+                    next_letter,
+                    trade_date_formula=calendar is None,
+                )
+            except Exception as e:
+                self.skip_failed(mail, "写入询价要素失败", e)
+                continue
+            sheet_groups[sheet_name].append((mail, next_letter))
+
+        if calendar is None:
+            wb.calculate()
+
+        for sheet_name, items in sheet_groups.items():
+            other_dict = get_sheet_handler(sheet_name).other_dict
+
+            if calendar is None:
+                letters = [letter for _, letter in items]
+                T_values = read_row_values(
+                    wb, sheet_name, int(other_dict.get("T")), letters
+                )
+            else:
+                T_values = self.write_trading_days(wb, sheet_name, items, calendar)
+
+            # 单封邮件的 T 或行情有误时跳过该邮件，不影响同批的其他邮件
+            vol_values, r_values, priced_items = {}, {}, []
+            for mail, letter in items:
+                try:
+                    if T_values[letter] is None:
+                        raise ValueError("无法计算 T，请检查产品启动日和期末观察日")
+                    rate, r = self.get_market_inputs(mail, T_values[letter], wb)
+                except Exception as e:
+                    self.skip_failed(mail, "获取 VOL 和无风险利率失败", e)
+                    continue
+                vol_values[letter] = rate
+                r_values[letter] = r
+                priced_items.append((mail, letter))
+            sheet_groups[sheet_name] = priced_items
+
+            write_row_values(wb, sheet_name, int(other_dict.get("VOL")), vol_values)
+            write_row_values(
+                wb, sheet_name, int(other_dict.get("无风险利率")), r_values
+            )
+
+        wb.calculate()
+
+        quote_dict = {}
+        for sheet_name, items in sheet_groups.items():
+            quote_line = get_sheet_handler(sheet_name).quote_line
+            letters = [letter for _, letter in items]
+
+            quote_values = read_row_values(wb, sheet_name, quote_line, letters)
+            for mail, letter in items:
+                quote_dict[get_mail_hash(mail)] = quote_values[letter]
+
+                # 每个表格底部添加邮件标题和哈希值
+                add_excel_subject_cell(wb, mail, letter, sheet_name)
+
+        return quote_dict
+
+    def skip_failed(self, mail: EachMail, reason: str, error: Exception) -> None:
+        """
+        记录报价失败的邮件，该邮件的列不写入邮件标题和哈希值，业务人员无法确认，
+        增量刷新时作为空列删除
+        """
+        print(f"{reason}：{error}")
+        mail_context.skip_mail(
+            mail.subject, mail.from_addr, mail.sent_time, datetime.now(), reason
+        )
+
+    def process_native_batch(
+        self, mails: List[Tuple[EachMail, Tuple[str, str]]], wb: WorkbookBackend
+    ) -> Dict[str, float]:
+        """
+        使用原生定价引擎批量报价，不依赖工作簿重算
+
+        询价要素、T、VOL、无风险利率和报价值以数值写入对应列，供业务人员确认
+        :param mails: (EachMail, (Sheet 名称, 列字母)) 列表
+        :param wb: 工作簿后端对象
+        :return: {邮件哈希: 报价值}
+        """
+        from core.pricing import NativePricer
+
+        priced = NativePricer(wb).price_detailed([mail for mail, _ in mails])
+
+        # 询价要素或 T 不合法时报价值为 None，与 excel 引擎一样跳过，该列不写入邮件标题和哈希值
+        for mail, _ in mails:
+            if priced[get_mail_hash(mail)][1] is None:
+                del priced[get_mail_hash(mail)]
+                self.skip_failed(
+                    mail, "原生引擎报价失败", ValueError("询价要素、T 或 VOL 不合法")
+                )
+
+        self.write_priced_columns(mails, wb, priced)
+        return {mail_hash: quote for mail_hash, (_, quote) in priced.items()}
+
+    def write_priced_columns(
+        self,
+        mails: List[Tuple[EachMail, Tuple[str, str]]],
+        wb: WorkbookBackend,
+        priced: Dict[str, Tuple[Dict[str, float], Optional[float]]],
+    ) -> None:
+        """
+        把已得到的定价结果写入报价列：询价要素、交易日、T、VOL、无风险利率和报价值均以数值写入
+
+        :param priced: {邮件哈希: ({"days": .., "T": .., "vol": .., "r": ..}, 报价值)}，
+            没有 days 时保留交易日公式
+        """
+        sheet_groups: Dict[str, List[Tuple[EachMail, str]]] = defaultdict(list)
+        for mail, (sheet_name, next_letter) in mails:
+            mail_hash = get_mail_hash(mail)
+            if mail_hash not in priced:
+                continue
+            # 定价时已算出交易日的，交易日行以数值写入，不需要调整公式
+            self.write_mail_inputs(
+                mail,
+                wb,
+                sheet_name,
+                next_letter,
+                trade_date_formula=priced[mail_hash][0].get("days") is None,
+            )
+            sheet_groups[sheet_name].append((mail, next_letter))
+
+        for sheet_name, items in sheet_groups.items():
+            handler = get_sheet_handler(sheet_name)
+            other_dict = handler.other_dict
+            rows = {
+                int(other_dict.get("交易日")): {},
+                int(other_dict.get("T")): {},
+                int(other_dict.get("VOL")): {},
+                int(other_dict.get("无风险利率")): {},
+                handler.quote_line: {},
+            }
+            for mail, letter in items:
+                inputs, quote_value = priced[get_mail_hash(mail)]
+                if inputs.get("days") is not None:
+                    rows[int(other_dict.get("交易日"))][letter] = inputs["days"]
+                rows[int(other_dict.get("T"))][letter] = inputs["T"]
+                rows[int(other_dict.get("VOL"))][letter] = inputs["vol"]
+                rows[int(other_dict.get("无风险利率"))][letter] = inputs["r"]
+                rows[handler.quote_line][letter] = quote_value
+
+                # 每个表格底部添加邮件标题和哈希值
+                add_excel_subject_cell(wb, mail, letter, sheet_name)
+
+            for row, values in rows.items():
+                write_row_values(wb, sheet_name, row, values)
+
+    def write_mail_inputs(
+        self,
+        mail: EachMail,
+        wb: WorkbookBackend,
+        sheet_name: str,
+        letter: str,
+        trade_date_formula: bool = True,
+    ) -> None:
+        """
+        将邮件中的询价要素写入 sheet_name 的指定列，并按标的调整交易日公式
+
+        :param trade_date_formula: 为 False 时交易日稍后以数值写入，跳过公式调整
+        """
+        with workbook_calls.mail(mail):
+            self._write_mail_inputs(mail, wb, sheet_name, letter, trade_date_formula)
+
+    def _write_mail_inputs(
+        self,
+        mail: EachMail,
+        wb: WorkbookBackend,
+        sheet_name: str,
+        letter: str,
+        trade_date_formula: bool,
+    ) -> None:
+        sheet_mapping_handler = get_sheet_handler(mail.sheet_name)
+        # Excel 待处理字段
+        fields_to_update = sheet_mapping_handler.fields_rule_dict
+
+        for header, value in mail.df_dict.items():
+            if fields_to_update.get(header):
+                cell, apply_method = fields_to_update[header]
+                finally_cell = letter + str(cell)
+                wb.set_value(sheet_name, finally_cell, apply_method(value))
+
+        if not trade_date_formula:
+            return
+
+        # 交易日
+        other_dict = sheet_mapping_handler.other_dict
+        trade_date_index = letter + other_dict.get("交易日")
+        trade_date_formula = wb.get_formula(sheet_name, trade_date_index)
+        if str(mail.underlying).startswith("AU"):
+            trade_date_formula = trade_date_formula.replace("$C", "$A")
+            wb.set_formula(sheet_name, trade_date_index, trade_date_formula)
+
+    def write_trading_days(
+        self,
+        wb: WorkbookBackend,
+        sheet_name: str,
+        items: List[Tuple[EachMail, str]],
+        calendar: TradingCalendar,
+    ) -> Dict[str, Optional[float]]:
+        """
+        按交易日历批量计算交易日和 T，以数值写入交易日行和 T 行，代替工作簿中的公式
+
+        :param items: 同一 Sheet 中的 (EachMail, 列字母) 列表
+        :return: {列字母: T}
+        """
+        other_dict = get_sheet_handler(sheet_name).other_dict
+        days = calendar.trading_days_batch(
+            [mail.underlying for mail, _ in items],
+            [mail.df_dict.get("产品启动日") for mail, _ in items],
+            [mail.df_dict.get("期末观察日") for mail, _ in items],
+        )
+
+        days_values, T_values = {}, {}
+        for (_, letter), value in zip(items, days):
+            days_values[letter] = value
+            T_values[letter] = None if value is None else value / DAY_BASIS
+
+        write_row_values(wb, sheet_name, int(other_dict.get("交易日")), days_values)
+        write_row_values(wb, sheet_name, int(other_dict.get("T")), T_values)
+        return T_values
+
+    def get_market_inputs(self, mail: EachMail, T_: float, wb: WorkbookBackend):
+        """返回 (VOL, 无风险利率)"""
+        rate = get_rate(mail.underlying, T_, wb)
+        r = get_risk_free_rate(mail.underlying)
+        return rate, r
+
     def process_mail_html(self, mail: EachMail, quote_value: float):
         """
         处理邮件 HTML 内容
@@ -120,8 +371,10 @@ class CustomerCBGProcessor(ProcessorStrategy):
 
         return all_fields_filled or field_mismatch
 
-    def iter_label_rows(self, soup: BeautifulSoup):
+    def iter_label_rows(self, soup: "BeautifulSoup"):
         """返回需要处理的标签行"""
+        from bs4 import BeautifulSoup
+
         if isinstance(soup, str):
             soup = BeautifulSoup(soup, "html.parser")
 
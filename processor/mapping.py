@@ -1,5 +1,7 @@
 import re
 
+from core.layout import base_sheet_name
+
 
 class BaseHandler:
     def __init__(self, quote_name: str, quote_line: int):
@@ -77,6 +79,8 @@ CBG_SHEET_HANDLER = {
 
 
 def get_sheet_handler(sheet_name: str) -> BaseHandler:
+    # 分页 Sheet（如 看涨阶梯-2）与产品 Sheet 使用同一处理者
+    sheet_name = base_sheet_name(sheet_name)
     if not CBG_SHEET_HANDLER.get(sheet_name):
         raise ValueError("不存在处理者")
     else: